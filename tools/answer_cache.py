@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Кеш ответов RAG пайплайна: ключ - нормализованный вопрос, язык, контекст
+и опции, влияющие на ответ. Записи помечены версией базы знаний, поэтому
+любая перезагрузка статей делает их неактуальными
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kb_manifest import KB_VERSION_PATH, read_kb_version
+from text_norm import normalize_question
+
+# Дисковый кеш по умолчанию (относительно корня репозитория)
+ANSWER_CACHE_PATH = Path('data/answer_cache.db')
+
+# Опции запроса, которые не меняют ответ и не входят в ключ
+IGNORED_OPTIONS = frozenset({'requestId', 'traceId', 'timeout', 'stream', 'debug'})
+
+def answer_key(question: str, language: str = 'ru', context: str = None, options: Dict = None) -> str:
+    """Ключ кеша: sha256 от нормализованного вопроса и параметров, влияющих на ответ"""
+    relevant = {k: v for k, v in (options or {}).items() if k not in IGNORED_OPTIONS}
+    payload = json.dumps({
+        'q': normalize_question(question),
+        'lang': language,
+        'ctx': re.sub(r'\s+', ' ', context or '').strip(),
+        'opt': relevant
+    }, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class KBVersion:
+    """
+    Общая версия базы знаний, которую обновляют все загрузчики (bump_kb_version).
+    Файл перечитывается не чаще раза в check_interval секунд и только при смене
+    mtime или inode
+    """
+
+    def __init__(self, path: Path = KB_VERSION_PATH, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        self._signature = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                try:
+                    stat = self.path.stat()
+                    signature = (stat.st_mtime_ns, stat.st_ino)
+                except OSError:
+                    signature = None
+                if signature != self._signature:
+                    self._signature = signature
+                    self._version = read_kb_version(self.path) if signature is not None else None
+            return self._version
+
+class DiskAnswerStore:
+    """
+    Дисковый уровень кеша: SQLite с вытеснением давно не использованных записей.
+    Время использования при чтении копится в памяти и записывается одной
+    транзакцией при записи в кеш или раз в flush_interval секунд
+    """
+
+    def __init__(self, path: Path = ANSWER_CACHE_PATH, max_entries: int = 100000,
+                 flush_interval: float = 30.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        # ключ -> время последнего чтения, еще не записанное в last_used
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                kb_version TEXT,
+                expires_at REAL NOT NULL,
+                latency REAL NOT NULL,
+                response TEXT NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used_idx ON answers(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kb_version, expires_at, latency, response FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._touched[key] = time.time()
+                if time.monotonic() - self._flushed_at >= self.flush_interval:
+                    self._flush_touched()
+                    self._conn.commit()
+        if row is None:
+            return None
+        kb_version, expires_at, latency, response = row
+        return kb_version, expires_at, latency, json.loads(response)
+
+    def _flush_touched(self):
+        """Записывает накопленные времена чтения; вызывается под self._lock, коммит - у вызывающего"""
+        self._flushed_at = time.monotonic()
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE answers SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def put(self, key: str, kb_version: Optional[str], expires_at: float, latency: float, response: dict):
+        with self._lock:
+            # Вытеснение ниже должно видеть свежие last_used
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kb_version, expires_at, latency, json.dumps(response, ensure_ascii=False), time.time())
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("""
+                    DELETE FROM answers WHERE key IN (
+                        SELECT key FROM answers ORDER BY last_used LIMIT ?
+                    )
+                """, (count - int(self.max_entries * 0.9),))
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge(self, kb_version: Optional[str] = None) -> int:
+        """Удаляет истекшие записи и записи другой версии базы знаний"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM answers WHERE expires_at < ? OR kb_version IS NOT ?", (time.time(), kb_version)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+class AnswerCache:
+    """
+    Двухуровневый кеш ответов: LRU в памяти с TTL и необязательный
+    дисковый уровень. Запись актуальна, пока не истек TTL и версия базы
+    знаний совпадает с текущей. Потокобезопасен
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, disk: DiskAnswerStore = None,
+                 kb_version: Callable[[], Optional[str]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self.kb_version = kb_version or KBVersion()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._seen_version = None
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0,
+                      'evicted': 0, 'stores': 0, 'saved_seconds': 0.0}
+
+    @staticmethod
+    def make_key(question: str, language: str = 'ru', context: str = None, options: Dict = None) -> str:
+        return answer_key(question, language, context, options)
+
+    def _check_version(self) -> Optional[str]:
+        """При смене версии базы знаний сбрасывает память и чистит диск"""
+        version = self.kb_version()
+        if version != self._seen_version:
+            with self._lock:
+                if version != self._seen_version:
+                    self.stats['invalidated'] += len(self._entries)
+                    self._entries.clear()
+                    self._seen_version = version
+                    if self.disk is not None:
+                        self.stats['invalidated'] += self.disk.purge(version)
+        return version
+
+    def get(self, key: str) -> Optional[dict]:
+        version = self._check_version()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires_at, latency, response = entry
+                if expires_at >= now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['saved_seconds'] += latency
+                    return copy.deepcopy(response)
+                del self._entries[key]
+                self.stats['expired'] += 1
+
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                entry_version, expires_at, latency, response = entry
+                if expires_at >= now and entry_version == version:
+                    self._remember(key, entry)
+                    with self._lock:
+                        self.stats['hits'] += 1
+                        self.stats['disk_hits'] += 1
+                        self.stats['saved_seconds'] += latency
+                    return copy.deepcopy(response)
+                self.disk.delete(key)
+                with self._lock:
+                    self.stats['expired'] += 1
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def _remember(self, key: str, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def put(self, key: str, response: dict, latency: float = 0.0):
+        """Сохраняет ответ; latency - сколько занял запрос к бэкенду"""
+        version = self._check_version()
+        entry = (version, time.time() + self.ttl, latency, copy.deepcopy(response))
+        self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, *entry)
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), kb_version=self._seen_version)
+        stats['hit_rate'] = self.hit_rate
+        return stats
+
+def main():
+    """Статистика и очистка дискового кеша ответов"""
+    parser = argparse.ArgumentParser(description="Кеш ответов RAG")
+    parser.add_argument("--path", default=str(ANSWER_CACHE_PATH), help=f"Файл кеша (по умолчанию: {ANSWER_CACHE_PATH})")
+    parser.add_argument("--kb-version", default=str(KB_VERSION_PATH), help="Файл общей версии базы знаний")
+    parser.add_argument("--purge", action="store_true", help="Удалить истекшие записи и записи старых версий")
+    parser.add_argument("--clear", action="store_true", help="Удалить все записи")
+    args = parser.parse_args()
+
+    store = DiskAnswerStore(Path(args.path))
+    if args.clear:
+        store.clear()
+    elif args.purge:
+        removed = store.purge(read_kb_version(Path(args.kb_version)))
+        print(f"🧹 Удалено записей: {removed}")
+    print(f"📦 Кеш ответов: {args.path}")
+    print(f"  - Записей: {store.count()}")
+    print(f"  - Версия базы знаний: {read_kb_version(Path(args.kb_version)) or 'нет файла версии'}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+Асинхронный клиент RAG пайплайна на aiohttp: общий пул соединений
+с ограничением и пакетная обработка вопросов с ограниченной параллельностью
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from answer_cache import answer_key
+from rag_hedging import hedged
+from rag_wire import WIRE_REJECTED, WireCodec
+
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:3002")
+
+# Ошибки транспорта, после которых клиент возвращает {"error": ..., "success": False}
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Потоковый ответ: SSE (event: delta|sources|done|error, data: JSON) или
+# chunked NDJSON ({"type": "delta"|"sources"|"done"|"error", ...} по строке).
+# Бэкенд без поддержки потока отвечает обычным JSON
+STREAM_ACCEPT = 'text/event-stream, application/x-ndjson;q=0.9, application/json;q=0.5'
+
+def _stream_event(kind: str, raw: str) -> Dict:
+    """Событие потока в виде {"type": "delta"|"metadata"|"done"|"error", ...}"""
+    if raw.strip() == '[DONE]':
+        return {"type": "done", "data": None}
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        payload = {"text": raw}
+    if not isinstance(payload, dict):
+        payload = {"text": str(payload)}
+    kind = payload.pop("type", None) or kind
+    if kind in ("message", "delta", "token"):
+        return {"type": "delta", "text": payload.get("text") or payload.get("delta") or ""}
+    if kind in ("sources", "metadata"):
+        return {"type": "metadata", **payload}
+    if kind == "done":
+        return {"type": "done", "data": payload.get("data", payload) or None}
+    if kind == "error":
+        return {"type": "error", "error": payload.get("error") or raw}
+    return {"type": kind, **payload}
+
+async def _sse_events(content: aiohttp.StreamReader) -> AsyncIterator[Dict]:
+    event, data = "message", []
+    async for raw in content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield _stream_event(event, "\n".join(data))
+            event, data = "message", []
+        elif not line.startswith(":"):
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+    if data:
+        yield _stream_event(event, "\n".join(data))
+
+async def _ndjson_events(content: aiohttp.StreamReader) -> AsyncIterator[Dict]:
+    async for raw in content:
+        line = raw.decode("utf-8").strip()
+        if line:
+            yield _stream_event("delta", line)
+
+async def _response_events(result: Dict) -> AsyncIterator[Dict]:
+    """События из обычного (непотокового) ответа"""
+    if not result.get("success"):
+        yield {"type": "error", "error": result.get("error") or "success=false"}
+        return
+    data = result.get("data") or {}
+    yield {"type": "delta", "text": data.get("answer") or ""}
+    yield {"type": "metadata", "sources": data.get("sources") or [], "confidence": data.get("confidence")}
+    yield {"type": "done", "data": data}
+
+# Статусы, по которым пакетный эндпоинт считается неподдерживаемым
+BATCH_UNSUPPORTED = (404, 405, 501)
+
+def query_payload(question: str, context: str = None, user_id: int = None, chat_id: int = None,
+                  language: str = "ru", options: Dict = None) -> Dict:
+    """Тело запроса к /api/rag/query (RAGQuery бэкенда)"""
+    return {
+        "question": question,
+        "context": context,
+        "userId": user_id,
+        "chatId": chat_id,
+        "language": language,
+        "options": options or {}
+    }
+
+class _WireRejected(Exception):
+    """Бэкенд отверг формат тела запроса, клиент уже перешел на JSON"""
+
+class AsyncRAGClient:
+    """
+    Асинхронный клиент для работы с RAG пайплайном
+    """
+
+    def __init__(self, backend_url: str = None, max_connections: int = 20, cache=None, recorder=None,
+                 hedging=None, coalesce: bool = True, instrumentation=None, wire: WireCodec = None,
+                 semantic_cache=None, faq=None):
+        """
+        Args:
+            backend_url: Адрес бэкенда
+            max_connections: Максимум одновременных соединений в пуле
+            cache: Кеш ответов process_query (answer_cache.AnswerCache)
+            recorder: Журнал запросов process_query (traffic_log.TrafficRecorder)
+            hedging: Хеджирование process_query (rag_hedging.HedgePolicy)
+            coalesce: Объединять одинаковые одновременные process_query в один запрос
+            instrumentation: Замеры запросов по фазам (rag_metrics.ClientInstrumentation)
+            wire: Формат и сжатие тел запросов (rag_wire.WireCodec), по умолчанию JSON
+            semantic_cache: Ответы на похожие вопросы для process_query (semantic_cache.SemanticCache)
+            faq: Готовые ответы до любых запросов (faq_matcher.FAQMatcher)
+        """
+        self.backend_url = backend_url or BACKEND_URL
+        self.max_connections = max_connections
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.faq = faq
+        self.recorder = recorder
+        self.hedging = hedging
+        self.coalesce = coalesce
+        self.instrumentation = instrumentation
+        self.wire = wire or WireCodec()
+        # None - неизвестно, поддерживает ли бэкенд /api/rag/query/batch
+        self.batch_supported: Optional[bool] = None
+        # Запросы к бэкенду в полете по ключу вопроса (answer_cache.answer_key)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesce_stats = {'requests': 0, 'coalesced': 0}
+        self.headers = {
+            'User-Agent': 'RAG-Client/1.0'
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'AsyncRAGClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Сессия создается в цикле событий, где выполняется первый запрос"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            trace_configs = [self.instrumentation.trace_config()] if self.instrumentation is not None else None
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                                  trace_configs=trace_configs)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str, payload: Dict = None, timeout: float = 30,
+                       error_message: str = "Ошибка запроса к RAG API", attempt: int = 1) -> Dict:
+        try:
+            return await self._send(method, path, payload, timeout, error_message, attempt)
+        except _WireRejected:
+            # Бэкенд не понял формат или сжатие тела - повтор обычным JSON (в метриках - повторная попытка)
+            return await self._send(method, path, payload, timeout, error_message, attempt + 1)
+
+    async def _send(self, method: str, path: str, payload: Dict, timeout: float, error_message: str,
+                    attempt: int) -> Dict:
+        timing = self.instrumentation.start(method, path, attempt) if self.instrumentation is not None else None
+        status, body, error_type = None, None, None
+        headers = self.wire.accept_headers()
+        data = None
+        if payload is not None:
+            data, content_headers = self.wire.encode(payload)
+            headers.update(content_headers)
+        try:
+            async with self._get_session().request(
+                method,
+                f"{self.backend_url}{path}",
+                data=data,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                trace_request_ctx=timing
+            ) as response:
+                status = response.status
+                if status in WIRE_REJECTED and data is not None and not self.wire.plain:
+                    if self.wire.rejected(status, await response.read(), payload) and self.wire.downgrade():
+                        raise _WireRejected()
+                response.raise_for_status()
+                body = self.wire.decode(await response.read(), response.content_type)
+                return body
+        except REQUEST_ERRORS as e:
+            error_type = type(e).__name__
+            error = str(e) or error_type
+            print(f"{error_message}: {error}")
+            if status is not None:
+                return {"error": error, "success": False, "status": status}
+            return {"error": error, "success": False}
+        except ValueError as e:
+            # Тело ответа не разобралось
+            error_type = type(e).__name__
+            print(f"{error_message}: {e}")
+            return {"error": str(e), "success": False}
+        except asyncio.CancelledError:
+            error_type = "cancelled"
+            raise
+        finally:
+            if timing is not None:
+                self.instrumentation.finish(timing, status, body, error_type)
+
+    async def _cache_get(self, key: str) -> Optional[Dict]:
+        """Чтение кеша ответов; дисковый уровень (SQLite) читается в пуле потоков"""
+        if self.cache.disk is None:
+            return self.cache.get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self.cache.get, key)
+
+    async def _cache_put(self, key: str, result: Dict, latency: float):
+        """Запись в кеш ответов; с дисковым уровнем - в пуле потоков"""
+        if self.cache.disk is None:
+            self.cache.put(key, result, latency)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.put, key, result, latency)
+
+    async def _faq_answer(self, question: str, context: Optional[str], options: Optional[Dict],
+                          language: str = "ru") -> Optional[Dict]:
+        """
+        Готовый ответ из FAQ или None. Готовый ответ не учитывает контекст, поэтому
+        только для вопросов без него, и написан на одном языке - язык ответа
+        (options.targetLang или language) должен с ним совпадать. Пока индекс
+        свежий, поиск идет прямо в цикле событий; проверка файлов и перестройка
+        индекса - в пуле потоков
+        """
+        if self.faq is None or context:
+            return None
+        language = (options or {}).get("targetLang") or language
+        if not self.faq.serves(language):
+            return None
+        tenant = (options or {}).get("tenantId")
+        if self.faq.is_fresh(tenant):
+            return self.faq.answer(question, tenant)
+        return await asyncio.get_running_loop().run_in_executor(None, self.faq.answer, question, tenant)
+
+    async def process_query(self, question: str, context: str = None, user_id: int = None,
+                            chat_id: int = None, language: str = "ru", options: Dict = None) -> Dict:
+        """
+        Основной метод для обработки запроса через RAG пайплайн
+
+        Args:
+            question: Вопрос пользователя
+            context: Дополнительный контекст
+            user_id: ID пользователя
+            chat_id: ID чата
+            language: Язык (по умолчанию русский)
+            options: Дополнительные опции
+
+        Returns:
+            Dict с ответом от RAG пайплайна
+        """
+        payload = query_payload(question, context, user_id, chat_id, language, options)
+
+        started = time.perf_counter()
+        answered = await self._faq_answer(question, context, options, language)
+        if answered is not None:
+            if self.recorder is not None:
+                self.recorder.record(payload, answered, time.perf_counter() - started, cached=True,
+                                     faq=answered["data"]["metadata"]["match"])
+            return answered
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(question, language, context, options)
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                if self.recorder is not None:
+                    self.recorder.record(payload, cached, time.perf_counter() - started, cached=True)
+                return cached
+
+        if not self.coalesce:
+            return await self._answer(payload, question, language, context, options, cache_key, started)
+
+        # Одинаковые одновременные вопросы ждут один общий поиск в семантическом
+        # кеше и один запрос. shield - чтобы отмена одного из ожидающих не
+        # отменяла запрос остальным
+        key = cache_key or answer_key(question, language, context, options)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._answer(payload, question, language, context, options, cache_key, started)
+            )
+            task.followers = 0
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.coalesce_stats['requests'] += 1
+            result = await asyncio.shield(task)
+            # Каждый получает свою копию общего ответа
+            return copy.deepcopy(result) if task.followers else result
+
+        task.followers += 1
+        self.coalesce_stats['coalesced'] += 1
+        result = copy.deepcopy(await asyncio.shield(task))
+        if self.recorder is not None:
+            self.recorder.record(payload, result, time.perf_counter() - started, coalesced=True)
+        return result
+
+    async def _answer(self, payload: Dict, question: str, language: str, context: Optional[str],
+                      options: Optional[Dict], cache_key: Optional[str], started: float) -> Dict:
+        """Похожий вопрос из семантического кеша, иначе запрос к бэкенду"""
+        probe = None
+        if self.semantic_cache is not None:
+            # Эмбеддинг вопроса - синхронный запрос к провайдеру, не держим цикл событий
+            tenant = (options or {}).get("tenantId")
+            similar, probe = await asyncio.get_running_loop().run_in_executor(
+                None, self.semantic_cache.lookup, question, tenant, language, context, options
+            )
+            if similar is not None:
+                if self.recorder is not None:
+                    self.recorder.record(payload, similar, time.perf_counter() - started, cached=True,
+                                         similarity=round(probe["similarity"], 4))
+                return similar
+        return await self._query(payload, cache_key, started, probe)
+
+    async def _query(self, payload: Dict, cache_key: Optional[str], started: float, probe: Dict = None) -> Dict:
+        """Запрос к /api/rag/query (с хеджированием, если включено), кеш и журнал"""
+        # Увеличенный timeout для RAG обработки
+        if self.hedging is not None:
+            attempts = itertools.count(1)
+            result = await hedged(lambda: self._request("POST", "/api/rag/query", payload, timeout=120,
+                                                        attempt=next(attempts)), self.hedging)
+        else:
+            result = await self._request("POST", "/api/rag/query", payload, timeout=120)
+        latency = time.perf_counter() - started
+        # Кешируем только успешные ответы
+        if cache_key is not None and result.get("success"):
+            await self._cache_put(cache_key, result, latency)
+        if probe is not None and result.get("success"):
+            await asyncio.get_running_loop().run_in_executor(None, self.semantic_cache.put, probe, result, latency)
+        if self.recorder is not None:
+            self.recorder.record(payload, result, latency)
+        return result
+
+    def get_coalescing_stats(self) -> Dict:
+        """Сколько process_query ушло на бэкенд и сколько присоединилось к уже идущим"""
+        stats = dict(self.coalesce_stats, in_flight=len(self._inflight))
+        total = stats['requests'] + stats['coalesced']
+        stats['coalesced_rate'] = stats['coalesced'] / total if total else 0.0
+        return stats
+
+    async def process_query_stream(self, question: str, context: str = None, user_id: int = None,
+                                   chat_id: int = None, language: str = "ru",
+                                   options: Dict = None) -> AsyncIterator[Dict]:
+        """
+        Потоковая обработка запроса: отдает части ответа по мере генерации
+
+        Args:
+            question: Вопрос пользователя
+            context: Дополнительный контекст
+            user_id: ID пользователя
+            chat_id: ID чата
+            language: Язык (по умолчанию русский)
+            options: Дополнительные опции
+
+        Returns:
+            Асинхронный итератор событий:
+            {"type": "delta", "text": ...} - очередная часть ответа,
+            {"type": "metadata", "sources": ..., "confidence": ...},
+            {"type": "error", "error": ...},
+            последним - {"type": "done", "response": Dict как у process_query,
+            "ttft": секунд до первой части, "total": секунд, "streamed": bool}
+        """
+        payload = query_payload(question, context, user_id, chat_id, language, dict(options or {}, stream=True))
+
+        started = time.perf_counter()
+        answered = await self._faq_answer(question, context, options, language)
+        if answered is not None:
+            async for event in _response_events(answered):
+                if event["type"] != "done":
+                    yield event
+            latency = time.perf_counter() - started
+            if self.recorder is not None:
+                self.recorder.record(payload, answered, latency, cached=True, ttft_ms=round(latency * 1000, 3),
+                                     faq=answered["data"]["metadata"]["match"])
+            yield {"type": "done", "response": answered, "ttft": latency, "total": latency, "streamed": False}
+            return
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(question, language, context, options)
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                async for event in _response_events(cached):
+                    if event["type"] != "done":
+                        yield event
+                latency = time.perf_counter() - started
+                if self.recorder is not None:
+                    self.recorder.record(payload, cached, latency, cached=True, ttft_ms=round(latency * 1000, 3))
+                yield {"type": "done", "response": cached, "ttft": latency, "total": latency, "streamed": False}
+                return
+
+        ttft, streamed, parts, metadata, data, error = None, False, [], {}, None, None
+        timing = self.instrumentation.start("POST", "/api/rag/query") if self.instrumentation is not None else None
+        status, error_type = None, None
+        try:
+            for _ in range(2):
+                body, headers = self.wire.encode(payload)
+                headers.update(self.wire.accept_headers(), Accept=STREAM_ACCEPT)
+                async with self._get_session().post(
+                    f"{self.backend_url}/api/rag/query",
+                    data=body,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=120),
+                    trace_request_ctx=timing
+                ) as response:
+                    status = response.status
+                    if (status in WIRE_REJECTED and not self.wire.plain
+                            and self.wire.rejected(status, await response.read(), payload)
+                            and self.wire.downgrade()):
+                        # Повтор обычным JSON: до первого события вызывающий ничего не получил
+                        continue
+                    response.raise_for_status()
+                    if response.content_type == "text/event-stream":
+                        events, streamed = _sse_events(response.content), True
+                    elif response.content_type == "application/x-ndjson":
+                        events, streamed = _ndjson_events(response.content), True
+                    else:
+                        # Бэкенд не умеет отдавать поток - обычный ответ целиком
+                        events = _response_events(self.wire.decode(await response.read(), response.content_type))
+                    async for event in events:
+                        if event["type"] == "delta":
+                            if ttft is None:
+                                ttft = time.perf_counter() - started
+                            parts.append(event["text"])
+                        elif event["type"] == "metadata":
+                            metadata.update({k: v for k, v in event.items() if k != "type"})
+                        elif event["type"] == "done":
+                            data = event["data"]
+                            break
+                        elif event["type"] == "error":
+                            error = event["error"]
+                        yield event
+                break
+        except (*REQUEST_ERRORS, ValueError) as e:
+            error_type = type(e).__name__
+            error = str(e) or error_type
+            print(f"Ошибка потокового запроса к RAG API: {error}")
+            yield {"type": "error", "error": error}
+        except (asyncio.CancelledError, GeneratorExit):
+            error_type = "cancelled"
+            raise
+        finally:
+            if timing is not None:
+                self.instrumentation.finish(timing, status, {"data": data}, error_type)
+
+        if error is not None and data is None:
+            result = {"error": error, "success": False}
+        else:
+            result = {"success": True, "data": data or {"answer": "".join(parts), **metadata}}
+        latency = time.perf_counter() - started
+        if cache_key is not None and result["success"]:
+            await self._cache_put(cache_key, result, latency)
+        if self.recorder is not None:
+            self.recorder.record(payload, result, latency, streamed=streamed,
+                                 ttft_ms=round(ttft * 1000, 3) if ttft is not None else None)
+        yield {"type": "done", "response": result, "ttft": ttft, "total": latency, "streamed": streamed}
+
+    async def process_batch(self, questions: Iterable[Union[str, Dict[str, Any]]], concurrency: int = 8,
+                            batch_size: int = 32) -> List[Dict]:
+        """
+        Пакетная обработка: вопросы уходят пачками в /api/rag/query/batch, чтобы
+        бэкенд делил эмбеддинги и поиск между ними. Если эндпоинта нет -
+        параллельные process_query (не более concurrency одновременно)
+
+        Args:
+            questions: Строки вопросов или dict с аргументами process_query
+            concurrency: Максимум одновременных запросов (пачек в пакетном режиме)
+            batch_size: Вопросов в одной пачке
+
+        Returns:
+            Ответы в порядке вопросов; ошибка отдельного вопроса - {"error": ..., "success": False}
+        """
+        items = [item if isinstance(item, dict) else {"question": item} for item in questions]
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending = []
+        for index, item in enumerate(items):
+            answered = await self._faq_answer(item["question"], item.get("context"), item.get("options"),
+                                              item.get("language", "ru"))
+            if answered is not None:
+                if self.recorder is not None:
+                    self.recorder.record(query_payload(**item), answered, answered["data"]["totalTime"] / 1000,
+                                         cached=True, faq=answered["data"]["metadata"]["match"])
+                results[index] = answered
+                continue
+            if self.cache is not None:
+                cached = await self._cache_get(self.cache.make_key(
+                    item["question"], item.get("language", "ru"), item.get("context"), item.get("options")
+                ))
+                if cached is not None:
+                    results[index] = cached
+                    continue
+            pending.append(index)
+
+        if pending and self.batch_supported is not False:
+            slots = asyncio.Semaphore(concurrency)
+
+            async def send(chunk: List[int]):
+                async with slots:
+                    return chunk, await self._query_batch([items[i] for i in chunk])
+
+            chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            for chunk, chunk_results in await asyncio.gather(*(send(chunk) for chunk in chunks)):
+                if chunk_results is not None:
+                    for index, result in zip(chunk, chunk_results):
+                        results[index] = result
+            pending = [index for index in pending if results[index] is None]
+
+        if pending:
+            async for position, result in self.process_many([items[i] for i in pending], concurrency=concurrency):
+                results[pending[position]] = result
+        return results
+
+    async def _query_batch(self, items: List[Dict]) -> Optional[List[Dict]]:
+        """Одна пачка через /api/rag/query/batch; None - эндпоинт не поддерживается"""
+        payloads = [query_payload(**item) for item in items]
+        started = time.perf_counter()
+        response = await self._request("POST", "/api/rag/query/batch", {"queries": payloads},
+                                       timeout=120 + 2 * len(payloads),
+                                       error_message="Ошибка пакетного запроса к RAG API")
+        if response.get("status") in BATCH_UNSUPPORTED:
+            if self.batch_supported is not False:
+                print("ℹ️  Бэкенд не поддерживает /api/rag/query/batch, вопросы уйдут по одному")
+            self.batch_supported = False
+            return None
+
+        batch = (response.get("data") or {}).get("results") if response.get("success") else None
+        if not isinstance(batch, list) or len(batch) != len(payloads):
+            error = response.get("error") or "Некорректный ответ пакетного эндпоинта"
+            return [{"error": error, "success": False} for _ in payloads]
+        self.batch_supported = True
+
+        latency = time.perf_counter() - started
+        results = []
+        for item, payload, result in zip(items, payloads, batch):
+            if not isinstance(result, dict):
+                result = {"error": "Некорректный ответ пакетного эндпоинта", "success": False}
+            if self.cache is not None and result.get("success"):
+                key = self.cache.make_key(payload["question"], payload["language"], payload["context"],
+                                          item.get("options"))
+                await self._cache_put(key, result, latency / len(payloads))
+            if self.recorder is not None:
+                self.recorder.record(payload, result, latency, batch=len(payloads))
+            results.append(result)
+        return results
+
+    async def process_many(self, questions: Iterable[Union[str, Dict[str, Any]]],
+                           concurrency: int = 8) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Обрабатывает вопросы параллельно, не более concurrency одновременно,
+        и отдает (индекс вопроса, ответ) по мере готовности
+
+        Args:
+            questions: Строки вопросов или dict с аргументами process_query
+            concurrency: Максимум одновременных запросов
+        """
+        pending = set()
+        items = iter(enumerate(questions))
+
+        def start_next() -> bool:
+            try:
+                index, item = next(items)
+            except StopIteration:
+                return False
+            kwargs = item if isinstance(item, dict) else {"question": item}
+            task = asyncio.ensure_future(self.process_query(**kwargs))
+            task.index = index
+            pending.add(task)
+            return True
+
+        try:
+            while len(pending) < concurrency and start_next():
+                pass
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    start_next()
+                    yield task.index, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def test_pipeline(self, test_query: str) -> Dict:
+        """
+        Тестирование RAG пайплайна
+
+        Args:
+            test_query: Тестовый запрос
+
+        Returns:
+            Dict с результатами тестирования
+        """
+        return await self._request("POST", "/api/rag/test", {"testQuery": test_query}, timeout=60,
+                                   error_message="Ошибка тестирования RAG пайплайна")
+
+    async def get_stats(self) -> Dict:
+        """
+        Получение статистики RAG пайплайна
+
+        Returns:
+            Dict со статистикой
+        """
+        return await self._request("GET", "/api/rag/stats", error_message="Ошибка получения статистики")
+
+    async def get_health(self) -> Dict:
+        """
+        Проверка здоровья RAG сервиса
+
+        Returns:
+            Dict со статусом здоровья
+        """
+        return await self._request("GET", "/api/rag/health", error_message="Ошибка проверки здоровья")
+
+    async def get_model_info(self) -> Dict:
+        """
+        Получение информации о модели
+
+        Returns:
+            Dict с информацией о модели
+        """
+        return await self._request("GET", "/api/rag/model-info",
+                                   error_message="Ошибка получения информации о модели")
+
+    async def update_search_config(self, search_config: Dict) -> Dict:
+        """
+        Обновление конфигурации поиска
+
+        Args:
+            search_config: Новая конфигурация поиска
+
+        Returns:
+            Dict с результатом обновления
+        """
+        return await self._request("PUT", "/api/rag/config", {"searchConfig": search_config},
+                                   error_message="Ошибка обновления конфигурации")
+
+async def run_batch(backend_url: str, questions: list, concurrency: int, max_connections: int,
+                    batch_size: int = 0):
+    started = time.perf_counter()
+    errors = 0
+    async with AsyncRAGClient(backend_url, max_connections=max(max_connections, concurrency)) as client:
+        if batch_size:
+            answered = enumerate(await client.process_batch(questions, concurrency, batch_size))
+        else:
+            answered = [item async for item in client.process_many(questions, concurrency=concurrency)]
+        for index, result in answered:
+            if not result.get("success"):
+                errors += 1
+            answer = (result.get("data") or {}).get("answer") or result.get("error", "")
+            print(f"  [{index}] {questions[index][:60]!r}: {str(answer)[:80]!r}")
+    elapsed = time.perf_counter() - started
+    print(f"\n⏱  {len(questions)} вопросов за {elapsed:.2f}s ({len(questions) / elapsed:.1f} вопросов/сек), "
+          f"ошибок: {errors}")
+
+def main():
+    """Пакетная обработка вопросов из файла (по одному в строке)"""
+    parser = argparse.ArgumentParser(description="Пакетная обработка вопросов через RAG API")
+    parser.add_argument("questions", help="Файл с вопросами, по одному в строке")
+    parser.add_argument("--backend-url", default=BACKEND_URL, help=f"URL бэкенда (по умолчанию: {BACKEND_URL})")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов (по умолчанию: 8)")
+    parser.add_argument("--max-connections", type=int, default=20, help="Размер пула соединений (по умолчанию: 20)")
+    parser.add_argument("--batch", type=int, default=0, metavar="N",
+                        help="Отправлять пачками по N через /api/rag/query/batch (по умолчанию: по одному)")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip()]
+    asyncio.run(run_batch(args.backend_url, questions, args.concurrency, args.max_connections, args.batch))
+
+if __name__ == "__main__":
+    main()
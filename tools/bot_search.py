@@ -1,22 +1,102 @@
 import os
+import sys
 import json
-import requests
-from typing import Dict, List, Optional, Any
+import atexit
+import asyncio
+import threading
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple
 
-BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:3002")
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_rag_client import AsyncRAGClient
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_clients: 'weakref.WeakSet[AsyncRAGClient]' = weakref.WeakSet()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Общий цикл событий в фоновом потоке для всех синхронных клиентов"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-client-loop", daemon=True).start()
+    return _loop
+
+def _close_clients():
+    """Закрывает сессии aiohttp при завершении процесса"""
+    if _loop is None:
+        return
+    for client in list(_clients):
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), _loop).result(timeout=5)
+        except Exception:
+            pass
+
+atexit.register(_close_clients)
 
 class RAGClient:
     """
-    Клиент для работы с RAG пайплайном
+    Клиент для работы с RAG пайплайном: синхронная обертка над AsyncRAGClient.
+    Запросы выполняются в общем фоновом цикле событий, поэтому клиент
+    можно вызывать из нескольких потоков одновременно
     """
     
-    def __init__(self, backend_url: str = None):
-        self.backend_url = backend_url or BACKEND_URL
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'RAG-Client/1.0'
-        })
+    def __init__(self, backend_url: str = None, local_index=None, embedder=None, bm25_index=None,
+                 cache=None, max_connections: int = 20, recorder=None, hedging=None, coalesce: bool = True,
+                 instrumentation=None, wire=None, semantic_cache=None, faq=None):
+        """
+        Args:
+            backend_url: Адрес бэкенда
+            local_index: Локальный VectorIndex (kb_vector_index) для search_local
+            embedder: Провайдер эмбеддингов вопроса (kb_embeddings) для search_local
+            bm25_index: Локальный BM25Index (kb_bm25) - делает search_local гибридным
+            cache: Кеш ответов process_query (answer_cache.AnswerCache)
+            max_connections: Максимум одновременных соединений с бэкендом
+            recorder: Журнал запросов process_query (traffic_log.TrafficRecorder)
+            hedging: Хеджирование process_query (rag_hedging.HedgePolicy)
+            coalesce: Объединять одинаковые одновременные process_query (из любых потоков) в один запрос
+            instrumentation: Замеры запросов по фазам (rag_metrics.ClientInstrumentation)
+            wire: Формат и сжатие тел запросов (rag_wire.WireCodec), по умолчанию JSON
+            semantic_cache: Ответы на похожие вопросы для process_query (semantic_cache.SemanticCache)
+            faq: Готовые ответы до любых запросов (faq_matcher.FAQMatcher)
+        """
+        self.async_client = AsyncRAGClient(backend_url, max_connections=max_connections, cache=cache,
+                                           recorder=recorder, hedging=hedging, coalesce=coalesce,
+                                           instrumentation=instrumentation, wire=wire,
+                                           semantic_cache=semantic_cache, faq=faq)
+        self.local_index = local_index
+        self.embedder = embedder
+        self.bm25_index = bm25_index
+        _clients.add(self.async_client)
+
+    @property
+    def backend_url(self) -> str:
+        return self.async_client.backend_url
+
+    @property
+    def cache(self):
+        return self.async_client.cache
+
+    @property
+    def recorder(self):
+        return self.async_client.recorder
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+    def close(self):
+        """Закрывает соединения с бэкендом"""
+        if _loop is not None:
+            self._run(self.async_client.close())
+
+    def __enter__(self) -> 'RAGClient':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def process_query(self, question: str, context: str = None, user_id: int = None, 
                      chat_id: int = None, language: str = "ru", options: Dict = None) -> Dict:
@@ -34,26 +114,138 @@ class RAGClient:
         Returns:
             Dict с ответом от RAG пайплайна
         """
-        payload = {
-            "question": question,
-            "context": context,
-            "userId": user_id,
-            "chatId": chat_id,
-            "language": language,
-            "options": options or {}
-        }
+        return self._run(self.async_client.process_query(question, context, user_id, chat_id, language, options))
+
+    def process_many(self, questions, concurrency: int = 8) -> Iterator[Tuple[int, Dict]]:
+        """
+        Параллельная обработка вопросов (см. AsyncRAGClient.process_many)
+        
+        Args:
+            questions: Строки вопросов или dict с аргументами process_query
+            concurrency: Максимум одновременных запросов
+            
+        Returns:
+            Итератор (индекс вопроса, ответ) в порядке готовности
+        """
+        return self._iterate(self.async_client.process_many(questions, concurrency=concurrency))
+
+    def process_batch(self, questions, concurrency: int = 8, batch_size: int = 32) -> List[Dict]:
+        """
+        Пакетная обработка вопросов (см. AsyncRAGClient.process_batch)
+        
+        Args:
+            questions: Строки вопросов или dict с аргументами process_query
+            concurrency: Максимум одновременных запросов
+            batch_size: Вопросов в одной пачке
+            
+        Returns:
+            Ответы в порядке вопросов, с ошибками по отдельным вопросам
+        """
+        return self._run(self.async_client.process_batch(questions, concurrency=concurrency, batch_size=batch_size))
+
+    def process_query_stream(self, question: str, context: str = None, user_id: int = None,
+                             chat_id: int = None, language: str = "ru", options: Dict = None) -> Iterator[Dict]:
+        """
+        Потоковая обработка запроса (см. AsyncRAGClient.process_query_stream)
         
+        Args:
+            question: Вопрос пользователя
+            context: Дополнительный контекст
+            user_id: ID пользователя
+            chat_id: ID чата
+            language: Язык (по умолчанию русский)
+            options: Дополнительные опции
+            
+        Returns:
+            Итератор событий delta/metadata/error и финального done с ttft и total
+        """
+        return self._iterate(self.async_client.process_query_stream(
+            question, context, user_id, chat_id, language, options
+        ))
+
+    def _iterate(self, async_iterator) -> Iterator:
+        """Синхронный итератор поверх асинхронного генератора в фоновом цикле"""
         try:
-            response = self.session.post(
-                f"{self.backend_url}/api/rag/query",
-                json=payload,
-                timeout=120  # Увеличиваем timeout для RAG обработки
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка запроса к RAG API: {e}")
-            return {"error": str(e), "success": False}
+            while True:
+                try:
+                    yield self._run(async_iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(async_iterator.aclose())
+
+    def get_cache_stats(self) -> Dict:
+        """
+        Статистика кеша ответов: попадания, промахи, сэкономленное время
+        
+        Returns:
+            Dict со статистикой или пустой Dict, если кеш не подключен
+        """
+        return self.cache.get_stats() if self.cache is not None else {}
+
+    def get_semantic_cache_stats(self) -> Dict:
+        """
+        Статистика семантического кеша: доля попаданий, сэкономленное время
+        
+        Returns:
+            Dict со статистикой или пустой Dict, если кеш не подключен
+        """
+        semantic_cache = self.async_client.semantic_cache
+        return semantic_cache.get_stats() if semantic_cache is not None else {}
+
+    def get_faq_stats(self) -> Dict:
+        """
+        Статистика готовых ответов: точные и нечеткие совпадения, промахи
+        
+        Returns:
+            Dict со статистикой или пустой Dict, если быстрый путь не подключен
+        """
+        faq = self.async_client.faq
+        return faq.get_stats() if faq is not None else {}
+
+    def get_hedging_stats(self) -> Dict:
+        """
+        Статистика хеджирования: сколько раз сработало, чья попытка победила
+        
+        Returns:
+            Dict со статистикой или пустой Dict, если хеджирование выключено
+        """
+        hedging = self.async_client.hedging
+        return hedging.get_stats() if hedging is not None else {}
+
+    def get_coalescing_stats(self) -> Dict:
+        """
+        Статистика объединения одинаковых запросов
+        
+        Returns:
+            Dict: requests - ушло на бэкенд, coalesced - присоединилось к идущим
+        """
+        return self.async_client.get_coalescing_stats()
+
+    def search_local(self, question: str, k: int = 8, min_sim: float = 0.5, fusion: str = "rrf") -> List[Dict]:
+        """
+        Поиск чанков в локальных индексах без запроса к бэкенду
+        
+        Args:
+            question: Вопрос пользователя
+            k: Количество чанков
+            min_sim: Минимальная косинусная близость (как в rag_hybrid_search)
+            fusion: Слияние с BM25: "rrf" или "sql" (формула rag_hybrid_search)
+            
+        Returns:
+            Список чанков {id, article_id, chunk_index, cos_sim, ...}
+        """
+        if self.local_index is None or self.embedder is None:
+            raise ValueError("search_local требует local_index и embedder")
+        query_vector = self.embedder.embed([question])[0]
+        if self.bm25_index is not None:
+            from kb_bm25 import hybrid_search
+            return hybrid_search(self.local_index, self.bm25_index, query_vector, question, k, min_sim, fusion)
+        return [
+            {"id": chunk_id, **self.local_index.payloads.get(chunk_id, {}), "cos_sim": score}
+            for chunk_id, score in self.local_index.search(query_vector, k)
+            if score >= min_sim
+        ]
 
     def test_pipeline(self, test_query: str) -> Dict:
         """
@@ -65,19 +257,7 @@ class RAGClient:
         Returns:
             Dict с результатами тестирования
         """
-        payload = {"testQuery": test_query}
-        
-        try:
-            response = self.session.post(
-                f"{self.backend_url}/api/rag/test",
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка тестирования RAG пайплайна: {e}")
-            return {"error": str(e), "success": False}
+        return self._run(self.async_client.test_pipeline(test_query))
 
     def get_stats(self) -> Dict:
         """
@@ -86,16 +266,7 @@ class RAGClient:
         Returns:
             Dict со статистикой
         """
-        try:
-            response = self.session.get(
-                f"{self.backend_url}/api/rag/stats",
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка получения статистики: {e}")
-            return {"error": str(e), "success": False}
+        return self._run(self.async_client.get_stats())
 
     def get_health(self) -> Dict:
         """
@@ -104,16 +275,7 @@ class RAGClient:
         Returns:
             Dict со статусом здоровья
         """
-        try:
-            response = self.session.get(
-                f"{self.backend_url}/api/rag/health",
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка проверки здоровья: {e}")
-            return {"error": str(e), "success": False}
+        return self._run(self.async_client.get_health())
 
     def get_model_info(self) -> Dict:
         """
@@ -122,16 +284,7 @@ class RAGClient:
         Returns:
             Dict с информацией о модели
         """
-        try:
-            response = self.session.get(
-                f"{self.backend_url}/api/rag/model-info",
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка получения информации о модели: {e}")
-            return {"error": str(e), "success": False}
+        return self._run(self.async_client.get_model_info())
 
     def update_search_config(self, search_config: Dict) -> Dict:
         """
@@ -143,19 +296,17 @@ class RAGClient:
         Returns:
             Dict с результатом обновления
         """
-        payload = {"searchConfig": search_config}
-        
-        try:
-            response = self.session.put(
-                f"{self.backend_url}/api/rag/config",
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка обновления конфигурации: {e}")
-            return {"error": str(e), "success": False}
+        return self._run(self.async_client.update_search_config(search_config))
+
+_default_client: Optional[RAGClient] = None
+
+def _shared_client() -> RAGClient:
+    """Один клиент на процесс: сессия и пул соединений переиспользуются между вызовами"""
+    global _default_client
+    with _loop_lock:
+        if _default_client is None:
+            _default_client = RAGClient()
+        return _default_client
 
 # Обратная совместимость - оставляем старую функцию
 def bot_search_and_refine(question: str, draft: str, sources: list, lang: str = "ru"):
@@ -163,8 +314,7 @@ def bot_search_and_refine(question: str, draft: str, sources: list, lang: str =
     Устаревшая функция для обратной совместимости.
     Рекомендуется использовать RAGClient.process_query()
     """
-    client = RAGClient()
-    return client.process_query(
+    return _shared_client().process_query(
         question=question,
         context=f"Черновик: {draft}",
         language=lang,
@@ -3,23 +3,20 @@
 Скрипт для проверки таблиц в Supabase
 """
 
-import psycopg2
+import os
 import sys
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from db_stats import catalog_stats
 
 def check_tables():
     """Проверяет таблицы в Supabase"""
     try:
         # Подключение к базе данных
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к Supabase установлено")
         
@@ -32,9 +29,16 @@ def check_tables():
         """)
         tables = cursor.fetchall()
         
+        # Число строк и размер - оценки из каталога, без сканирования таблиц
+        catalog = catalog_stats([table[0] for table in tables])
+        
         print(f"\n📊 Найдено {len(tables)} таблиц в Supabase:")
         for table in tables:
-            print(f"  - {table[0]}")
+            entry = catalog.get(table[0])
+            if entry and entry['rows_estimate'] >= 0:
+                print(f"  - {table[0]}: ≈{entry['rows_estimate']} записей, {entry['size']}")
+            else:
+                print(f"  - {table[0]}")
         
         # Проверяем схему support
         cursor.execute("""
@@ -65,19 +69,13 @@ def check_tables():
             FROM pg_extension 
             ORDER BY extname
         """)
-        extensions = cursor.fetchall()
+        extensions = [ext[0] for ext in cursor.fetchall()]
         print(f"\n🔧 Установленные расширения:")
         for ext in extensions:
-            print(f"  - {ext[0]}")
+            print(f"  - {ext}")
         
         # Проверяем pgvector
-        cursor.execute("""
-            SELECT extname 
-            FROM pg_extension 
-            WHERE extname = 'vector'
-        """)
-        vector_ext = cursor.fetchone()
-        if vector_ext:
+        if 'vector' in extensions:
             print(f"  ✅ pgvector установлен")
         else:
             print(f"  ❌ pgvector НЕ установлен")
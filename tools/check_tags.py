@@ -3,23 +3,20 @@
 Скрипт для проверки тегов в статьях
 """
 
-import psycopg2
+import os
 import sys
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from db_stats import collect_stats
 
 def check_tags():
     """Проверяет теги в статьях"""
     try:
         # Подключение к базе данных
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к Supabase установлено")
         
@@ -36,15 +33,13 @@ def check_tags():
             print(f"  Tags type: {type(tags)}")
             print()
         
-        # Проверяем количество статей с разными типами тегов
-        cursor.execute("SELECT COUNT(*) FROM kb_articles WHERE tags IS NULL")
-        null_tags = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM kb_articles WHERE tags = '[]'")
-        empty_array = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM kb_articles WHERE tags = 'null'")
-        null_string = cursor.fetchone()[0]
+        # Все счетчики тегов - один проход по kb_articles
+        articles = collect_stats(['kb_articles'])['kb_articles']
+        if 'error' in articles:
+            raise RuntimeError(articles['error'])
+        null_tags = articles['tags_null']
+        empty_array = articles['tags_empty_array']
+        null_string = articles['tags_null_string']
         
         print(f"📊 Статистика тегов:")
         print(f"  - NULL теги: {null_tags}")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Общий доступ к базе данных для скриптов tools/: конфигурация из окружения,
+потокобезопасный пул соединений, серверные курсоры, statement_timeout
+и замер времени каждого запроса
+"""
+
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+def get_db_config() -> Dict[str, object]:
+    """
+    Параметры подключения из окружения: DATABASE_URL или стандартные
+    переменные libpq (PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD, PGSSLMODE)
+    """
+    if os.environ.get('DATABASE_URL'):
+        return {'dsn': os.environ['DATABASE_URL']}
+    config = {
+        'host': os.environ.get('PGHOST'),
+        'port': int(os.environ.get('PGPORT', 5432)),
+        'database': os.environ.get('PGDATABASE', 'postgres'),
+        'user': os.environ.get('PGUSER'),
+        'password': os.environ.get('PGPASSWORD'),
+        'sslmode': os.environ.get('PGSSLMODE'),
+    }
+    return {key: value for key, value in config.items() if value is not None}
+
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 0))
+
+class QueryStats:
+    """Потокобезопасная статистика времени запросов по первой строке SQL"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries: Dict[str, dict] = {}
+
+    @staticmethod
+    def _label(sql) -> str:
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        lines = [line.strip() for line in str(sql).strip().splitlines() if line.strip()]
+        return ' '.join(lines[:2])[:100] if lines else '<empty>'
+
+    def record(self, sql, seconds: float, rows: int = -1):
+        label = self._label(sql)
+        with self._lock:
+            entry = self.queries.setdefault(label, {'calls': 0, 'total': 0.0, 'max': 0.0, 'rows': 0})
+            entry['calls'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            if rows > 0:
+                entry['rows'] += rows
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            print(f"  🐢 Медленный запрос ({seconds * 1000:.0f}ms): {label}")
+
+    def report(self, limit: int = 15):
+        """Выводит самые дорогие запросы"""
+        with self._lock:
+            items = sorted(self.queries.items(), key=lambda item: item[1]['total'], reverse=True)
+        if not items:
+            return
+        print(f"\n⏱  Время запросов к базе:")
+        for label, entry in items[:limit]:
+            avg_ms = entry['total'] * 1000 / entry['calls']
+            print(f"  - {entry['calls']:>6}x  всего {entry['total']:.3f}s  ср {avg_ms:.1f}ms  "
+                  f"макс {entry['max'] * 1000:.1f}ms  {label}")
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+
+query_stats = QueryStats()
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, записывающий время каждого запроса в query_stats"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            query_stats.record(query, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            query_stats.record(query, time.perf_counter() - started, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            query_stats.record(sql, time.perf_counter() - started, self.rowcount)
+
+class _BlockingPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool, который ждет свободное соединение,
+    а не падает с PoolError, когда все соединения заняты
+    """
+
+    def __init__(self, minconn: int, maxconn: int, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+class PooledConnection:
+    """
+    Соединение из пула с интерфейсом обычного соединения psycopg2:
+    close() откатывает незавершенную транзакцию и возвращает соединение в пул
+    """
+
+    def __init__(self, pool: _BlockingPool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        self._pool.putconn(conn, close=broken)
+
+_pool: Optional[_BlockingPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> _BlockingPool:
+    """Создает пул при первом обращении"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = {}
+                if STATEMENT_TIMEOUT_MS:
+                    options['options'] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+                _pool = _BlockingPool(POOL_MIN, max(POOL_MIN, POOL_MAX), cursor_factory=TimedCursor,
+                                      **options, **get_db_config())
+    return _pool
+
+def close_pool():
+    """Закрывает все соединения пула"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+atexit.register(close_pool)
+
+# DB_QUERY_REPORT=1 - вывести статистику запросов при завершении скрипта
+if os.environ.get('DB_QUERY_REPORT'):
+    atexit.register(query_stats.report)
+
+def connect() -> PooledConnection:
+    """Соединение из пула; close() возвращает его в пул, а не закрывает"""
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
+
+@contextmanager
+def connection(statement_timeout_ms: int = None):
+    """
+    Соединение из пула на время блока: коммит при успехе, откат при ошибке.
+
+    Args:
+        statement_timeout_ms: statement_timeout только для этой транзакции
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        if statement_timeout_ms is not None:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout_ms),))
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or bool(conn.closed))
+
+@contextmanager
+def cursor(statement_timeout_ms: int = None):
+    """Курсор на соединении из пула (см. connection)"""
+    with connection(statement_timeout_ms) as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+_cursor_counter = 0
+_cursor_counter_lock = threading.Lock()
+
+def named_cursor(conn, prefix: str = 'scan', itersize: int = 2000):
+    """
+    Серверный курсор для больших выборок: строки приходят порциями по itersize
+    и не материализуются на клиенте целиком
+    """
+    global _cursor_counter
+    with _cursor_counter_lock:
+        _cursor_counter += 1
+        name = f"{prefix}_{os.getpid()}_{_cursor_counter}"
+    cur = conn.cursor(name=name, cursor_factory=TimedCursor)
+    cur.itersize = itersize
+    return cur
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Статистика таблиц для скриптов проверки Supabase: все метрики таблицы
+считаются одним агрегирующим проходом, таблицы обрабатываются параллельно.
+Быстрый режим берет оценки из pg_class.reltuples и pg_stats без сканирования
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+
+# Метрики каждой таблицы: имя -> агрегат SQL. Все агрегаты таблицы
+# выполняются в одном SELECT, то есть за одно сканирование
+TABLE_METRICS: Dict[str, Dict[str, str]] = {
+    'kb_articles': {
+        'total': "COUNT(*)",
+        'with_tags': "COUNT(*) FILTER (WHERE tags IS NOT NULL)",
+        'with_content': "COUNT(*) FILTER (WHERE LENGTH(body_md) > 0)",
+        'tags_null': "COUNT(*) FILTER (WHERE tags IS NULL)",
+        # tags::text одинаково работает для TEXT[] ('{}'), jsonb и text ('[]'):
+        # сравнение TEXT[] со строкой '[]' падает и роняет весь проход
+        'tags_empty_array': "COUNT(*) FILTER (WHERE tags::text IN ('[]', '{}'))",
+        'tags_null_string': "COUNT(*) FILTER (WHERE tags::text = 'null')",
+    },
+    'kb_chunks': {
+        'total': "COUNT(*)",
+        'with_embeddings': "COUNT(embedding)",
+        'avg_length': "ROUND(AVG(LENGTH(chunk_text)), 2)",
+        'min_length': "MIN(LENGTH(chunk_text))",
+        'max_length': "MAX(LENGTH(chunk_text))",
+        'good_length': "COUNT(*) FILTER (WHERE LENGTH(chunk_text) > 100)",
+        'long': "COUNT(*) FILTER (WHERE LENGTH(chunk_text) > 500)",
+        'short': "COUNT(*) FILTER (WHERE LENGTH(chunk_text) < 50)",
+    },
+    'conversations': {'total': "COUNT(*)"},
+    'messages': {'total': "COUNT(*)"},
+    'operators': {'total': "COUNT(*)"},
+}
+
+DEFAULT_TABLES = list(TABLE_METRICS)
+
+def _scan_table(table: str, statement_timeout_ms: Optional[int]) -> dict:
+    """Один агрегирующий проход по таблице"""
+    metrics = TABLE_METRICS.get(table, {'total': "COUNT(*)"})
+    columns = ',\n            '.join(f"{expr} AS {name}" for name, expr in metrics.items())
+    started = time.perf_counter()
+    try:
+        with db.cursor(statement_timeout_ms) as cursor:
+            cursor.execute(f"SELECT\n            {columns}\n        FROM {table}")
+            row = cursor.fetchone()
+    except Exception as e:
+        return {'error': str(e).strip()}
+    result = {name: (float(value) if name.startswith('avg_') and value is not None else value)
+              for name, value in zip(metrics, row)}
+    result['estimated'] = False
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+def catalog_stats(tables: Sequence[str] = DEFAULT_TABLES) -> Dict[str, dict]:
+    """
+    Оценки из каталога без сканирования таблиц: число строк (reltuples),
+    размер, число индексов, доля NULL и средняя ширина колонок из pg_stats
+    """
+    with db.cursor() as cursor:
+        cursor.execute("""
+            SELECT
+                c.relname,
+                c.reltuples::bigint,
+                pg_total_relation_size(c.oid),
+                pg_size_pretty(pg_total_relation_size(c.oid)),
+                (SELECT COUNT(*) FROM pg_index i WHERE i.indrelid = c.oid)
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND c.relname = ANY(%s)
+        """, (list(tables),))
+        catalog = {
+            name: {'rows_estimate': rows, 'size_bytes': size, 'size': pretty, 'indexes': indexes, 'columns': {}}
+            for name, rows, size, pretty, indexes in cursor.fetchall()
+        }
+
+        cursor.execute("""
+            SELECT tablename, attname, null_frac, avg_width
+            FROM pg_stats
+            WHERE schemaname = 'public' AND tablename = ANY(%s)
+        """, (list(tables),))
+        for table, column, null_frac, avg_width in cursor.fetchall():
+            if table in catalog:
+                catalog[table]['columns'][column] = {'null_frac': null_frac, 'avg_width': avg_width}
+    return catalog
+
+def _estimate_table(table: str, entry: dict) -> dict:
+    """Метрики таблицы по оценкам планировщика; то, что не оценить, - None"""
+    total = entry['rows_estimate']
+    columns = entry['columns']
+
+    def not_null(column: str) -> Optional[int]:
+        if column not in columns:
+            return None
+        return round(total * (1 - columns[column]['null_frac']))
+
+    result = {name: None for name in TABLE_METRICS.get(table, {'total': None})}
+    result['total'] = total
+    if table == 'kb_articles':
+        result['with_tags'] = not_null('tags')
+        result['tags_null'] = None if result['with_tags'] is None else total - result['with_tags']
+        result['with_content'] = not_null('body_md')
+    elif table == 'kb_chunks':
+        result['with_embeddings'] = not_null('embedding')
+        # avg_width - средний размер значения в байтах (для кириллицы больше числа символов)
+        if 'chunk_text' in columns:
+            result['avg_length'] = float(columns['chunk_text']['avg_width'])
+    result['estimated'] = True
+    result['seconds'] = 0.0
+    return result
+
+def collect_stats(tables: Sequence[str] = DEFAULT_TABLES, fast: bool = False, workers: int = 4,
+                  statement_timeout_ms: Optional[int] = None) -> Dict[str, dict]:
+    """
+    Метрики таблиц: {таблица: {метрика: значение, 'estimated': bool}}
+    или {таблица: {'error': текст}}.
+
+    Args:
+        fast: оценки из каталога вместо сканирования; таблицы, которые
+            ни разу не анализировались (reltuples < 0), все равно сканируются
+        workers: число таблиц, сканируемых одновременно
+        statement_timeout_ms: ограничение времени одного прохода
+    """
+    stats: Dict[str, dict] = {}
+    to_scan: List[str] = list(tables)
+
+    if fast:
+        catalog = catalog_stats(tables)
+        to_scan = []
+        for table in tables:
+            entry = catalog.get(table)
+            if entry is None:
+                stats[table] = {'error': f'таблица {table} не найдена'}
+            elif entry['rows_estimate'] < 0:
+                to_scan.append(table)
+            else:
+                stats[table] = _estimate_table(table, entry)
+
+    if to_scan:
+        workers = max(1, min(workers, len(to_scan), db.POOL_MAX))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for table, result in zip(to_scan, pool.map(lambda t: _scan_table(t, statement_timeout_ms), to_scan)):
+                stats[table] = result
+
+    return {table: stats[table] for table in tables}
+
+def coverage_percent(chunks: dict) -> float:
+    """Доля чанков с эмбеддингами в процентах"""
+    total = chunks.get('total') or 0
+    with_embeddings = chunks.get('with_embeddings') or 0
+    return round(with_embeddings * 100.0 / total, 2) if total > 0 else 0.0
+
+def format_value(value) -> str:
+    """Значение метрики для вывода: None - нет оценки"""
+    if value is None:
+        return 'н/д'
+    if isinstance(value, float):
+        return f"{value:.0f}"
+    return str(value)
+
+def main():
+    """Вывод статистики таблиц"""
+    parser = argparse.ArgumentParser(description="Статистика таблиц Supabase")
+    parser.add_argument("--tables", nargs='+', default=DEFAULT_TABLES, help="Таблицы для проверки")
+    parser.add_argument("--fast", action="store_true", help="Оценки из pg_class/pg_stats без сканирования таблиц")
+    parser.add_argument("--workers", type=int, default=4, help="Таблиц, сканируемых параллельно (по умолчанию: 4)")
+    parser.add_argument("--timeout-ms", type=int, help="statement_timeout одного прохода")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = collect_stats(args.tables, fast=args.fast, workers=args.workers, statement_timeout_ms=args.timeout_ms)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+        return
+
+    print(f"📊 Статистика таблиц{' (оценки каталога)' if args.fast else ''}:")
+    for table, metrics in stats.items():
+        if 'error' in metrics:
+            print(f"  - {table}: ОШИБКА - {metrics['error']}")
+            continue
+        mark = '≈' if metrics['estimated'] else ''
+        details = ', '.join(f"{name}={format_value(value)}" for name, value in metrics.items()
+                            if name not in ('total', 'estimated', 'seconds'))
+        print(f"  - {table}: {mark}{format_value(metrics['total'])} записей"
+              f"{f' ({details})' if details else ''} [{metrics['seconds']:.2f}s]")
+    print(f"\n⏱  Всего: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Постоянный кеш эмбеддингов с адресацией по содержимому:
+ключ - хеш (модель, размерность, нормализованный текст), вектор хранится как float32.
+Весь кеш - один файл SQLite, его можно копировать между запусками и машинами
+"""
+
+import re
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+# Кеш по умолчанию (относительно корня репозитория)
+EMBEDDING_CACHE_PATH = Path('data/embedding_cache.db')
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст перед хешированием: NFC и схлопывание пробелов"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def cache_key(model: str, dim: int, text: str) -> bytes:
+    """
+    Ключ кеша: sha256 от модели, размерности и нормализованного текста.
+    Модели text-embedding-3 отдают векторы запрошенной размерности,
+    поэтому одна модель с разным dim - разные записи
+    """
+    return hashlib.sha256(f"{model}\0{dim}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+class EmbeddingCache:
+    """
+    Кеш эмбеддингов в SQLite с вытеснением давно не использованных записей
+    при превышении max_bytes. Потокобезопасен
+    """
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH, max_bytes: int = 2 * 1024 ** 3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings(last_used)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, dim: int, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Возвращает векторы в порядке текстов, None для отсутствующих
+        и для записей другой размерности
+        """
+        keys = [cache_key(model, dim, text) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite ограничивает число параметров в запросе
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ','.join('?' * len(part))
+                for key, stored_dim, vector in self._conn.execute(
+                        f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", part):
+                    if stored_dim == dim and len(vector) == dim * 4:
+                        found[key] = vector
+                if found:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time()] + part
+                    )
+            self._conn.commit()
+
+            result = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    result.append(None)
+                else:
+                    self.hits += 1
+                    result.append(array('f', blob).tolist())
+            return result
+
+    def put_many(self, model: str, dim: int, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """
+        Сохраняет векторы и вытесняет старые записи при превышении лимита.
+        Векторы не той размерности не кешируются
+        """
+        now = time.time()
+        rows = [
+            (cache_key(model, dim, text), model, dim, array('f', vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+            if len(vector) == dim
+        ]
+        with self._lock:
+            for row in rows:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)", row)
+                if cursor.rowcount:
+                    self._bytes += len(row[3])
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Удаляет давно не использованные записи до 90% лимита"""
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            removed = []
+            for key, size in rows:
+                removed.append((key,))
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", removed)
+            self.evicted += len(removed)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            'entries': entries,
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evicted': self.evicted
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+def main():
+    """Статистика и обслуживание кеша эмбеддингов"""
+    parser = argparse.ArgumentParser(description="Кеш эмбеддингов")
+    parser.add_argument("--path", default=str(EMBEDDING_CACHE_PATH), help=f"Файл кеша (по умолчанию: {EMBEDDING_CACHE_PATH})")
+    parser.add_argument("--max-mb", type=int, help="Сжать кеш до указанного размера в МБ")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(Path(args.path))
+    if args.max_mb is not None:
+        with cache._lock:
+            cache.max_bytes = args.max_mb * 1024 * 1024
+            if cache._bytes > cache.max_bytes:
+                cache._evict()
+            cache._conn.commit()
+            cache._conn.execute("VACUUM")
+    stats = cache.stats()
+    print(f"📦 Кеш эмбеддингов: {args.path}")
+    print(f"  - Записей: {stats['entries']}")
+    print(f"  - Размер векторов: {stats['bytes'] / 1024 / 1024:.1f} МБ")
+    if stats['evicted']:
+        print(f"  - Вытеснено: {stats['evicted']}")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
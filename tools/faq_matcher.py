@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Быстрый путь для готовых ответов: индекс вопросов из data/qa/faq.json и
+qa_pairs.json тенанта. Точное совпадение нормализованного вопроса или
+нечеткое - MinHash символьных триграмм с LSH и проверкой Джаккара -
+отвечает за десятки микросекунд, до запроса к RAG пайплайну
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from text_norm import normalize_question
+
+# Файлы по умолчанию (относительно корня репозитория)
+FAQ_PATH = Path('data/qa/faq.json')
+TENANTS_DIR = Path('data/tenants')
+
+DEFAULT_TENANT = 'default'
+
+# Язык ответов в faq.json и qa_pairs.json тенантов
+FAQ_LANGUAGE = 'ru'
+
+# MinHash: NUM_BANDS полос по BAND_ROWS значений. Пара с похожестью
+# Джаккара s становится кандидатом с вероятностью 1 - (1 - s^4)^16:
+# 0.99 при s = 0.7 и 0.64 при s = 0.5 (кандидаты проверяются точно)
+NUM_BANDS = 16
+BAND_ROWS = 4
+# Хеши multiply-shift: (a*x + b) mod 2^64 >> 32 с нечетным a, без деления
+_rng = np.random.RandomState(20240917)
+_HASH_A = (_rng.randint(0, 1 << 62, NUM_BANDS * BAND_ROWS, dtype=np.int64).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+_HASH_B = _rng.randint(0, 1 << 62, NUM_BANDS * BAND_ROWS, dtype=np.int64).astype(np.uint64)
+_SHIFT = np.uint64(32)
+
+# Слова, которые меняют смысл вопроса при почти тех же триграммах:
+# отрицания и вопросительные слова. Нечеткое совпадение требует их согласия
+# ("как проверить" не отвечает на "почему проверить", "кликнул не по ссылке" -
+# на "кликнул по ссылке")
+GUARD_WORDS = frozenset({
+    'не', 'ни', 'нет', 'без', 'нельзя', 'невозможно',
+    'как', 'почему', 'зачем', 'когда', 'где', 'куда', 'откуда', 'сколько', 'что', 'чем', 'кто', 'кому',
+    'какой', 'какая', 'какое', 'какие', 'каких', 'каким', 'какую', 'чей', 'чья', 'чье', 'ли',
+})
+
+def guard_words(text: str) -> frozenset:
+    """Отрицания и вопросительные слова нормализованного вопроса"""
+    return frozenset(word for word in re.findall(r'\w+', text) if word in GUARD_WORDS)
+
+def shingles(text: str) -> frozenset:
+    """Символьные триграммы нормализованного вопроса с границами слов"""
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def minhash(grams: frozenset) -> np.ndarray:
+    """Сигнатура MinHash: минимум хеша по триграммам для каждой пары (a, b)"""
+    if not grams:
+        return np.zeros(NUM_BANDS * BAND_ROWS, dtype=np.uint64)
+    # hash() строк случаен между процессами - индекс строится заново при загрузке
+    values = np.fromiter((hash(gram) & 0xFFFFFFFFFFFFFFFF for gram in grams), dtype=np.uint64, count=len(grams))
+    return ((values[:, None] * _HASH_A + _HASH_B) >> _SHIFT).min(axis=0)
+
+def read_faq(path: Path) -> List[Tuple[str, str, str]]:
+    """(id, вопрос, ответ) из faq.json - списка {id, q, a}"""
+    with open(path, encoding='utf-8') as f:
+        return [(str(item.get('id') or i), item['q'], item['a'])
+                for i, item in enumerate(json.load(f)) if item.get('q') and item.get('a')]
+
+def read_qa_pairs(path: Path) -> List[Tuple[str, str, str]]:
+    """(id, вопрос, ответ) из qa_pairs.json тенанта - на деле CSV с колонками Вопрос,Ответ"""
+    with open(path, encoding='utf-8', newline='') as f:
+        return [(f"qa-{i}", row['Вопрос'], row['Ответ'])
+                for i, row in enumerate(csv.DictReader(f)) if row.get('Вопрос') and row.get('Ответ')]
+
+class FAQIndex:
+    """
+    Индекс пар вопрос-ответ одного тенанта: словарь нормализованных
+    вопросов и LSH-таблицы сигнатур MinHash
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[str, str, str]], source: str = 'faq'):
+        self.ids: List[str] = []
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.grams: List[frozenset] = []
+        self.guards: List[frozenset] = []
+        self.exact: Dict[str, int] = {}
+        self.bands: List[Dict[bytes, List[int]]] = [{} for _ in range(NUM_BANDS)]
+        self.source = source
+        for entry_id, question, answer in pairs:
+            self.add(entry_id, question, answer)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: str, question: str, answer: str):
+        normalized = normalize_question(question)
+        # Повтор вопроса не перекрывает первый ответ
+        if not normalized or normalized in self.exact:
+            return
+        position = len(self.ids)
+        self.ids.append(entry_id)
+        self.questions.append(question)
+        self.answers.append(answer)
+        grams = shingles(normalized)
+        self.grams.append(grams)
+        self.guards.append(guard_words(normalized))
+        self.exact[normalized] = position
+        signature = minhash(grams)
+        for band, table in enumerate(self.bands):
+            key = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes()
+            table.setdefault(key, []).append(position)
+
+    def similar(self, grams: frozenset, signature: np.ndarray, threshold: float,
+                guards: frozenset = frozenset()) -> Tuple[Optional[int], float]:
+        """
+        Самый похожий вопрос среди кандидатов LSH с теми же отрицаниями
+        и вопросительными словами (guards): (позиция, Джаккар) или (None, 0)
+        """
+        candidates = set()
+        for band, table in enumerate(self.bands):
+            candidates.update(table.get(signature[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes(), ()))
+        best, best_score = None, 0.0
+        size = len(grams)
+        for candidate in candidates:
+            other = self.grams[candidate]
+            # Джаккар не больше отношения размеров множеств
+            if min(size, len(other)) < threshold * max(size, len(other)) or self.guards[candidate] != guards:
+                continue
+            common = len(grams & other)
+            score = common / (size + len(other) - common)
+            if score >= threshold and score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    def match(self, question: str, threshold: float = 0.7) -> Optional[Tuple[int, float, str]]:
+        """(позиция пары, похожесть, 'exact' или 'fuzzy') или None"""
+        normalized = normalize_question(question)
+        position = self.exact.get(normalized)
+        if position is not None:
+            return position, 1.0, 'exact'
+        grams = shingles(normalized)
+        position, score = self.similar(grams, minhash(grams), threshold, guard_words(normalized))
+        return None if position is None else (position, score, 'fuzzy')
+
+class FAQMatcher:
+    """
+    Готовые ответы по тенантам: общий faq.json и qa_pairs.json тенанта.
+    Индекс тенанта строится при первом вопросе и перестраивается, если
+    файлы изменились (mtime проверяется не чаще раза в check_interval
+    секунд). Индекс строится вне общей блокировки и подменяется готовым:
+    пока он перестраивается, другие потоки отвечают по прежнему.
+    Ответы написаны на одном языке (language): на вопросы с другим языком
+    ответа FAQ не отвечает. Потокобезопасен
+    """
+
+    def __init__(self, faq_path: Path = FAQ_PATH, tenants_dir: Path = TENANTS_DIR, threshold: float = 0.7,
+                 check_interval: float = 2.0, language: str = FAQ_LANGUAGE):
+        """
+        Args:
+            faq_path: Общие вопросы-ответы для всех тенантов
+            tenants_dir: Каталог тенантов с <tenant>/qa_pairs.json
+            threshold: Минимальная похожесть Джаккара по триграммам для нечеткого совпадения
+            check_interval: Как часто проверять изменения файлов, секунд
+            language: Язык готовых ответов
+        """
+        self.faq_path = Path(faq_path)
+        self.tenants_dir = Path(tenants_dir)
+        self.threshold = threshold
+        self.check_interval = check_interval
+        self.language = language
+        # tenant -> (индексы по источникам, mtime файлов, время проверки)
+        self._tenants: Dict[str, tuple] = {}
+        # tenant -> блокировка проверки и перестройки его индекса
+        self._builders: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'exact': 0, 'fuzzy': 0, 'misses': 0, 'reloads': 0, 'other_language': 0}
+
+    def _paths(self, tenant: str) -> List[Tuple[str, Path]]:
+        return [('tenant', self.tenants_dir / tenant / 'qa_pairs.json'), ('faq', self.faq_path)]
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def is_fresh(self, tenant: str = None) -> bool:
+        """
+        Индекс тенанта загружен и проверять файлы еще рано: match не обращается
+        к диску, его можно вызывать прямо из цикла событий
+        """
+        with self._lock:
+            state = self._tenants.get(tenant or DEFAULT_TENANT)
+        return state is not None and time.monotonic() - state[2] < self.check_interval
+
+    def _build(self, tenant: str, paths: List[Tuple[str, Path]], mtimes: List[Optional[int]]) -> List[FAQIndex]:
+        indexes = []
+        for (source, path), mtime in zip(paths, mtimes):
+            if mtime is None:
+                continue
+            try:
+                pairs = read_qa_pairs(path) if source == 'tenant' else read_faq(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Не удалось прочитать {path}: {e}")
+                continue
+            indexes.append(FAQIndex(pairs, source))
+        return indexes
+
+    def _load(self, tenant: str) -> List[FAQIndex]:
+        """Индексы тенанта: сначала его пары, затем общий FAQ"""
+        with self._lock:
+            state = self._tenants.get(tenant)
+            if state is not None and time.monotonic() - state[2] < self.check_interval:
+                return state[0]
+            builder = self._builders.setdefault(tenant, threading.Lock())
+
+        # Проверку и перестройку делает один поток; остальные отвечают по
+        # прежнему индексу, а без индекса ждут первую загрузку
+        if not builder.acquire(blocking=state is None):
+            return state[0]
+        try:
+            with self._lock:
+                current = self._tenants.get(tenant)
+            if current is not None and current is not state:
+                return current[0]
+            paths = self._paths(tenant)
+            mtimes = [self._mtime(path) for _, path in paths]
+            if state is not None and state[1] == mtimes:
+                indexes, reloaded = state[0], False
+            else:
+                indexes, reloaded = self._build(tenant, paths, mtimes), True
+            with self._lock:
+                self._tenants[tenant] = (indexes, mtimes, time.monotonic())
+                if reloaded:
+                    self.stats['reloads'] += 1
+            return indexes
+        finally:
+            builder.release()
+
+    def match(self, question: str, tenant: str = None) -> Optional[Dict]:
+        """
+        Готовый ответ на вопрос; tenant None - тенант по умолчанию
+
+        Returns:
+            Dict {id, question, answer, score, match, source} или None
+        """
+        normalized = normalize_question(question)
+        indexes = self._load(tenant or DEFAULT_TENANT)
+        found, score, kind = None, 0.0, 'exact'
+        for index in indexes:
+            position = index.exact.get(normalized)
+            if position is not None:
+                found, score = (index, position), 1.0
+                break
+        if found is None and normalized:
+            kind = 'fuzzy'
+            grams = shingles(normalized)
+            signature = minhash(grams)
+            guards = guard_words(normalized)
+            # При равной похожести побеждает тенант: его индекс первый
+            for index in indexes:
+                position, similarity = index.similar(grams, signature, self.threshold, guards)
+                if position is not None and similarity > score:
+                    found, score = (index, position), similarity
+        with self._lock:
+            self.stats['lookups'] += 1
+            self.stats[kind if found is not None else 'misses'] += 1
+        if found is None:
+            return None
+        index, position = found
+        return {'id': index.ids[position], 'question': index.questions[position],
+                'answer': index.answers[position], 'score': score, 'match': kind, 'source': index.source}
+
+    def serves(self, language: str = None) -> bool:
+        """Отвечает ли FAQ на этом языке; None - язык не указан"""
+        if not language or language.lower() == self.language:
+            return True
+        with self._lock:
+            self.stats['other_language'] += 1
+        return False
+
+    def answer(self, question: str, tenant: str = None, language: str = None) -> Optional[Dict]:
+        """
+        Ответ в формате /api/rag/query или None, если готового ответа нет
+        или ответ нужен не на языке FAQ
+        """
+        if not self.serves(language):
+            return None
+        started = time.perf_counter()
+        found = self.match(question, tenant)
+        if found is None:
+            return None
+        elapsed = round((time.perf_counter() - started) * 1000, 3)
+        return {
+            'success': True,
+            'data': {
+                'answer': found['answer'],
+                'sources': [{'id': found['id'], 'title': found['question'], 'content': found['answer'],
+                             'score': found['score'], 'source': found['source']}],
+                'confidence': found['score'],
+                'searchTime': elapsed,
+                'processingTime': 0,
+                'totalTime': elapsed,
+                'metadata': {'searchStrategy': 'faq', 'match': found['match']},
+            },
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, tenants={tenant: sum(len(index) for index in state[0])
+                                              for tenant, state in self._tenants.items()})
+        hits = stats['exact'] + stats['fuzzy']
+        stats['hit_rate'] = hits / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+def _typo(text: str, rng: random.Random) -> str:
+    """Одна опечатка: пропуск, удвоение или перестановка соседних букв"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+def synthetic_pairs(seed_questions: List[str], count: int, seed: int = 1) -> List[Tuple[str, str, str]]:
+    """count уникальных вопросов из слов настоящих вопросов (5-10 слов)"""
+    rng = random.Random(seed)
+    words = sorted({word for question in seed_questions for word in normalize_question(question).split()
+                    if len(word) > 2})
+    pairs, seen = [], set()
+    while len(pairs) < count:
+        question = ' '.join(rng.sample(words, rng.randint(5, 10))).capitalize() + '?'
+        if question not in seen:
+            seen.add(question)
+            pairs.append((f"syn-{len(pairs)}", question, f"Ответ {len(pairs)}"))
+    return pairs
+
+BENCHMARK_CASES = ('exact', 'fuzzy', 'unseen', 'negated', 'reworded')
+_QUESTION_WORDS = ('как', 'почему', 'зачем', 'когда', 'где', 'сколько')
+
+def benchmark(seed_questions: List[str], count: int = 100000, queries: int = 5000, threshold: float = 0.7,
+              seed: int = 2) -> Dict:
+    """
+    Индекс из count синтетических вопросов; запросы поровну: точные
+    (другой регистр и пунктуация), с опечаткой и словом-вставкой, новые
+    вопросы, которых в индексе нет, и почти совпадающие вопросы с другим
+    смыслом - со вставленным "не" и с другим вопросительным словом.
+    Попадание по трем последним видам - ложное
+    """
+    pairs = synthetic_pairs(seed_questions, count + queries)
+    indexed, unseen = pairs[:count], pairs[count:]
+    started = time.perf_counter()
+    index = FAQIndex(indexed)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    cases = []
+    for i in range(queries):
+        entry_id, question, _ = rng.choice(indexed)
+        kind = BENCHMARK_CASES[i % len(BENCHMARK_CASES)]
+        if kind == 'exact':
+            cases.append((kind, entry_id, question.upper().rstrip('?') + ' ?!'))
+        elif kind == 'fuzzy':
+            words = _typo(question, rng).split()
+            words.insert(rng.randrange(len(words) + 1), 'пожалуйста')
+            cases.append((kind, entry_id, ' '.join(words)))
+        elif kind == 'unseen':
+            cases.append((kind, None, unseen[i][1]))
+        elif kind == 'negated':
+            words = question.split()
+            words.insert(rng.randrange(1, len(words) + 1), 'не')
+            cases.append((kind, None, ' '.join(words)))
+        else:
+            words = question.split()
+            replaced = normalize_question(words[0]) in GUARD_WORDS
+            choices = [word for word in _QUESTION_WORDS if word != normalize_question(words[0])]
+            words[:1 if replaced else 0] = [rng.choice(choices).capitalize()]
+            cases.append((kind, None, ' '.join(words)))
+
+    results = {kind: {'queries': 0, 'correct': 0, 'wrong': 0, 'latency_us': []} for kind in BENCHMARK_CASES}
+    for kind, expected, question in cases:
+        started = time.perf_counter()
+        found = index.match(question, threshold)
+        elapsed = (time.perf_counter() - started) * 1e6
+        row = results[kind]
+        row['queries'] += 1
+        row['latency_us'].append(elapsed)
+        if found is not None:
+            row['correct' if index.ids[found[0]] == expected else 'wrong'] += 1
+
+    for row in results.values():
+        latencies = np.array(row.pop('latency_us'))
+        row['hit_rate'] = row['correct'] / row['queries']
+        row['p50_us'] = float(np.percentile(latencies, 50))
+        row['p99_us'] = float(np.percentile(latencies, 99))
+    return {'entries': len(index), 'build_seconds': build_seconds, 'cases': results}
+
+def main():
+    """Поиск готового ответа и бенчмарк индекса"""
+    parser = argparse.ArgumentParser(description="Быстрый путь по готовым вопросам-ответам")
+    parser.add_argument("question", nargs='?', help="Вопрос для поиска")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help=f"Тенант (по умолчанию: {DEFAULT_TENANT})")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Порог нечеткого совпадения (по умолчанию: 0.7)")
+    parser.add_argument("--benchmark", action="store_true", help="Бенчмарк на синтетическом наборе вопросов")
+    parser.add_argument("--count", type=int, default=100000, help="Вопросов в синтетическом индексе")
+    parser.add_argument("--queries", type=int, default=6000, help="Запросов в бенчмарке")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        seed_questions = [question for _, question, _ in read_qa_pairs(TENANTS_DIR / DEFAULT_TENANT / 'qa_pairs.json')]
+        report = benchmark(seed_questions, args.count, args.queries, args.threshold)
+        print(f"📚 Индекс: {report['entries']} вопросов за {report['build_seconds']:.1f}s")
+        for kind, row in report['cases'].items():
+            print(f"  - {kind:<8} {row['queries']} запросов: верных {row['hit_rate']:.1%}, ложных {row['wrong']}, "
+                  f"p50 {row['p50_us']:.0f}мкс, p99 {row['p99_us']:.0f}мкс")
+        return
+
+    if not args.question:
+        parser.error("нужен вопрос или --benchmark")
+    matcher = FAQMatcher(threshold=args.threshold)
+    started = time.perf_counter()
+    found = matcher.match(args.question, args.tenant)
+    elapsed = (time.perf_counter() - started) * 1e6
+    if found is None:
+        print(f"❌ Готового ответа нет (с загрузкой индекса {elapsed:.0f}мкс)")
+        return
+    started = time.perf_counter()
+    matcher.match(args.question, args.tenant)
+    print(f"✅ {found['match']} ({found['score']:.2f}, {found['source']}): {found['question']}")
+    print(f"   {found['answer'][:300]}")
+    print(f"⏱  {(time.perf_counter() - started) * 1e6:.0f}мкс (первый поиск с загрузкой {elapsed:.0f}мкс)")
+
+if __name__ == "__main__":
+    main()
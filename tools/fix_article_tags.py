@@ -3,122 +3,176 @@
 Скрипт для исправления тегов в статьях базы знаний
 """
 
-import psycopg2
+import os
 import sys
 import json
-import re
-
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
-
-def fix_article_tags():
+import time
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+from psycopg2.extras import execute_values
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from kb_manifest import bump_kb_version
+from tagging import TaggingEngine, TAG_RULES_PATH
+
+# Последний обработанный id для продолжения прерванного запуска
+CHECKPOINT_PATH = Path('data/fix_article_tags.checkpoint')
+
+def parse_tags(tags) -> Optional[list]:
+    """Возвращает теги списком или None, если их не удалось разобрать"""
+    if not tags:
+        return []
+    if isinstance(tags, list):
+        return tags
+    try:
+        parsed = json.loads(tags)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+_engine: Optional[TaggingEngine] = None
+
+def infer_tags(title: str, slug: str, body: str = '') -> List[str]:
+    """Генерирует теги по правилам из TAG_RULES_PATH на основе заголовка, slug и текста"""
+    global _engine
+    if _engine is None:
+        _engine = TaggingEngine.from_config(TAG_RULES_PATH)
+    return _engine.tag(title, slug, body)
+
+def compute_tags(title: str, slug: str, tags, body: str = '') -> Optional[List[str]]:
+    """Возвращает новые теги, если текущие нужно исправить, иначе None"""
+    current_tags = parse_tags(tags)
+    if current_tags is None or not current_tags or current_tags == ['']:
+        return infer_tags(title, slug, body)
+    return None
+
+def column_type(cursor, table: str, column: str) -> str:
+    """SQL тип колонки, чтобы привести к нему значения из VALUES"""
+    cursor.execute("""
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s
+    """, (table, column))
+    return cursor.fetchone()[0]
+
+def tags_value(tags: List[str], tags_type: str):
+    """
+    Значение тегов для записи: список для массивов (psycopg2 передает его
+    как ARRAY[...]), JSON строка для json/jsonb/text
+    """
+    if tags_type.endswith('[]'):
+        return list(tags)
+    return json.dumps(tags)
+
+def apply_tag_updates(cursor, updates: list, id_type: str, tags_type: str) -> int:
+    """Применяет пачку исправлений одним UPDATE ... FROM (VALUES ...)"""
+    execute_values(cursor, f"""
+        UPDATE kb_articles AS a
+        SET tags = v.tags
+        FROM (VALUES %s) AS v(id, tags)
+        WHERE a.id = v.id
+    """, updates, template=f"(%s::{id_type}, %s::{tags_type})", page_size=len(updates))
+    return cursor.rowcount
+
+def read_checkpoint() -> Optional[str]:
+    if CHECKPOINT_PATH.exists():
+        return CHECKPOINT_PATH.read_text(encoding='utf-8').strip() or None
+    return None
+
+def write_checkpoint(last_id: str):
+    CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CHECKPOINT_PATH.write_text(last_id, encoding='utf-8')
+
+def fix_article_tags(page_size: int = 1000, dry_run: bool = False, resume: bool = False, verbose: bool = False):
     """Исправляет теги в статьях базы знаний"""
+    reader = None
+    writer = None
     try:
-        # Подключение к базе данных
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        # Чтение через серверный курсор и запись идут по разным соединениям,
+        # чтобы коммит пачки не закрывал курсор
+        reader = db.connect()
+        writer = db.connect()
+        write_cursor = writer.cursor()
         print("✅ Подключение к Supabase установлено")
-        
-        # Получаем все статьи
-        cursor.execute("""
-            SELECT id, title, slug, tags 
-            FROM kb_articles 
-            ORDER BY title
-        """)
-        articles = cursor.fetchall()
-        
-        print(f"\n📊 Найдено {len(articles)} статей")
-        
+
+        id_type = column_type(write_cursor, 'kb_articles', 'id')
+        tags_type = column_type(write_cursor, 'kb_articles', 'tags')
+
+        resume_from = read_checkpoint() if resume else None
+        if resume_from:
+            print(f"↪️  Продолжаем после id {resume_from}")
+
+        scan = db.named_cursor(reader, 'fix_tags', itersize=page_size)
+        scan.execute(f"""
+            SELECT id, title, slug, tags, body_md
+            FROM kb_articles
+            {"WHERE id > %s::" + id_type if resume_from else ""}
+            ORDER BY id
+        """, (resume_from,) if resume_from else None)
+
         fixed_count = 0
         updated_count = 0
-        
-        for article in articles:
-            article_id, title, slug, tags = article
-            
-            # Проверяем текущие теги
-            current_tags = []
-            needs_fix = False
-            
-            if tags:
-                try:
-                    # Пытаемся парсить как JSON
-                    if isinstance(tags, str):
-                        current_tags = json.loads(tags)
-                    else:
-                        current_tags = tags
-                except (json.JSONDecodeError, TypeError):
-                    # Если не JSON, пытаемся извлечь теги из текста
-                    needs_fix = True
-                    print(f"  ⚠️  Проблема с тегами в статье '{title}'")
-            
-            # Если тегов нет или они пустые, добавляем базовые теги
-            if not current_tags or current_tags == [] or current_tags == ['']:
-                needs_fix = True
-                # Генерируем теги на основе заголовка и slug
-                base_tags = ['документация']
-                
-                # Добавляем теги на основе ключевых слов в заголовке
-                title_lower = title.lower()
-                if any(word in title_lower for word in ['инструкция', 'руководство', 'гайд']):
-                    base_tags.append('инструкция')
-                if any(word in title_lower for word in ['настройка', 'конфигурация', 'установка']):
-                    base_tags.append('настройка')
-                if any(word in title_lower for word in ['ошибка', 'проблема', 'решение']):
-                    base_tags.append('устранение-неполадок')
-                if any(word in title_lower for word in ['api', 'интеграция', 'подключение']):
-                    base_tags.append('api')
-                if any(word in title_lower for word in ['безопасность', 'защита', 'доступ']):
-                    base_tags.append('безопасность')
-                
-                # Добавляем тег на основе slug
-                if 'bot' in slug.lower():
-                    base_tags.append('бот')
-                if 'admin' in slug.lower():
-                    base_tags.append('администрирование')
-                if 'user' in slug.lower():
-                    base_tags.append('пользователь')
-                
-                current_tags = base_tags
-                print(f"  📝 Добавлены теги для '{title}': {current_tags}")
-            
-            if needs_fix:
-                # Обновляем теги в базе данных
-                cursor.execute("""
-                    UPDATE kb_articles 
-                    SET tags = %s 
-                    WHERE id = %s
-                """, (json.dumps(current_tags), article_id))
-                updated_count += 1
-            
-            fixed_count += 1
-        
-        # Коммитим изменения
-        conn.commit()
-        print(f"\n🎉 Исправление завершено!")
+        started = time.perf_counter()
+
+        while True:
+            page = scan.fetchmany(page_size)
+            if not page:
+                break
+
+            updates = []
+            for article_id, title, slug, tags, body_md in page:
+                new_tags = compute_tags(title, slug, tags, body_md)
+                if new_tags is not None:
+                    updates.append((str(article_id), tags_value(new_tags, tags_type)))
+                    if verbose:
+                        print(f"  📝 Теги для '{title}': {new_tags}")
+
+            if updates and not dry_run:
+                apply_tag_updates(write_cursor, updates, id_type, tags_type)
+                writer.commit()
+            if not dry_run:
+                write_checkpoint(str(page[-1][0]))
+
+            fixed_count += len(page)
+            updated_count += len(updates)
+            elapsed = time.perf_counter() - started
+            print(f"  ⏳ Обработано {fixed_count}, к обновлению {updated_count} "
+                  f"({fixed_count / elapsed if elapsed > 0 else 0:.0f} статей/сек)")
+
+        scan.close()
+        if updated_count and not dry_run:
+            bump_kb_version('fix_article_tags')
+        elapsed = time.perf_counter() - started
+        if not dry_run and CHECKPOINT_PATH.exists():
+            CHECKPOINT_PATH.unlink()
+
+        print(f"\n🎉 Исправление завершено!{' (dry run - изменения не записаны)' if dry_run else ''}")
         print(f"  - Обработано статей: {fixed_count}")
-        print(f"  - Обновлено статей: {updated_count}")
-        
+        print(f"  - {'Требуют обновления' if dry_run else 'Обновлено статей'}: {updated_count}")
+        print(f"  - Время: {elapsed:.2f}s ({fixed_count / elapsed if elapsed > 0 else 0:.0f} статей/сек, "
+              f"{updated_count / elapsed if elapsed > 0 else 0:.0f} обновлений/сек)")
+
         # Показываем статистику тегов (исправленная версия)
         try:
-            cursor.execute("""
+            write_cursor.execute("""
                 SELECT tags, COUNT(*) as count
-                FROM kb_articles 
-                WHERE tags IS NOT NULL AND tags != '[]' AND tags != 'null' AND tags != '""'
-                GROUP BY tags 
-                ORDER BY count DESC 
+                FROM kb_articles
+                WHERE tags IS NOT NULL AND tags::text NOT IN ('[]', '{}', 'null', '""')
+                GROUP BY tags
+                ORDER BY count DESC
                 LIMIT 10
             """)
-            tag_stats = cursor.fetchall()
+            tag_stats = write_cursor.fetchall()
         except Exception as e:
             print(f"    ⚠️  Ошибка получения статистики тегов: {e}")
+            writer.rollback()
             tag_stats = []
-        
+
         print(f"\n📊 Топ тегов:")
         for tags, count in tag_stats:
             try:
@@ -126,17 +180,31 @@ def fix_article_tags():
                 print(f"  - {tag_list}: {count} статей")
             except:
                 print(f"  - {tags}: {count} статей")
-        
+
     except Exception as e:
         print(f"❌ Ошибка: {e}")
-        if 'conn' in locals():
-            conn.rollback()
+        if writer is not None:
+            writer.rollback()
+        if not dry_run and CHECKPOINT_PATH.exists():
+            print(f"   Для продолжения запустите с --resume")
         sys.exit(1)
     finally:
-        if 'conn' in locals():
-            cursor.close()
-            conn.close()
+        for conn in (reader, writer):
+            if conn is not None:
+                conn.close()
+        if writer is not None:
             print("🔌 Соединение с Supabase закрыто")
 
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Исправление тегов в статьях базы знаний")
+    parser.add_argument("--page-size", type=int, default=1000, help="Статей в одной пачке (по умолчанию: 1000)")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать, какие статьи будут обновлены")
+    parser.add_argument("--resume", action="store_true", help=f"Продолжить с последней пачки из {CHECKPOINT_PATH}")
+    parser.add_argument("--verbose", action="store_true", help="Показывать новые теги каждой статьи")
+    args = parser.parse_args()
+
+    fix_article_tags(page_size=args.page_size, dry_run=args.dry_run, resume=args.resume, verbose=args.verbose)
+
 if __name__ == "__main__":
-    fix_article_tags()
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Потоковый импорт пар вопрос-ответ тенантов (data/tenants/<tenant>/qa_pairs.json,
+на деле CSV с колонками Вопрос,Ответ) в kb_articles и kb_chunks. Файл
+читается построчно, пачки пишутся через bulk_load_articles - память не
+зависит от размера файла
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import resource
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kb_manifest import bump_kb_version, text_hash
+from text_norm import normalize_question
+
+# Каталог тенантов (относительно корня репозитория)
+TENANTS_DIR = Path('data/tenants')
+QA_FILENAME = 'qa_pairs.json'
+
+# Ответы с длинными инструкциями бывают больше лимита csv по умолчанию (128 KB)
+csv.field_size_limit(16 * 1024 * 1024)
+
+def qa_slug(tenant: str, question: str) -> str:
+    """Slug статьи: тенант и хеш нормализованного вопроса - повторный импорт обновляет ту же статью"""
+    return f"qa-{tenant}-{text_hash(normalize_question(question))[:16]}"
+
+def qa_article(tenant: str, question: str, answer: str) -> dict:
+    """Статья из пары: заголовок - вопрос, один чанк с вопросом и ответом"""
+    question, answer = question.strip(), answer.strip()
+    return {
+        'title': question,
+        'slug': qa_slug(tenant, question),
+        'tags': ['qa', f"tenant:{tenant}"],
+        'body_md': f"# {question}\n\n{answer}",
+        'chunks': [{'index': 0, 'text': f"{question}\n\n{answer}"}],
+    }
+
+def read_qa_articles(path: Path, tenant: str, stats: Dict = None) -> Iterator[dict]:
+    """Статьи из файла пар по одной; строки без вопроса или ответа пропускаются"""
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            question, answer = row.get('Вопрос'), row.get('Ответ')
+            if not question or not question.strip() or not answer or not answer.strip():
+                if stats is not None:
+                    stats['skipped'] += 1
+                continue
+            yield qa_article(tenant, question, answer)
+
+def tenant_files(tenants_dir: Path = TENANTS_DIR, tenants: List[str] = None) -> List[tuple]:
+    """(тенант, файл пар) для всех тенантов или только перечисленных"""
+    files = []
+    for path in sorted(Path(tenants_dir).glob(f"*/{QA_FILENAME}")):
+        if tenants is None or path.parent.name in tenants:
+            files.append((path.parent.name, path))
+    return files
+
+def import_tenant(cursor, conn, tenant: str, path: Path, batch_size: int = 1000) -> Dict:
+    """
+    Импортирует файл пар одного тенанта: пачка из batch_size статей -
+    один bulk_load_articles и коммит. cursor=None - только разбор (замер
+    скорости без базы)
+    """
+    if cursor is not None:
+        from load_knowledge_optimized import bulk_load_articles
+
+    stats = {'tenant': tenant, 'rows': 0, 'skipped': 0, 'articles': 0, 'chunks': 0, 'batches': 0,
+             'bytes': path.stat().st_size}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if cursor is not None:
+            result = bulk_load_articles(cursor, batch)
+            conn.commit()
+            bump_kb_version(f"qa:{tenant}")
+            stats['articles'] += result['articles']
+            stats['chunks'] += result['chunks']
+        else:
+            stats['articles'] += len(batch)
+            stats['chunks'] += sum(len(article['chunks']) for article in batch)
+        stats['batches'] += 1
+        batch.clear()
+
+    try:
+        for article in read_qa_articles(path, tenant, stats):
+            stats['rows'] += 1
+            batch.append(article)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except Exception:
+        if conn is not None:
+            conn.rollback()
+        raise
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['mb_per_sec'] = stats['bytes'] / 1024 ** 2 / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return stats
+
+def generate_synthetic_qa(path: Path, size_bytes: int, seed_path: Path, seed: int = 42) -> int:
+    """
+    Пишет CSV пар размером не меньше size_bytes: вопросы и ответы
+    собраны из настоящих пар (многострочные ответы в кавычках)
+    """
+    rng = random.Random(seed)
+    with open(seed_path, encoding='utf-8', newline='') as f:
+        pairs = [(row['Вопрос'], row['Ответ']) for row in csv.DictReader(f) if row.get('Вопрос') and row.get('Ответ')]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Вопрос', 'Ответ'])
+        while f.tell() < size_bytes:
+            question, answer = rng.choice(pairs)
+            writer.writerow([f"{question} #{rows}", answer])
+            rows += 1
+    return rows
+
+def print_tenant_stats(stats: Dict):
+    print(f"  - {stats['tenant']}: {stats['rows']} пар ({stats['skipped']} пропущено), "
+          f"статей {stats['articles']}, чанков {stats['chunks']}, {stats['batches']} пачек")
+    print(f"    ⏱  {stats['seconds']:.1f}s: {stats['mb_per_sec']:.1f} MB/s, {stats['rows_per_sec']:.0f} пар/сек")
+
+def main():
+    """Импорт пар вопрос-ответ тенантов в базу знаний"""
+    parser = argparse.ArgumentParser(description="Потоковый импорт qa_pairs.json тенантов в kb_articles/kb_chunks")
+    parser.add_argument("--tenants-dir", default=str(TENANTS_DIR), help=f"Каталог тенантов (по умолчанию: {TENANTS_DIR})")
+    parser.add_argument("--tenant", action="append", help="Импортировать только этого тенанта (можно несколько)")
+    parser.add_argument("--file", help="Импортировать один файл пар (нужен --tenant)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Пар в одном коммите (по умолчанию: 1000)")
+    parser.add_argument("--dry-run", action="store_true", help="Только разобрать файлы, без записи в базу")
+    parser.add_argument("--synthetic-gb", type=float,
+                        help="Замер: сгенерировать CSV такого размера из пар default и импортировать его")
+    parser.add_argument("--synthetic-path", default="/tmp/qa_synthetic/qa_pairs.json",
+                        help="Куда писать синтетический CSV")
+    args = parser.parse_args()
+
+    if args.synthetic_gb:
+        path = Path(args.synthetic_path)
+        size = int(args.synthetic_gb * 1024 ** 3)
+        if not path.exists() or path.stat().st_size < size:
+            print(f"📁 Генерируем {args.synthetic_gb:g} GB синтетических пар в {path}...")
+            generate_synthetic_qa(path, size, Path(args.tenants_dir) / 'default' / QA_FILENAME)
+        files = [('synthetic', path)]
+    elif args.file:
+        if not args.tenant or len(args.tenant) != 1:
+            parser.error("--file требует один --tenant")
+        files = [(args.tenant[0], Path(args.file))]
+    else:
+        files = tenant_files(Path(args.tenants_dir), args.tenant)
+    if not files:
+        print(f"❌ Нет файлов {QA_FILENAME} в {args.tenants_dir}")
+        return
+
+    conn = cursor = None
+    if not args.dry_run:
+        import db
+
+        conn = db.connect()
+        cursor = conn.cursor()
+
+    print(f"📥 Импорт пар вопрос-ответ{' (без записи в базу)' if args.dry_run else ''}:")
+    try:
+        for tenant, path in files:
+            print_tenant_stats(import_tenant(cursor, conn, tenant, path, args.batch_size))
+    finally:
+        if conn is not None:
+            cursor.close()
+            conn.close()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"  💾 Пиковая память процесса: {peak_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Локальный BM25-индекс по тексту чанков и гибридный поиск вместе с
+векторным индексом: слияние reciprocal rank fusion или формула rag_hybrid_search
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import heapq
+import random
+import argparse
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kb_manifest import chunk_uuid
+from tagging import stem
+
+# Индекс по умолчанию (относительно корня репозитория)
+BM25_INDEX_PATH = Path('data/kb_bm25.json')
+
+# Веса rag_hybrid_search (migrations/001_pgvector_setup.sql)
+VECTOR_WEIGHT = 0.7
+TEXT_WEIGHT = 0.3
+
+_WORD_RE = re.compile(r'\w+')
+
+def _unaccent(text: str) -> str:
+    """Убирает диакритику, как unaccent: й -> и, é -> e"""
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+def tokenize(text: str, use_stem: bool = False) -> List[str]:
+    """
+    Токены как у to_tsvector('simple', unaccent(...)): нижний регистр,
+    ё -> е, без диакритики. С use_stem русские слова дополнительно сводятся
+    к основе (до unaccent, чтобы окончания на -й распознавались)
+    """
+    words = _WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    if use_stem:
+        words = [stem(word) for word in words]
+    return _unaccent(' '.join(words)).split()
+
+def sql_query_terms(query: str) -> List[str]:
+    """
+    Термины plainto_tsquery('simple', q_text): запрос в rag_hybrid_search не
+    проходит через unaccent, поэтому слово с ё или диакритикой не совпадет
+    с текстом чанка, как и в Postgres
+    """
+    return list(dict.fromkeys(_WORD_RE.findall((query or '').lower())))
+
+class BM25Index:
+    """
+    Инвертированный индекс с BM25 (k1, b). Документ - чанк статьи с ключом
+    chunk_uuid(slug, chunk_index), тем же id, что пишет инкрементальная загрузка.
+    Добавление и удаление меняют только затронутые списки словопозиций
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, use_stem: bool = False):
+        self.k1 = k1
+        self.b = b
+        self.use_stem = use_stem
+        # термин -> {ключ: tf}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        # ключ -> {slug, chunk_index, text}
+        self.docs: Dict[str, dict] = {}
+        # slug -> ключи чанков статьи
+        self.articles: Dict[str, set] = {}
+        # ключ -> уникальные термины чанка, чтобы удаление не токенизировало заново
+        self._terms: Dict[str, List[str]] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add_chunk(self, slug: str, chunk_index: int, text: str) -> str:
+        """Добавляет или заменяет чанк, возвращает его ключ"""
+        key = chunk_uuid(slug, chunk_index)
+        self.remove(key)
+        tokens = tokenize(text, self.use_stem)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[key] = tf
+        self._terms[key] = list(counts)
+        self.doc_len[key] = len(tokens)
+        self.total_len += len(tokens)
+        self.docs[key] = {'slug': slug, 'chunk_index': chunk_index, 'text': text}
+        self.articles.setdefault(slug, set()).add(key)
+        return key
+
+    def remove(self, key: str) -> bool:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return False
+        for term in self._terms.pop(key):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(key)
+        keys = self.articles.get(doc['slug'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.articles[doc['slug']]
+        return True
+
+    def remove_article(self, slug: str, keep_indexes: Iterable[int] = ()) -> int:
+        """Удаляет чанки статьи, кроме keep_indexes"""
+        keep = {chunk_uuid(slug, index) for index in keep_indexes}
+        stale = [key for key in self.articles.get(slug, ()) if key not in keep]
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def add_article(self, article: dict, chunks: Sequence[dict]):
+        """Заменяет все чанки статьи"""
+        self.remove_article(article['slug'], [chunk['index'] for chunk in chunks])
+        for chunk in chunks:
+            self.add_chunk(article['slug'], chunk['index'], chunk['text'])
+
+    def apply_sync_plan(self, plan: dict) -> dict:
+        """Переносит изменения из plan_incremental_sync загрузчика"""
+        stats = {'chunks_written': 0, 'chunks_deleted': 0}
+        for item in plan['changed']:
+            slug = item['article']['slug']
+            for chunk in item['changed_chunks']:
+                self.add_chunk(slug, chunk['index'], chunk['text'])
+            stats['chunks_written'] += len(item['changed_chunks'])
+            stats['chunks_deleted'] += self.remove_article(slug, item['chunk_indexes'])
+        for slug in plan['removed_slugs']:
+            stats['chunks_deleted'] += self.remove_article(slug)
+        return stats
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_len) - df + 0.5) / (df + 0.5))
+
+    def score(self, query: str, keys: Iterable[str] = None, terms: Sequence[str] = None,
+              require_all: bool = False) -> Dict[str, float]:
+        """
+        BM25 по всем документам с терминами запроса или только по keys.
+        require_all оставляет документы со всеми терминами, как & в plainto_tsquery
+        """
+        if not self.doc_len:
+            return {}
+        avg_len = self.total_len / len(self.doc_len) or 1.0
+        only = set(keys) if keys is not None else None
+        terms = set(tokenize(query, self.use_stem) if terms is None else terms)
+        scores: Dict[str, float] = {}
+        matched: Counter = Counter()
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                if require_all:
+                    return {}
+                continue
+            idf = self.idf(term)
+            items = postings.items() if only is None else ((k, postings[k]) for k in only if k in postings)
+            for key, tf in items:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[key] / avg_len)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[key] += 1
+        if require_all:
+            return {key: value for key, value in scores.items() if matched[key] == len(terms)}
+        return scores
+
+    def search(self, query: str, k: int = 8) -> List[Tuple[str, float]]:
+        """[(ключ, BM25)] по убыванию"""
+        return heapq.nlargest(k, self.score(query).items(), key=lambda item: item[1])
+
+    def save(self, path: Path = BM25_INDEX_PATH):
+        """Сохраняет чанки и параметры; списки словопозиций строятся при загрузке"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'k1': self.k1, 'b': self.b, 'use_stem': self.use_stem,
+            'chunks': [[doc['slug'], doc['chunk_index'], doc['text']] for doc in self.docs.values()]
+        }
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path = BM25_INDEX_PATH) -> 'BM25Index':
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        index = cls(k1=data['k1'], b=data['b'], use_stem=data['use_stem'])
+        for slug, chunk_index, text in data['chunks']:
+            index.add_chunk(slug, chunk_index, text)
+        return index
+
+    @classmethod
+    def from_kb(cls, kb_path: Path, chunker=None, **options) -> 'BM25Index':
+        """Строит индекс по markdown-файлам тем же разбиением, что и загрузчик"""
+        from kb_markdown import parse_markdown_file, split_article_into_chunks
+
+        index = cls(**options)
+        for md_file in sorted(Path(kb_path).glob('*.md')):
+            article = parse_markdown_file(md_file)
+            index.add_article(article, split_article_into_chunks(article, chunker))
+        return index
+
+def rrf_fuse(rankings: Sequence[Sequence[Tuple[str, float]]], k: int = 8, rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Reciprocal rank fusion: сумма 1 / (rrf_k + ранг) по всем спискам"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (key, _) in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+
+def hybrid_search(vector_index, bm25_index: BM25Index, query_vector, query_text: str, k: int = 8,
+                  min_sim: float = 0.5, fusion: str = 'rrf') -> List[dict]:
+    """
+    Гибридный поиск по локальным индексам.
+
+    fusion='sql' повторяет rag_hybrid_search: кандидаты - GREATEST(k*4, 32)
+    ближайших векторов, score = 0.7 * cos_sim + 0.3 * текстовая оценка.
+    Как и plainto_tsquery('simple', ...), оценка ненулевая только при всех
+    терминах запроса в чанке, индекс должен быть без основ слов. Вместо
+    ts_rank_cd берется сырой BM25 - шкалы разные, поэтому при совпадении
+    всех слов текстовая часть весит больше, чем в SQL.
+    fusion='rrf' сливает векторный и BM25 top-N по рангам
+    """
+    candidates = max(k * 4, 32)
+    vector_hits = vector_index.search(query_vector, candidates)
+    cos_sim = dict(vector_hits)
+
+    if fusion == 'sql':
+        if bm25_index.use_stem:
+            raise ValueError("fusion='sql' требует BM25-индекс без основ слов (use_stem=False)")
+        text_scores = bm25_index.score(query_text, cos_sim, sql_query_terms(query_text), require_all=True)
+        ranked = sorted(
+            ((key, VECTOR_WEIGHT * sim + TEXT_WEIGHT * text_scores.get(key, 0.0))
+             for key, sim in vector_hits if sim >= min_sim),
+            key=lambda item: item[1], reverse=True
+        )[:k]
+    elif fusion == 'rrf':
+        ranked = rrf_fuse([[hit for hit in vector_hits if hit[1] >= min_sim],
+                           bm25_index.search(query_text, candidates)], k)
+        text_scores = bm25_index.score(query_text, [key for key, _ in ranked])
+    else:
+        raise ValueError(f"Неизвестный способ слияния: {fusion}")
+
+    results = []
+    for key, score in ranked:
+        doc = bm25_index.docs.get(key, {})
+        results.append({
+            'id': key,
+            **vector_index.payloads.get(key, {}),
+            'chunk_text': doc.get('text'),
+            'cos_sim': cos_sim.get(key),
+            'bm25': text_scores.get(key, 0.0),
+            'hybrid_score': score
+        })
+    return results
+
+def compare_with_sql(vector_index, bm25_index: BM25Index, samples: int = 20, k: int = 8, min_sim: float = 0.0):
+    """
+    Сравнивает fusion='sql' с rag_hybrid_search на чанках из базы:
+    вектор запроса - embedding_vec случайного чанка, текст - его первые слова
+    """
+    import db
+    from kb_vector_index import parse_vector
+
+    keys = [key for key in vector_index.payloads if key in bm25_index.docs]
+    if not keys:
+        print("❌ Нет общих чанков у векторного и BM25 индексов")
+        return
+    overlaps = []
+    with db.cursor() as cursor:
+        for key in random.Random(3).sample(keys, min(samples, len(keys))):
+            payload = vector_index.payloads[key]
+            query_text = ' '.join(bm25_index.docs[key]['text'].split()[:6])
+            cursor.execute("""
+                SELECT embedding_vec::text FROM kb_chunks WHERE id = %s
+            """, (payload['chunk_id'],))
+            query_vector = parse_vector(cursor.fetchone()[0])
+            cursor.execute("""
+                SELECT article_id, chunk_index FROM rag_hybrid_search(%s::vector, %s, %s, %s)
+            """, ('[' + ','.join(map(str, query_vector.tolist())) + ']', query_text, k, min_sim))
+            sql_top = {(str(article_id), chunk_index) for article_id, chunk_index in cursor.fetchall()}
+            local_top = {
+                (hit['article_id'], hit['chunk_index'])
+                for hit in hybrid_search(vector_index, bm25_index, query_vector, query_text, k, min_sim, 'sql')
+            }
+            if sql_top:
+                overlaps.append(len(sql_top & local_top) / len(sql_top))
+    if overlaps:
+        print(f"📐 Совпадение top-{k} с rag_hybrid_search: {sum(overlaps) / len(overlaps):.1%} ({len(overlaps)} запросов)")
+
+def main():
+    """Построение BM25-индекса, поиск и сравнение с SQL"""
+    parser = argparse.ArgumentParser(description="Локальный BM25-индекс по чанкам базы знаний")
+    parser.add_argument("--kb-path", default="apps/support-gateway/kb_articles", help="Папка с markdown статьями")
+    parser.add_argument("--path", default=str(BM25_INDEX_PATH), help=f"Файл индекса (по умолчанию: {BM25_INDEX_PATH})")
+    parser.add_argument("--build", action="store_true", help="Построить индекс по статьям из --kb-path")
+    parser.add_argument("--chunker", default="paragraph", help="Чанкер, как у загрузчика (по умолчанию: paragraph)")
+    parser.add_argument("--stem", action="store_true",
+                        help="Сводить русские слова к основе (не совместимо с fusion='sql')")
+    parser.add_argument("--query", help="Найти чанки по запросу")
+    parser.add_argument("-k", type=int, default=8, help="Сколько чанков вернуть")
+    parser.add_argument("--compare", type=int, metavar="N", help="Сравнить с rag_hybrid_search на N запросах")
+    parser.add_argument("--vector-index", help="Файл векторного индекса для --compare (kb_vector_index)")
+    args = parser.parse_args()
+
+    if args.build:
+        from kb_chunker import get_chunker
+
+        started = time.perf_counter()
+        index = BM25Index.from_kb(Path(args.kb_path), get_chunker(args.chunker), use_stem=args.stem)
+        index.save(Path(args.path))
+        print(f"✅ BM25-индекс: {len(index)} чанков, {len(index.postings)} терминов "
+              f"за {time.perf_counter() - started:.2f}s -> {args.path}")
+    else:
+        index = BM25Index.load(Path(args.path))
+
+    if args.query:
+        started = time.perf_counter()
+        hits = index.search(args.query, args.k)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"🔍 '{args.query}': {len(hits)} чанков за {elapsed:.2f}ms")
+        for key, score in hits:
+            doc = index.docs[key]
+            print(f"  - {score:.3f}  {doc['slug']}#{doc['chunk_index']}: {doc['text'][:80]!r}")
+
+    if args.compare:
+        from kb_vector_index import VectorIndex, VECTOR_INDEX_PATH
+
+        compare_with_sql(VectorIndex.load(Path(args.vector_index or VECTOR_INDEX_PATH)), index, args.compare, args.k)
+
+if __name__ == "__main__":
+    main()
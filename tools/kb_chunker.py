@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Разбиение статей базы знаний на чанки для RAG системы
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Callable, Dict, List
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    _ENCODING = None
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+')
+
+def estimate_tokens(text: str) -> int:
+    """
+    Число токенов текста: через tiktoken, если он установлен,
+    иначе оценка ~4 байта UTF-8 на токен (кириллица ~2 символа на токен)
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, (len(text.encode('utf-8')) + 3) // 4)
+
+class ParagraphChunker:
+    """
+    Исходный сплиттер: один параграф - один чанк. Параграфы не длиннее
+    min_chars (заголовки, короткие строки) не отбрасываются, а приклеиваются
+    к следующему параграфу, в конце статьи - к предыдущему
+    """
+
+    name = 'paragraph'
+
+    def __init__(self, min_chars: int = 50):
+        self.min_chars = min_chars
+
+    def config(self) -> dict:
+        """Имя и параметры чанкера - при их смене чанки статей нужно пересобрать"""
+        return {'name': self.name, 'min_chars': self.min_chars, 'short': 'merge'}
+
+    def split(self, article_data: dict) -> List[dict]:
+        chunks = []
+        pending = []
+        for paragraph in article_data['body_md'].split('\n\n'):
+            chunk_text = paragraph.strip()
+            if not chunk_text:
+                continue
+            pending.append(chunk_text)
+            if len(chunk_text) > self.min_chars:
+                chunks.append({'text': '\n\n'.join(pending), 'index': len(chunks)})
+                pending = []
+        if pending:
+            if chunks:
+                chunks[-1]['text'] = '\n\n'.join([chunks[-1]['text']] + pending)
+            else:
+                chunks.append({'text': '\n\n'.join(pending), 'index': 0})
+        return chunks
+
+class TokenBudgetChunker:
+    """
+    Упаковывает параграфы в чанки до max_tokens с перекрытием overlap_tokens.
+    Слишком длинные параграфы режутся по предложениям, затем по словам.
+    Весь текст статьи попадает в чанки, заголовок начинает новый чанк
+    """
+
+    name = 'token'
+
+    def __init__(self, max_tokens: int = 400, overlap_tokens: int = 50,
+                 min_tokens: int = 80, token_counter: Callable[[str], int] = None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens должен быть меньше max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.count_tokens = token_counter or estimate_tokens
+
+    def config(self) -> dict:
+        """Имя и параметры чанкера, включая способ подсчета токенов"""
+        if self.count_tokens is estimate_tokens:
+            counter = 'tiktoken' if _ENCODING is not None else 'bytes'
+        else:
+            counter = getattr(self.count_tokens, '__name__', repr(self.count_tokens))
+        return {
+            'name': self.name,
+            'max_tokens': self.max_tokens,
+            'overlap_tokens': self.overlap_tokens,
+            'min_tokens': self.min_tokens,
+            'token_counter': counter
+        }
+
+    def _units(self, body_md: str):
+        """
+        Разбивает текст на единицы упаковки: (текст, токены, разделитель, это_заголовок)
+        """
+        for block in re.split(r'\n\s*\n', body_md):
+            block = block.strip()
+            if not block:
+                continue
+
+            if '\n' not in block and _HEADING_RE.match(block):
+                yield block, self.count_tokens(block), '\n\n', True
+                continue
+
+            tokens = self.count_tokens(block)
+            if tokens <= self.max_tokens:
+                yield block, tokens, '\n\n', False
+                continue
+
+            sep = '\n\n'
+            for sentence in _SENTENCE_RE.split(block):
+                for piece in self._split_long(sentence):
+                    yield piece, self.count_tokens(piece), sep, False
+                    sep = ' '
+
+    def _split_long(self, text: str) -> List[str]:
+        """Режет слишком длинное предложение на окна по словам"""
+        if self.count_tokens(text) <= self.max_tokens:
+            return [text]
+        pieces = []
+        current = []
+        current_tokens = 0
+        for word in text.split(' '):
+            word_tokens = self.count_tokens(word + ' ')
+            if current and current_tokens + word_tokens > self.max_tokens:
+                pieces.append(' '.join(current))
+                current = []
+                current_tokens = 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append(' '.join(current))
+        return pieces
+
+    def split(self, article_data: dict) -> List[dict]:
+        chunks = []
+        current = []  # [(текст, токены, разделитель)]
+        current_tokens = 0
+        has_new_content = False
+
+        def flush():
+            nonlocal current, current_tokens, has_new_content
+            if not has_new_content:
+                return
+            text = current[0][0] + ''.join(unit[2] + unit[0] for unit in current[1:])
+            chunks.append({
+                'text': text,
+                'index': len(chunks),
+                'metadata': {'tokens': current_tokens}
+            })
+
+            # Хвост чанка переносится в начало следующего как перекрытие
+            overlap = []
+            overlap_tokens = 0
+            for unit in reversed(current):
+                if overlap_tokens + unit[1] > self.overlap_tokens:
+                    break
+                overlap.insert(0, unit)
+                overlap_tokens += unit[1]
+            current = overlap
+            current_tokens = overlap_tokens
+            has_new_content = False
+
+        for text, tokens, sep, is_heading in self._units(article_data['body_md']):
+            # Новый раздел начинает новый чанк, если текущий уже достаточно большой
+            if is_heading and current_tokens >= self.min_tokens:
+                flush()
+            if current and current_tokens + tokens > self.max_tokens:
+                flush()
+                if current and current_tokens + tokens > self.max_tokens:
+                    current = []
+                    current_tokens = 0
+            current.append((text, tokens, sep))
+            current_tokens += tokens
+            has_new_content = True
+
+        flush()
+        return chunks
+
+CHUNKERS: Dict[str, type] = {
+    ParagraphChunker.name: ParagraphChunker,
+    TokenBudgetChunker.name: TokenBudgetChunker,
+}
+
+def get_chunker(name: str = 'paragraph', **options):
+    """Возвращает чанкер по имени"""
+    if name not in CHUNKERS:
+        raise ValueError(f"Неизвестный чанкер: {name}. Доступны: {', '.join(CHUNKERS)}")
+    return CHUNKERS[name](**options)
+
+def _words(text: str) -> List[str]:
+    return re.findall(r'\w+', text)
+
+def benchmark_chunker(chunker, articles: List[dict], repeat: int = 3) -> dict:
+    """Замеряет число и размеры чанков, потерю текста и скорость разбиения"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks_per_article = [chunker.split(a) for a in articles]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    sizes = [estimate_tokens(c['text']) for chunks in chunks_per_article for c in chunks]
+    source_words = sum(len(_words(a['body_md'])) for a in articles)
+    covered_words = 0
+    for article_data, chunks in zip(articles, chunks_per_article):
+        vocabulary = set()
+        for chunk in chunks:
+            vocabulary.update(_words(chunk['text']))
+        covered_words += sum(1 for w in _words(article_data['body_md']) if w in vocabulary)
+
+    total_bytes = sum(len(a['body_md'].encode('utf-8')) for a in articles)
+    return {
+        'chunks': len(sizes),
+        'avg_tokens': sum(sizes) / len(sizes) if sizes else 0,
+        'min_tokens': min(sizes, default=0),
+        'max_tokens': max(sizes, default=0),
+        'tiny_chunks': sum(1 for s in sizes if s < 25),
+        'lost_words_percent': 100.0 * (source_words - covered_words) / source_words if source_words else 0.0,
+        'articles_per_sec': len(articles) / best if best else 0.0,
+        'mb_per_sec': total_bytes / best / 1e6 if best else 0.0
+    }
+
+def main():
+    """Бенчмарк: сравнение текущего сплиттера с упаковкой по токенам"""
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from kb_markdown import parse_markdown_file
+
+    parser = argparse.ArgumentParser(description="Бенчмарк разбиения статей на чанки")
+    parser.add_argument("--kb-path", default="apps/support-gateway/kb_articles", help="Папка с markdown статьями")
+    parser.add_argument("--max-tokens", type=int, default=400, help="Бюджет токенов на чанк")
+    parser.add_argument("--overlap-tokens", type=int, default=50, help="Перекрытие между чанками")
+    parser.add_argument("--multiply", type=int, default=1, help="Повторить корпус N раз для замера скорости")
+    args = parser.parse_args()
+
+    articles = [parse_markdown_file(p) for p in sorted(Path(args.kb_path).glob('*.md'))] * args.multiply
+    if not articles:
+        print(f"❌ Markdown файлы в {args.kb_path} не найдены")
+        sys.exit(1)
+
+    print(f"📊 Статей: {len(articles)}, токенизатор: {'tiktoken' if _ENCODING else 'оценка по байтам'}")
+    for chunker in (ParagraphChunker(),
+                    TokenBudgetChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)):
+        result = benchmark_chunker(chunker, articles)
+        print(f"\n✂️  {chunker.name}:")
+        print(f"  - Чанков: {result['chunks']} (мелких <25 токенов: {result['tiny_chunks']})")
+        print(f"  - Токенов на чанк: {result['avg_tokens']:.0f} (диапазон {result['min_tokens']} - {result['max_tokens']})")
+        print(f"  - Потеряно слов: {result['lost_words_percent']:.1f}%")
+        print(f"  - Скорость: {result['articles_per_sec']:.0f} статей/сек, {result['mb_per_sec']:.1f} МБ/сек")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Генерация эмбеддингов для чанков базы знаний: пачки текстов в одном запросе,
+ограниченная параллельность, повторы с джиттером и учет rate limit
+"""
+
+import io
+import os
+import re
+import math
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from kb_manifest import bump_kb_version
+
+EMBEDDING_DIM = 1536
+OPENAI_API_URL = os.environ.get("OPENAI_API_URL", "https://api.openai.com/v1")
+OPENAI_EMBED_MODEL = os.environ.get("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+
+class EmbeddingError(Exception):
+    """Ошибка провайдера эмбеддингов"""
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Разбирает длительность вида '1s', '6m0s', '20ms' в секунды"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        total += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total or None
+
+class OpenAIEmbedder:
+    """Провайдер эмбеддингов OpenAI: несколько текстов в одном запросе"""
+
+    name = 'openai'
+
+    def __init__(self, model: str = OPENAI_EMBED_MODEL, api_key: str = None,
+                 api_url: str = OPENAI_API_URL, dim: int = EMBEDDING_DIM, timeout: int = 60):
+        self.model = model
+        self.dim = dim
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.pause_hint = None
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f"Bearer {api_key or os.environ.get('OPENAI_API_KEY', '')}",
+            'Content-Type': 'application/json'
+        })
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        payload = {'model': self.model, 'input': texts}
+        if self.model.startswith('text-embedding-3'):
+            payload['dimensions'] = self.dim
+        try:
+            response = self.session.post(
+                f"{self.api_url}/embeddings",
+                json=payload,
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise EmbeddingError(str(e), retryable=True)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = _parse_reset(response.headers.get('retry-after')) or \
+                _parse_reset(response.headers.get('x-ratelimit-reset-requests'))
+            raise EmbeddingError(f"HTTP {response.status_code}: {response.text[:200]}",
+                                 retryable=True, retry_after=retry_after)
+        if response.status_code != 200:
+            raise EmbeddingError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        if response.headers.get('x-ratelimit-remaining-requests') == '0':
+            self.pause_hint = _parse_reset(response.headers.get('x-ratelimit-reset-requests'))
+
+        data = sorted(response.json()['data'], key=lambda item: item['index'])
+        return [item['embedding'] for item in data]
+
+class HashEmbedder:
+    """
+    Детерминированный локальный эмбеддер для тестов и бенчмарков:
+    хеширование слов и символьных триграмм в вектор фиксированной размерности
+    """
+
+    name = 'hash'
+
+    def __init__(self, dim: int = EMBEDDING_DIM, model: str = 'local-hash-v1'):
+        self.dim = dim
+        self.model = model
+
+    def _features(self, text: str) -> Iterator[str]:
+        for word in re.findall(r'\w+', text.lower()):
+            yield word
+            padded = f"^{word}$"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                value = int.from_bytes(digest, 'little')
+                vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+            vectors.append(normalize(vector))
+        return vectors
+
+EMBEDDERS = {
+    OpenAIEmbedder.name: OpenAIEmbedder,
+    HashEmbedder.name: HashEmbedder,
+}
+
+def get_embedder(name: str = 'openai', **options):
+    """Возвращает провайдера эмбеддингов по имени"""
+    if name not in EMBEDDERS:
+        raise ValueError(f"Неизвестный провайдер эмбеддингов: {name}. Доступны: {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name](**options)
+
+def normalize(vector: List[float]) -> List[float]:
+    """Нормализует вектор к единичной длине (как migrate_embeddings)"""
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class EmbeddingStage:
+    """
+    Этап генерации эмбеддингов: режет поток (id, текст) на пачки,
+    отправляет до concurrency запросов одновременно и повторяет
+    неудачные с экспоненциальной задержкой и джиттером.
+    С кешем (embedding_cache.EmbeddingCache) к провайдеру уходят только промахи
+    """
+
+    def __init__(self, provider, batch_size: int = 96, max_batch_chars: int = 200000,
+                 concurrency: int = 4, max_retries: int = 6, base_delay: float = 0.5,
+                 max_delay: float = 30.0, cache=None):
+        self.provider = provider
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'texts': 0, 'failed': 0, 'cached': 0}
+
+    def _batches(self, items: Iterable[Tuple[str, str]]) -> Iterator[List[Tuple[str, str]]]:
+        batch = []
+        batch_chars = 0
+        for item in items:
+            if batch and (len(batch) >= self.batch_size or batch_chars + len(item[1]) > self.max_batch_chars):
+                yield batch
+                batch = []
+                batch_chars = 0
+            batch.append(item)
+            batch_chars += len(item[1])
+        if batch:
+            yield batch
+
+    def _filter_cached(self, items: Iterable[Tuple[str, str]], ready: deque,
+                       lookup_size: int = 512) -> Iterator[Tuple[str, str]]:
+        """Складывает найденные в кеше векторы в ready и пропускает дальше только промахи"""
+        group = []
+        for item in items:
+            group.append(item)
+            if len(group) < lookup_size:
+                continue
+            yield from self._lookup_group(group, ready)
+            group = []
+        if group:
+            yield from self._lookup_group(group, ready)
+
+    def _lookup_group(self, group: List[Tuple[str, str]], ready: deque) -> List[Tuple[str, str]]:
+        vectors = self.cache.get_many(self.provider.model, self.provider.dim, [text for _, text in group])
+        hits = [(item[0], vector) for item, vector in zip(group, vectors) if vector is not None]
+        if hits:
+            ready.append(([chunk_id for chunk_id, _ in hits], [vector for _, vector in hits]))
+            with self._lock:
+                self.stats['cached'] += len(hits)
+        return [item for item, vector in zip(group, vectors) if vector is None]
+
+    def _wait_for_rate_limit(self):
+        with self._lock:
+            delay = self._pause_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, seconds: float):
+        """Общая пауза для всех потоков после ответа 429"""
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    def _embed_batch(self, batch: List[Tuple[str, str]]) -> Tuple[List[str], Optional[List[List[float]]]]:
+        ids = [item[0] for item in batch]
+        texts = [item[1] for item in batch]
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                with self._lock:
+                    self.stats['requests'] += 1
+                vectors = self.provider.embed(texts)
+                hint = getattr(self.provider, 'pause_hint', None)
+                if hint:
+                    # Сервер сообщил об исчерпании лимита - притормаживаем все потоки
+                    self.provider.pause_hint = None
+                    self._pause(hint)
+                vectors = [normalize(v) for v in vectors]
+                if self.cache is not None:
+                    self.cache.put_many(self.provider.model, self.provider.dim, texts, vectors)
+                with self._lock:
+                    self.stats['texts'] += len(texts)
+                return ids, vectors
+            except EmbeddingError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    print(f"  ❌ Ошибка генерации эмбеддингов для {len(texts)} чанков: {e}")
+                    with self._lock:
+                        self.stats['failed'] += len(texts)
+                    return ids, None
+                # Full jitter: случайная задержка до экспоненциальной границы
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                with self._lock:
+                    self.stats['retries'] += 1
+                    if e.retry_after is not None:
+                        self.stats['rate_limited'] += 1
+                if e.retry_after is not None:
+                    self._pause(e.retry_after + delay)
+                else:
+                    time.sleep(delay)
+        return ids, None
+
+    def run(self, items: Iterable[Tuple[str, str]]) -> Iterator[Tuple[List[str], List[List[float]]]]:
+        """
+        Возвращает пары (ids, векторы) по мере готовности пачек.
+        Пачки, не прошедшие после всех повторов, пропускаются
+        """
+        ready = deque()
+        if self.cache is not None:
+            items = self._filter_cached(items, ready)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = []
+            for batch in self._batches(items):
+                while ready:
+                    yield ready.popleft()
+                pending.append(pool.submit(self._embed_batch, batch))
+                # Не держим в памяти больше пачек, чем нужно для загрузки потоков
+                while len(pending) >= self.concurrency * 2:
+                    ids, vectors = pending.pop(0).result()
+                    if vectors is not None:
+                        yield ids, vectors
+            while ready:
+                yield ready.popleft()
+            for future in pending:
+                ids, vectors = future.result()
+                if vectors is not None:
+                    yield ids, vectors
+
+def vector_literal(vector: List[float]) -> str:
+    """Текстовое представление вектора для pgvector"""
+    return '[' + ','.join(f"{v:.7g}" for v in vector) + ']'
+
+def write_embeddings(cursor, rows: List[Tuple[str, List[float]]]) -> int:
+    """
+    Записывает эмбеддинги одним COPY в staging таблицу и одним UPDATE.
+    Staging таблица повторяет типы embedding / embedding_vec из kb_chunks,
+    поэтому COPY сам приводит '[...]' к vector или JSON
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS kb_embeddings_stage ON COMMIT DELETE ROWS AS
+        SELECT id, embedding, embedding_vec FROM kb_chunks WITH NO DATA
+    """)
+    buffer = io.StringIO()
+    for chunk_id, vector in rows:
+        literal = vector_literal(vector)
+        buffer.write(f"{chunk_id}\t{literal}\t{literal}\n")
+    buffer.seek(0)
+    cursor.copy_expert("COPY kb_embeddings_stage (id, embedding, embedding_vec) FROM STDIN", buffer)
+    cursor.execute("""
+        UPDATE kb_chunks c
+        SET embedding = s.embedding,
+            embedding_vec = s.embedding_vec
+        FROM kb_embeddings_stage s
+        WHERE c.id = s.id
+    """)
+    updated = cursor.rowcount
+    cursor.execute("TRUNCATE kb_embeddings_stage")
+    return updated
+
+def embed_pending_chunks(conn, stage: EmbeddingStage, write_batch: int = 1000, limit: int = None) -> dict:
+    """
+    Генерирует эмбеддинги для чанков без embedding_vec и записывает их пачками
+    """
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, chunk_text FROM kb_chunks
+            WHERE embedding_vec IS NULL AND chunk_text IS NOT NULL AND chunk_text <> ''
+            ORDER BY article_id, chunk_index
+        """ + (" LIMIT %s" % int(limit) if limit else ""))
+        items = [(str(chunk_id), text) for chunk_id, text in cursor.fetchall()]
+
+    print(f"  - Чанков без эмбеддингов: {len(items)}")
+    written = 0
+    pending_rows = []
+    with conn.cursor() as cursor:
+        for ids, vectors in stage.run(items):
+            pending_rows.extend(zip(ids, vectors))
+            if len(pending_rows) >= write_batch:
+                written += write_embeddings(cursor, pending_rows)
+                conn.commit()
+                pending_rows = []
+                print(f"  📝 Записано эмбеддингов: {written}/{len(items)}")
+        if pending_rows:
+            written += write_embeddings(cursor, pending_rows)
+            conn.commit()
+    if written:
+        # Новые эмбеддинги меняют результаты поиска
+        bump_kb_version('embeddings')
+
+    elapsed = time.perf_counter() - started
+    return dict(stage.stats, written=written, seconds=elapsed,
+                chunks_per_sec=written / elapsed if elapsed > 0 else 0.0)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Манифест хешей содержимого базы знаний для инкрементальной синхронизации
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+# Манифест последней синхронизации (относительно корня репозитория)
+MANIFEST_PATH = Path('data/kb_manifest.json')
+
+# Общая версия базы знаний: меняется после каждого коммита статей в базу
+# любым загрузчиком. Путь не зависит от текущей директории: KB_VERSION_PATH
+# или data/kb_version.json в корне репозитория
+REPO_ROOT = Path(__file__).resolve().parent.parent
+KB_VERSION_PATH = Path(os.environ.get('KB_VERSION_PATH') or REPO_ROOT / 'data' / 'kb_version.json')
+
+# Пространство имен для детерминированных UUID статей и чанков
+KB_NAMESPACE = uuid.UUID('6f1c2a9e-4b7d-5e3f-9a81-2c4d6e8f0b13')
+
+def content_hash(data: bytes) -> str:
+    """Хеш содержимого файла"""
+    return hashlib.sha256(data).hexdigest()
+
+def text_hash(text: str) -> str:
+    """Хеш текста чанка"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def article_uuid(slug: str) -> str:
+    """Детерминированный ID статьи по slug"""
+    return str(uuid.uuid5(KB_NAMESPACE, f"article:{slug}"))
+
+def chunk_uuid(slug: str, chunk_index: int) -> str:
+    """Детерминированный ID чанка по slug статьи и индексу"""
+    return str(uuid.uuid5(KB_NAMESPACE, f"chunk:{slug}:{chunk_index}"))
+
+class KBManifest:
+    """
+    Манифест загруженных файлов: хеш файла, slug статьи
+    и хеши текстов чанков по индексам, а также конфигурация чанкера,
+    которым они разбиты
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH, files: Dict[str, dict] = None,
+                 chunker: Optional[dict] = None):
+        self.path = Path(path)
+        self.files = files or {}
+        self.chunker = chunker
+
+    @classmethod
+    def load(cls, path: Path = MANIFEST_PATH) -> 'KBManifest':
+        """Загружает манифест, отсутствующий файл дает пустой манифест"""
+        path = Path(path)
+        if not path.exists():
+            return cls(path)
+        data = json.loads(path.read_text(encoding='utf-8'))
+        return cls(path, data.get('files', {}), data.get('chunker'))
+
+    def save(self):
+        """Атомарно сохраняет манифест"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_text(json.dumps({
+            'version': self.version,
+            'chunker': self.chunker,
+            'files': self.files
+        }, ensure_ascii=False, indent=2, sort_keys=True), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+    @property
+    def version(self) -> str:
+        """Версия базы знаний: хеш от конфигурации чанкера и хешей всех файлов"""
+        digest = hashlib.sha256()
+        if self.chunker:
+            digest.update(json.dumps(self.chunker, sort_keys=True).encode('utf-8'))
+        for name in sorted(self.files):
+            digest.update(name.encode('utf-8'))
+            digest.update(self.files[name]['sha256'].encode('ascii'))
+        return digest.hexdigest()[:16]
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.files.get(name)
+
+    def is_unchanged(self, name: str, stat: os.stat_result) -> bool:
+        """Быстрая проверка по размеру и mtime без чтения файла"""
+        entry = self.files.get(name)
+        return bool(entry) and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+    def update(self, name: str, entry: dict):
+        self.files[name] = entry
+
+    def remove(self, name: str):
+        self.files.pop(name, None)
+
+def bump_kb_version(source: str, path: Path = KB_VERSION_PATH) -> str:
+    """
+    Записывает новую версию базы знаний. Вызывается после коммита записи
+    в kb_articles/kb_chunks - кеши ответов сбрасывают записи старой версии
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    version = uuid.uuid4().hex[:16]
+    # Отдельный временный файл на вызов: писатели конвейера обновляют версию параллельно
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'source': source, 'updated_at': time.time()}, f)
+    os.replace(tmp_path, path)
+    return version
+
+def read_kb_version(path: Path = KB_VERSION_PATH) -> Optional[str]:
+    """Возвращает версию базы знаний из файла версии (или манифеста) либо None"""
+    try:
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    return data.get('version')
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Разбор markdown статей базы знаний и разбиение на чанки без обращения
+к базе: общая часть загрузчиков, BM25-индекса и бенчмарка чанкеров
+"""
+
+import re
+from pathlib import Path
+
+from kb_chunker import ParagraphChunker
+
+def parse_markdown_file(file_path: Path) -> dict:
+    """Парсит markdown файл и извлекает метаданные и содержимое"""
+    content = file_path.read_text(encoding='utf-8')
+    
+    # Извлекаем frontmatter (между ---)
+    frontmatter_match = re.match(r'^---\n(.*?)\n---\n', content, re.DOTALL)
+    
+    if frontmatter_match:
+        frontmatter_text = frontmatter_match.group(1)
+        # Простой парсинг YAML
+        metadata = {}
+        for line in frontmatter_text.split('\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                key = key.strip()
+                value = value.strip().strip('"')
+                if key == 'tags':
+                    # Парсим теги
+                    tags_text = value.strip('[]')
+                    tags = [tag.strip().strip('"') for tag in tags_text.split(',') if tag.strip()]
+                    metadata[key] = tags
+                else:
+                    metadata[key] = value
+        
+        # Убираем frontmatter из содержимого
+        body_md = content[frontmatter_match.end():].strip()
+    else:
+        # Если нет frontmatter, используем имя файла
+        metadata = {
+            'title': file_path.stem.replace('-', ' ').title(),
+            'slug': file_path.stem,
+            'tags': []
+        }
+        body_md = content
+    
+    return {
+        'title': metadata.get('title', file_path.stem.replace('-', ' ').title()),
+        'slug': metadata.get('slug', file_path.stem),
+        'tags': metadata.get('tags', []),
+        'body_md': body_md
+    }
+
+def split_article_into_chunks(article_data: dict, chunker=None) -> list:
+    """Разбивает тело статьи на чанки для RAG системы (по умолчанию - по параграфам)"""
+    return (chunker or ParagraphChunker()).split(article_data)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Параллельный конвейер загрузки знаний: пул процессов парсит и режет статьи
+на чанки, ограниченная очередь передает их N писателям с отдельными соединениями
+"""
+
+import os
+import sys
+import time
+import queue
+import random
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from kb_manifest import bump_kb_version
+from kb_markdown import parse_markdown_file, split_article_into_chunks
+from load_knowledge_optimized import bulk_load_articles
+
+# Маркер завершения для писателей
+_STOP = object()
+
+def parse_and_chunk_files(paths: List[str], chunker=None) -> tuple:
+    """Парсит пачку файлов и режет статьи на чанки (выполняется в пуле процессов)"""
+    articles = []
+    errors = []
+    for path in paths:
+        try:
+            article_data = parse_markdown_file(Path(path))
+            article_data['chunks'] = split_article_into_chunks(article_data, chunker)
+            articles.append(article_data)
+        except Exception as e:
+            errors.append((path, str(e)))
+    return articles, errors
+
+class PipelineStats:
+    """Потокобезопасные счетчики конвейера"""
+
+    def __init__(self, writers: int = 0):
+        self.lock = threading.Lock()
+        self.writers = writers
+        self.dropped = 0
+        self.parsed = 0
+        self.articles = 0
+        self.chunks = 0
+        self.batches = 0
+        self.errors = []
+
+    def add_batch(self, articles: int, chunks: int):
+        with self.lock:
+            self.articles += articles
+            self.chunks += chunks
+            self.batches += 1
+
+    def add_error(self, source: str, error: str, dropped: int = 0):
+        with self.lock:
+            self.errors.append((source, error))
+            self.dropped += dropped
+
+    def writer_failed(self) -> bool:
+        """Писатель не смог подключиться; True, если он был последним"""
+        with self.lock:
+            self.writers -= 1
+            return self.writers == 0
+
+def _writer(work_queue: queue.Queue, batch_size: int, stats: PipelineStats):
+    """Писатель: копит статьи и коммитит их пачками через COPY"""
+    try:
+        conn = db.connect()
+    except Exception as e:
+        stats.add_error("connect", str(e))
+        # Статьи достанутся остальным писателям. Если писателей не осталось -
+        # вычитываем очередь, чтобы парсинг не заблокировался, и считаем потерянные
+        if stats.writer_failed():
+            while work_queue.get() is not _STOP:
+                with stats.lock:
+                    stats.dropped += 1
+        return
+    cursor = conn.cursor()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        try:
+            bulk_load_articles(cursor, batch)
+            conn.commit()
+            bump_kb_version('pipeline')
+            stats.add_batch(len(batch), sum(len(a['chunks']) for a in batch))
+        except Exception as e:
+            conn.rollback()
+            stats.add_error(f"batch of {len(batch)}", str(e), dropped=len(batch))
+        batch.clear()
+
+    try:
+        while True:
+            item = work_queue.get()
+            if item is _STOP:
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    finally:
+        cursor.close()
+        conn.close()
+
+def run_pipeline(paths: List[Path], workers: int = None, writers: int = 2,
+                 batch_size: int = 500, queue_size: int = 5000, parse_batch: int = 64,
+                 chunker=None) -> dict:
+    """
+    Запускает конвейер загрузки.
+
+    Args:
+        paths: Markdown файлы для загрузки
+        workers: Размер пула процессов для парсинга (по умолчанию - число ядер)
+        writers: Число писателей с отдельными соединениями (0 - только парсинг)
+        batch_size: Статей в одном коммите писателя
+        queue_size: Емкость очереди между парсингом и писателями
+        parse_batch: Файлов в одной задаче пула процессов
+        chunker: Чанкер из kb_chunker (по умолчанию - по параграфам)
+
+    Returns:
+        Dict со статистикой загрузки; dropped - статьи, не записанные
+        из-за ошибок пачек
+
+    Raises:
+        RuntimeError: Ни один писатель не подключился к базе
+    """
+    workers = workers or os.cpu_count() or 1
+    if writers > db.POOL_MAX:
+        print(f"  ⚠️  Писателей ({writers}) больше, чем соединений в пуле (DB_POOL_MAX={db.POOL_MAX})")
+    stats = PipelineStats(writers)
+    work_queue = queue.Queue(maxsize=queue_size)
+    started = time.perf_counter()
+
+    threads = [
+        threading.Thread(target=_writer, args=(work_queue, batch_size, stats), daemon=True)
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    slices = [[str(p) for p in paths[i:i + parse_batch]] for i in range(0, len(paths), parse_batch)]
+    # Ограничиваем число задач в пуле, чтобы результаты не копились в памяти,
+    # пока писатели не успевают: put() в полную очередь блокирует парсинг
+    max_inflight = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        inflight = deque()
+        pending = iter(slices)
+        for paths_slice in pending:
+            inflight.append(pool.submit(parse_and_chunk_files, paths_slice, chunker))
+            if len(inflight) >= max_inflight:
+                break
+
+        while inflight:
+            if writers and stats.writers == 0:
+                # Писать некому - не тратим время на разбор остальных файлов
+                for future in inflight:
+                    future.cancel()
+                break
+            articles, errors = inflight.popleft().result()
+            next_slice = next(pending, None)
+            if next_slice is not None:
+                inflight.append(pool.submit(parse_and_chunk_files, next_slice, chunker))
+
+            for source, error in errors:
+                stats.add_error(source, error)
+            with stats.lock:
+                stats.parsed += len(articles)
+            if writers:
+                for article_data in articles:
+                    work_queue.put(article_data)
+            else:
+                stats.add_batch(len(articles), sum(len(a['chunks']) for a in articles))
+
+    parse_seconds = time.perf_counter() - started
+    for _ in threads:
+        work_queue.put(_STOP)
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+    if writers and stats.writers == 0:
+        raise RuntimeError(f"Ни один из {writers} писателей не подключился к базе, "
+                           f"не записано статей: {stats.dropped}; {stats.errors[0][1]}")
+    return {
+        'files': len(paths),
+        'parsed': stats.parsed,
+        'articles': stats.articles,
+        'chunks': stats.chunks,
+        'batches': stats.batches,
+        'errors': stats.errors,
+        'dropped': stats.dropped,
+        'parse_seconds': parse_seconds,
+        'seconds': elapsed,
+        'articles_per_sec': stats.articles / elapsed if elapsed > 0 else 0.0,
+        'chunks_per_sec': stats.chunks / elapsed if elapsed > 0 else 0.0
+    }
+
+def print_pipeline_stats(result: dict):
+    """Выводит статистику конвейера"""
+    print(f"  - Файлов: {result['files']}, распарсено: {result['parsed']}")
+    print(f"  - Записано статей: {result['articles']}, чанков: {result['chunks']} ({result['batches']} пачек)")
+    print(f"  - Ошибок: {len(result['errors'])}")
+    if result['dropped']:
+        print(f"  ⚠️  Не записано статей: {result['dropped']}")
+    for source, error in result['errors'][:10]:
+        print(f"    ❌ {source}: {error}")
+    print(f"  ⏱  Время: {result['seconds']:.2f}s (парсинг завершен за {result['parse_seconds']:.2f}s)")
+    print(f"  🚀 {result['articles_per_sec']:.0f} статей/сек, {result['chunks_per_sec']:.0f} чанков/сек")
+
+_WORDS = (
+    "сделка ордер баланс пополнение вывод средства аккаунт поддержка рейтинг "
+    "продавец покупатель объявление платеж перевод комиссия лимит верификация "
+    "безопасность кошелек биржа курс заявка отмена подтверждение статус история"
+).split()
+
+def generate_synthetic_corpus(target: Path, count: int, seed: int = 42) -> List[Path]:
+    """Создает синтетический корпус markdown статей для бенчмарка"""
+    rng = random.Random(seed)
+    target.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = target / f"synthetic-{i:06d}.md"
+        paragraphs = [
+            ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(8, 80))).capitalize() + '.'
+            for _ in range(rng.randint(3, 12))
+        ]
+        path.write_text(
+            f'---\ntitle: "Синтетическая статья {i}"\nslug: "synthetic-{i:06d}"\n'
+            f'tags: ["синтетика"]\n---\n\n# Синтетическая статья {i}\n\n' + '\n\n'.join(paragraphs) + '\n',
+            encoding='utf-8'
+        )
+        paths.append(path)
+    return paths
+
+def main():
+    """Бенчмарк конвейера на синтетическом корпусе"""
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельной загрузки знаний")
+    parser.add_argument("--synthetic", type=int, default=100000, help="Число синтетических статей (по умолчанию: 100000)")
+    parser.add_argument("--corpus-dir", default="/tmp/kb_synthetic", help="Папка для синтетического корпуса")
+    parser.add_argument("--workers", type=int, nargs='+', default=[os.cpu_count() or 1], help="Размеры пула процессов для сравнения")
+    parser.add_argument("--writers", type=int, nargs='+', default=[0], help="Числа писателей для сравнения (0 - без записи в базу)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Статей в одном коммите")
+    args = parser.parse_args()
+
+    corpus_dir = Path(args.corpus_dir)
+    paths = sorted(corpus_dir.glob('synthetic-*.md'))
+    if len(paths) < args.synthetic:
+        print(f"📁 Генерируем {args.synthetic} синтетических статей в {corpus_dir}...")
+        paths = generate_synthetic_corpus(corpus_dir, args.synthetic)
+    paths = paths[:args.synthetic]
+
+    for writers in args.writers:
+        for workers in args.workers:
+            print(f"\n🔧 workers={workers}, writers={writers}")
+            result = run_pipeline(paths, workers=workers, writers=writers, batch_size=args.batch_size)
+            print_pipeline_stats(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Локальный индекс приближенного поиска ближайших соседей (IVF) по
+kb_chunks.embedding_vec: top-k по косинусной близости без запроса к Postgres
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Индекс по умолчанию (относительно корня репозитория)
+VECTOR_INDEX_PATH = Path('data/kb_vector_index.npz')
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Сферический k-means: центроиды нормированы, близость - скалярное произведение"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        # Пустой кластер получает случайную точку
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+class VectorIndex:
+    """
+    IVF-индекс по косинусной близости. Векторы нормируются и раскладываются
+    по спискам ближайших центроидов; запрос просматривает nprobe ближайших
+    списков. Каждый список хранится одним непрерывным массивом, поэтому
+    поиск по списку - одно матричное умножение. Время поиска линейно по числу
+    просмотренных векторов (~0.8 мкс на вектор 1536 float32 на одном ядре),
+    а списки k-means неравномерны, поэтому просмотр ограничен max_scan
+    векторами: списки берутся от ближайшего, пока бюджет не исчерпан.
+
+    Удаление помечает запись, а список сжимается, когда удаленных
+    становится больше четверти
+    """
+
+    def __init__(self, dim: int = 1536, nlist: int = None, nprobe: int = 16, max_scan: int = 1000):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.max_scan = max_scan
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._list_vectors: List[np.ndarray] = []
+        self._list_keys: List[np.ndarray] = []
+        # id -> (список, позиция в списке)
+        self._where: Dict[str, Tuple[int, int]] = {}
+        # позиции удаленных записей по спискам
+        self._dead: List[set] = []
+        self._keys: List[str] = []
+        self.payloads: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._where
+
+    def _prepare(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"размерность {vectors.shape[1]} не совпадает с индексом ({self.dim})")
+        return _normalize_rows(vectors)
+
+    def _reset_lists(self, count: int):
+        self._list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(count)]
+        self._list_keys = [np.empty(0, dtype=np.int64) for _ in range(count)]
+        self._dead = [set() for _ in range(count)]
+        self._where = {}
+        self._keys = []
+
+    def train(self, vectors, iterations: int = 10):
+        """Обучает центроиды; nlist по умолчанию - около sqrt(N)"""
+        vectors = self._prepare(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        self.centroids = _kmeans(vectors, nlist, iterations)
+        self.trained_size = len(vectors)
+        self._reset_lists(nlist)
+
+    def build(self, keys: Sequence[str], vectors, payloads: Sequence[dict] = None, iterations: int = 10):
+        """Обучает индекс на всех векторах и добавляет их"""
+        vectors = self._prepare(vectors)
+        self.payloads = {}
+        self.train(vectors, iterations)
+        self.add(keys, vectors, payloads)
+
+    def add(self, keys: Sequence[str], vectors, payloads: Sequence[dict] = None):
+        """Добавляет векторы; существующие id заменяются"""
+        if len(keys) == 0:
+            return
+        vectors = self._prepare(vectors)
+        if self.centroids is None:
+            # Необученный индекс: один список, то есть точный поиск
+            self.centroids = np.zeros((1, self.dim), dtype=np.float32)
+            self._reset_lists(1)
+        self.delete([key for key in keys if key in self._where])
+
+        assign = np.argmax(vectors @ self.centroids.T, axis=1) if len(self.centroids) > 1 \
+            else np.zeros(len(vectors), dtype=np.int64)
+        for list_no in np.unique(assign):
+            rows = np.nonzero(assign == list_no)[0]
+            start = len(self._list_vectors[list_no])
+            key_ids = np.arange(len(self._keys), len(self._keys) + len(rows), dtype=np.int64)
+            for offset, row in enumerate(rows):
+                self._keys.append(keys[row])
+                self._where[keys[row]] = (int(list_no), start + offset)
+            self._list_vectors[list_no] = np.vstack([self._list_vectors[list_no], vectors[rows]])
+            self._list_keys[list_no] = np.concatenate([self._list_keys[list_no], key_ids])
+        if payloads is not None:
+            for key, payload in zip(keys, payloads):
+                self.payloads[key] = payload
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """Удаляет записи по id, возвращает число удаленных"""
+        removed = 0
+        touched = set()
+        for key in keys:
+            location = self._where.pop(key, None)
+            if location is None:
+                continue
+            list_no, position = location
+            self._dead[list_no].add(position)
+            self.payloads.pop(key, None)
+            touched.add(list_no)
+            removed += 1
+        for list_no in touched:
+            if len(self._dead[list_no]) * 4 > len(self._list_vectors[list_no]):
+                self._compact(list_no)
+        if len(self._keys) > 2 * len(self._where) + 1024:
+            self._compact_keys()
+        return removed
+
+    def _compact(self, list_no: int):
+        keep = np.ones(len(self._list_vectors[list_no]), dtype=bool)
+        keep[list(self._dead[list_no])] = False
+        self._list_vectors[list_no] = self._list_vectors[list_no][keep]
+        self._list_keys[list_no] = self._list_keys[list_no][keep]
+        self._dead[list_no] = set()
+        for position, key_id in enumerate(self._list_keys[list_no]):
+            self._where[self._keys[key_id]] = (list_no, position)
+
+    def _compact_keys(self):
+        """Перенумеровывает id живых записей: удаленные и замененные не копятся в _keys"""
+        keys = []
+        for list_no, key_ids in enumerate(self._list_keys):
+            live = [key_id for position, key_id in enumerate(key_ids.tolist())
+                    if position not in self._dead[list_no]]
+            if self._dead[list_no]:
+                keep = np.ones(len(key_ids), dtype=bool)
+                keep[list(self._dead[list_no])] = False
+                self._list_vectors[list_no] = self._list_vectors[list_no][keep]
+                self._dead[list_no] = set()
+            self._list_keys[list_no] = np.arange(len(keys), len(keys) + len(live), dtype=np.int64)
+            for position, key_id in enumerate(live):
+                self._where[self._keys[key_id]] = (list_no, position)
+            keys.extend(self._keys[key_id] for key_id in live)
+        self._keys = keys
+
+    @property
+    def needs_retrain(self) -> bool:
+        """Индекс вырос в 4 раза с момента обучения - центроиды устарели"""
+        return len(self) > 4 * max(self.trained_size, 1) and len(self) >= 256
+
+    def retrain(self, iterations: int = 10):
+        """Переобучает центроиды на текущих векторах и перераскладывает их по спискам"""
+        keys = list(self._where)
+        if not keys:
+            return
+        vectors = np.vstack([self._list_vectors[list_no][position] for list_no, position in self._where.values()])
+        payloads = self.payloads
+        self.build(keys, vectors, iterations=iterations)
+        self.payloads = payloads
+
+    def search(self, query, k: int = 8, nprobe: int = None, max_scan: int = None) -> List[Tuple[str, float]]:
+        """
+        Возвращает [(id, косинусная близость)] по убыванию близости.
+        max_scan=0 снимает ограничение на число просмотренных векторов
+        """
+        if not self._where:
+            return []
+        query = self._prepare(query)[0]
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        max_scan = self.max_scan if max_scan is None else max_scan
+        centroid_scores = self.centroids @ query
+        if nprobe < len(self.centroids):
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(self.centroids))
+        if max_scan:
+            # Ближайшие списки первыми; последний список, переходящий бюджет, просматривается целиком
+            probe = probe[np.argsort(-centroid_scores[probe])]
+            sizes = np.cumsum([len(self._list_vectors[list_no]) for list_no in probe])
+            probe = probe[:int(np.searchsorted(sizes, max_scan)) + 1]
+
+        scores, key_ids = [], []
+        for list_no in probe:
+            if len(self._list_vectors[list_no]) == 0:
+                continue
+            list_scores = self._list_vectors[list_no] @ query
+            if self._dead[list_no]:
+                list_scores[list(self._dead[list_no])] = -np.inf
+            scores.append(list_scores)
+            key_ids.append(self._list_keys[list_no])
+        if not scores:
+            return []
+        scores = np.concatenate(scores)
+        key_ids = np.concatenate(key_ids)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._keys[key_ids[i]], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def save(self, path: Path = VECTOR_INDEX_PATH):
+        """Сохраняет индекс в .npz (без pickle), атомарно"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._compact_keys()
+        meta = {
+            'dim': self.dim, 'nlist': self.nlist, 'nprobe': self.nprobe, 'max_scan': self.max_scan,
+            'trained_size': self.trained_size,
+            'keys': [[self._keys[key_id] for key_id in keys.tolist()] for keys in self._list_keys],
+            'payloads': self.payloads,
+        }
+        arrays = {f'list_{i}': vectors for i, vectors in enumerate(self._list_vectors)}
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids if self.centroids is not None else np.empty((0, self.dim), np.float32),
+                     meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                     **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path = VECTOR_INDEX_PATH) -> 'VectorIndex':
+        with np.load(Path(path), allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            index = cls(dim=meta['dim'], nlist=meta['nlist'], nprobe=meta['nprobe'],
+                        max_scan=meta.get('max_scan', 1000))
+            index.trained_size = meta['trained_size']
+            centroids = data['centroids']
+            if len(centroids) == 0:
+                return index
+            index.centroids = centroids
+            index._reset_lists(len(centroids))
+            for list_no, keys in enumerate(meta['keys']):
+                start = len(index._keys)
+                index._list_vectors[list_no] = data[f'list_{list_no}']
+                index._list_keys[list_no] = np.arange(start, start + len(keys), dtype=np.int64)
+                for position, key in enumerate(keys):
+                    index._keys.append(key)
+                    index._where[key] = (list_no, position)
+            index.payloads = meta['payloads']
+        return index
+
+def parse_vector(text: str) -> np.ndarray:
+    """Разбирает текстовое представление pgvector '[0.1,0.2,...]'"""
+    return np.array(text.strip('[]').split(','), dtype=np.float32)
+
+def export_from_db(conn, dim: int = 1536, page_size: int = 2000, nlist: int = None) -> VectorIndex:
+    """
+    Строит индекс по всем чанкам с embedding_vec одним серверным курсором.
+    Ключ - chunk_uuid(slug, chunk_index), как в инкрементальной загрузке и BM25-индексе
+    """
+    import db
+    from kb_manifest import chunk_uuid
+
+    scan = db.named_cursor(conn, 'vector_export', itersize=page_size)
+    scan.execute("""
+        SELECT c.id, c.article_id, a.slug, c.chunk_index, c.embedding_vec::text
+        FROM kb_chunks c
+        JOIN kb_articles a ON a.id = c.article_id
+        WHERE c.embedding_vec IS NOT NULL
+    """)
+    keys, payloads, vectors = [], [], []
+    for chunk_id, article_id, slug, chunk_index, vector in scan:
+        keys.append(chunk_uuid(slug, chunk_index))
+        payloads.append({'chunk_id': str(chunk_id), 'article_id': str(article_id), 'slug': slug, 'chunk_index': chunk_index})
+        vectors.append(parse_vector(vector))
+    scan.close()
+
+    index = VectorIndex(dim=dim, nlist=nlist)
+    if keys:
+        index.build(keys, np.vstack(vectors), payloads)
+    return index
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Точный top-k по нормированным векторам"""
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def clustered_vectors(count: int, dim: int, clusters: int = 64, spread: float = 0.6, seed: int = 1) -> np.ndarray:
+    """Синтетические эмбеддинги: темы-кластеры с шумом, как у реальной базы знаний"""
+    rng = np.random.default_rng(seed)
+    centers = _normalize_rows(rng.standard_normal((clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, clusters, size=count)
+    noise = _normalize_rows(rng.standard_normal((count, dim)).astype(np.float32))
+    return _normalize_rows(centers[labels] + spread * noise)
+
+def benchmark(count: int, dim: int, queries: int, k: int, nprobes: Sequence[int], nlist: int = None,
+              max_scans: Sequence[int] = (0, 1000)):
+    vectors = clustered_vectors(count, dim)
+    query_vectors = clustered_vectors(queries, dim, seed=2)
+    keys = [str(i) for i in range(count)]
+    print(f"📊 Векторов: {count} x {dim}, запросов: {queries}, k={k}")
+
+    started = time.perf_counter()
+    index = VectorIndex(dim=dim, nlist=nlist)
+    index.build(keys, vectors)
+    print(f"🏗  Построение IVF (nlist={len(index.centroids)}): {time.perf_counter() - started:.2f}s")
+
+    exact, exact_times = [], []
+    for query in query_vectors:
+        started = time.perf_counter()
+        exact.append({str(i) for i in brute_force(vectors, query, k)})
+        exact_times.append(time.perf_counter() - started)
+    print(f"\n🐌 Полный перебор: p50 {np.percentile(exact_times, 50) * 1000:.3f}ms, "
+          f"p99 {np.percentile(exact_times, 99) * 1000:.3f}ms")
+
+    for nprobe in nprobes:
+        for max_scan in max_scans:
+            times, recall = [], []
+            for query, truth in zip(query_vectors, exact):
+                started = time.perf_counter()
+                found = index.search(query, k, nprobe=nprobe, max_scan=max_scan)
+                times.append(time.perf_counter() - started)
+                recall.append(len({key for key, _ in found} & truth) / k)
+            print(f"⚡ IVF nprobe={nprobe}, max_scan={max_scan or '-'}: recall@{k} {np.mean(recall):.3f}, "
+                  f"p50 {np.percentile(times, 50) * 1000:.3f}ms, p99 {np.percentile(times, 99) * 1000:.3f}ms")
+
+def main():
+    """Построение локального векторного индекса и бенчмарк"""
+    parser = argparse.ArgumentParser(description="Локальный ANN-индекс по kb_chunks.embedding_vec")
+    parser.add_argument("--build", action="store_true", help="Выгрузить embedding_vec из базы и построить индекс")
+    parser.add_argument("--path", default=str(VECTOR_INDEX_PATH), help=f"Файл индекса (по умолчанию: {VECTOR_INDEX_PATH})")
+    parser.add_argument("--nlist", type=int, help="Число списков IVF (по умолчанию: sqrt(N))")
+    parser.add_argument("--benchmark", action="store_true", help="Сравнить с полным перебором на синтетических векторах")
+    parser.add_argument("--count", type=int, default=20000, help="Векторов в бенчмарке")
+    parser.add_argument("--dim", type=int, default=1536, help="Размерность векторов")
+    parser.add_argument("--queries", type=int, default=200, help="Запросов в бенчмарке")
+    parser.add_argument("-k", type=int, default=8, help="Сколько соседей искать")
+    parser.add_argument("--nprobe", type=int, nargs='+', default=[4, 8, 16, 32], help="Значения nprobe для бенчмарка")
+    parser.add_argument("--max-scan", type=int, nargs='+', default=[0, 1000],
+                        help="Бюджеты просмотренных векторов для бенчмарка (0 - без ограничения)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.count, args.dim, args.queries, args.k, args.nprobe, args.nlist, args.max_scan)
+        return
+
+    if args.build:
+        import db
+
+        conn = db.connect()
+        try:
+            started = time.perf_counter()
+            index = export_from_db(conn, dim=args.dim, nlist=args.nlist)
+        finally:
+            conn.close()
+        index.save(Path(args.path))
+        print(f"✅ Индекс построен: {len(index)} векторов за {time.perf_counter() - started:.2f}s -> {args.path}")
+        return
+
+    parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,16 @@
 
 import os
 import sys
-import psycopg2
 import uuid
 from datetime import datetime
 from pathlib import Path
 import re
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from kb_manifest import bump_kb_version
 
 def parse_markdown_file(file_path: Path) -> dict:
     """Парсит markdown файл и извлекает метаданные и содержимое"""
@@ -97,7 +93,7 @@ def main():
     
     # Подключение к базе данных
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к базе данных установлено")
     except Exception as e:
@@ -134,6 +130,7 @@ def main():
         
         # Коммитим изменения
         conn.commit()
+        bump_kb_version('load_knowledge')
         print(f"\n🎉 Загрузка завершена! Загружено {loaded_count} статей")
         
         # Показываем статистику
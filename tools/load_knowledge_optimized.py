@@ -5,63 +5,25 @@
 
 import os
 import sys
-import psycopg2
 import uuid
 from datetime import datetime
 from pathlib import Path
-import re
+from typing import Optional
+import io
 import json
+import time
+import argparse
+from psycopg2.extras import execute_values
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
-
-def parse_markdown_file(file_path: Path) -> dict:
-    """Парсит markdown файл и извлекает метаданные и содержимое"""
-    content = file_path.read_text(encoding='utf-8')
-    
-    # Извлекаем frontmatter (между ---)
-    frontmatter_match = re.match(r'^---\n(.*?)\n---\n', content, re.DOTALL)
-    
-    if frontmatter_match:
-        frontmatter_text = frontmatter_match.group(1)
-        # Простой парсинг YAML
-        metadata = {}
-        for line in frontmatter_text.split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip().strip('"')
-                if key == 'tags':
-                    # Парсим теги
-                    tags_text = value.strip('[]')
-                    tags = [tag.strip().strip('"') for tag in tags_text.split(',') if tag.strip()]
-                    metadata[key] = tags
-                else:
-                    metadata[key] = value
-        
-        # Убираем frontmatter из содержимого
-        body_md = content[frontmatter_match.end():].strip()
-    else:
-        # Если нет frontmatter, используем имя файла
-        metadata = {
-            'title': file_path.stem.replace('-', ' ').title(),
-            'slug': file_path.stem,
-            'tags': []
-        }
-        body_md = content
-    
-    return {
-        'title': metadata.get('title', file_path.stem.replace('-', ' ').title()),
-        'slug': metadata.get('slug', file_path.stem),
-        'tags': metadata.get('tags', []),
-        'body_md': body_md
-    }
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from kb_chunker import ParagraphChunker, get_chunker, CHUNKERS
+from kb_markdown import parse_markdown_file, split_article_into_chunks
+from kb_embeddings import EmbeddingStage, EMBEDDERS, get_embedder, embed_pending_chunks
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from kb_manifest import KBManifest, MANIFEST_PATH, bump_kb_version, content_hash, text_hash, article_uuid, chunk_uuid
 
 def create_kb_article(cursor, article_data: dict) -> str:
     """Создает статью в базе знаний"""
@@ -87,22 +49,9 @@ def create_kb_article(cursor, article_data: dict) -> str:
     
     return cursor.fetchone()[0]
 
-def create_chunks_from_article(cursor, article_id: str, article_data: dict):
+def create_chunks_from_article(cursor, article_id: str, article_data: dict, chunker=None):
     """Создает чанки из статьи для RAG системы"""
-    content = article_data['body_md']
-    
-    # Простое разбиение на чанки по параграфам
-    paragraphs = content.split('\n\n')
-    chunks = []
-    
-    for i, paragraph in enumerate(paragraphs):
-        if paragraph.strip():
-            chunk_text = paragraph.strip()
-            if len(chunk_text) > 50:  # Минимальная длина чанка
-                chunks.append({
-                    'text': chunk_text,
-                    'index': i
-                })
+    chunks = split_article_into_chunks(article_data, chunker)
     
     # Вставляем чанки
     for chunk in chunks:
@@ -112,7 +61,11 @@ def create_chunks_from_article(cursor, article_id: str, article_data: dict):
             VALUES (%s, %s, %s, %s, %s)
             ON CONFLICT (article_id, chunk_index) DO UPDATE SET
                 chunk_text = EXCLUDED.chunk_text,
-                created_at = EXCLUDED.created_at
+                created_at = EXCLUDED.created_at,
+                embedding = CASE WHEN kb_chunks.chunk_text IS DISTINCT FROM EXCLUDED.chunk_text
+                                 THEN NULL ELSE kb_chunks.embedding END,
+                embedding_vec = CASE WHEN kb_chunks.chunk_text IS DISTINCT FROM EXCLUDED.chunk_text
+                                     THEN NULL ELSE kb_chunks.embedding_vec END
         """, (
             chunk_id,
             article_id,
@@ -120,6 +73,362 @@ def create_chunks_from_article(cursor, article_id: str, article_data: dict):
             chunk['index'],
             datetime.now()
         ))
+    
+    # Статья могла стать короче - чанки за пределами нового разбиения удаляем
+    cursor.execute("""
+        DELETE FROM kb_chunks
+        WHERE article_id = %s AND NOT (chunk_index = ANY(%s))
+    """, (article_id, [chunk['index'] for chunk in chunks]))
+
+def _copy_value(value) -> str:
+    """Экранирует значение для текстового формата COPY"""
+    if value is None:
+        return '\\N'
+    text = value if isinstance(value, str) else str(value)
+    return (text.replace('\\', '\\\\')
+                .replace('\t', '\\t')
+                .replace('\n', '\\n')
+                .replace('\r', '\\r'))
+
+def copy_rows(cursor, table: str, columns: list, rows) -> int:
+    """Передает строки в таблицу одним COPY FROM STDIN"""
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
+
+def bulk_load_articles(cursor, articles: list, chunker=None) -> dict:
+    """
+    Загружает статьи и чанки через COPY в staging таблицы
+    и сливает их в kb_articles / kb_chunks одним upsert на таблицу.
+    Если у статьи уже есть ключ 'chunks', повторное разбиение не выполняется
+    """
+    started = time.perf_counter()
+    now = datetime.now()
+    
+    # Staging таблицы повторяют типы колонок целевых таблиц и живут до коммита
+    cursor.execute("""
+        CREATE TEMP TABLE kb_articles_stage ON COMMIT DROP AS
+        SELECT id, title, slug, body_md, tags, updated_at
+        FROM kb_articles WITH NO DATA
+    """)
+    cursor.execute("""
+        CREATE TEMP TABLE kb_chunks_stage ON COMMIT DROP AS
+        SELECT c.id, a.slug AS article_slug, c.chunk_text, c.chunk_index, c.created_at
+        FROM kb_chunks c, kb_articles a WITH NO DATA
+    """)
+    
+    article_rows = (
+        (str(uuid.uuid4()), a['title'], a['slug'], a['body_md'], json.dumps(a['tags']), now)
+        for a in articles
+    )
+    articles_copied = copy_rows(
+        cursor, 'kb_articles_stage',
+        ['id', 'title', 'slug', 'body_md', 'tags', 'updated_at'],
+        article_rows
+    )
+    
+    chunk_rows = (
+        (str(uuid.uuid4()), a['slug'], chunk['text'], chunk['index'], now)
+        for a in articles
+        for chunk in (a['chunks'] if 'chunks' in a else split_article_into_chunks(a, chunker))
+    )
+    chunks_copied = copy_rows(
+        cursor, 'kb_chunks_stage',
+        ['id', 'article_slug', 'chunk_text', 'chunk_index', 'created_at'],
+        chunk_rows
+    )
+    
+    # DISTINCT ON защищает от повторного slug в одной загрузке:
+    # ON CONFLICT DO UPDATE не может изменить одну строку дважды
+    cursor.execute("""
+        INSERT INTO kb_articles (id, title, slug, body_md, tags, updated_at)
+        SELECT DISTINCT ON (slug) id, title, slug, body_md, tags, updated_at
+        FROM kb_articles_stage
+        ORDER BY slug
+        ON CONFLICT (slug) DO UPDATE SET
+            title = EXCLUDED.title,
+            body_md = EXCLUDED.body_md,
+            tags = EXCLUDED.tags,
+            updated_at = EXCLUDED.updated_at
+    """)
+    articles_merged = cursor.rowcount
+    
+    # Эмбеддинг чанка с изменившимся текстом сбрасывается - его пересчитает --embed;
+    # у неизменных чанков он сохраняется
+    cursor.execute("""
+        INSERT INTO kb_chunks (id, article_id, chunk_text, chunk_index, created_at)
+        SELECT DISTINCT ON (a.id, s.chunk_index) s.id, a.id, s.chunk_text, s.chunk_index, s.created_at
+        FROM kb_chunks_stage s
+        JOIN kb_articles a ON a.slug = s.article_slug
+        ORDER BY a.id, s.chunk_index
+        ON CONFLICT (article_id, chunk_index) DO UPDATE SET
+            chunk_text = EXCLUDED.chunk_text,
+            created_at = EXCLUDED.created_at,
+            embedding = CASE WHEN kb_chunks.chunk_text IS DISTINCT FROM EXCLUDED.chunk_text
+                             THEN NULL ELSE kb_chunks.embedding END,
+            embedding_vec = CASE WHEN kb_chunks.chunk_text IS DISTINCT FROM EXCLUDED.chunk_text
+                                 THEN NULL ELSE kb_chunks.embedding_vec END
+    """)
+    chunks_merged = cursor.rowcount
+    
+    # Чанки загруженных статей, которых нет в новом разбиении
+    cursor.execute("""
+        DELETE FROM kb_chunks c
+        USING kb_articles a
+        WHERE c.article_id = a.id
+          AND a.slug IN (SELECT slug FROM kb_articles_stage)
+          AND NOT EXISTS (
+              SELECT 1 FROM kb_chunks_stage s
+              WHERE s.article_slug = a.slug AND s.chunk_index = c.chunk_index
+          )
+    """)
+    chunks_deleted = cursor.rowcount
+    
+    elapsed = time.perf_counter() - started
+    total_rows = articles_copied + chunks_copied
+    return {
+        'articles': articles_merged,
+        'chunks': chunks_merged,
+        'chunks_deleted': chunks_deleted,
+        'seconds': elapsed,
+        'rows_per_sec': total_rows / elapsed if elapsed > 0 else 0.0
+    }
+
+def plan_incremental_sync(kb_path: Path, manifest: KBManifest, chunker=None) -> dict:
+    """
+    Сравнивает файлы с манифестом и возвращает только изменившиеся статьи
+    и чанки, а также slug статей, которые нужно удалить.
+    Смена чанкера или его параметров делает изменившимися все статьи
+    """
+    chunker = chunker or ParagraphChunker()
+    chunker_config = chunker.config()
+    rechunk = manifest.chunker != chunker_config
+    plan = {'changed': [], 'removed_slugs': [], 'touched': {}, 'unchanged': 0, 'chunker': chunker_config}
+    seen = set()
+    
+    for md_file in sorted(kb_path.glob('*.md')):
+        name = md_file.name
+        seen.add(name)
+        stat = md_file.stat()
+        if not rechunk and manifest.is_unchanged(name, stat):
+            plan['unchanged'] += 1
+            continue
+        
+        raw = md_file.read_bytes()
+        file_sha = content_hash(raw)
+        old_entry = manifest.get(name) or {}
+        if not rechunk and old_entry.get('sha256') == file_sha:
+            # Изменился только mtime - обновляем манифест без записи в базу
+            plan['touched'][name] = dict(old_entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            plan['unchanged'] += 1
+            continue
+        
+        article_data = parse_markdown_file(md_file)
+        slug = article_data['slug']
+        old_chunks = old_entry.get('chunks', {})
+        if old_entry and old_entry.get('slug') != slug:
+            plan['removed_slugs'].append(old_entry['slug'])
+            old_chunks = {}
+        if rechunk:
+            old_chunks = {}
+        
+        chunks = split_article_into_chunks(article_data, chunker)
+        chunk_hashes = {str(chunk['index']): text_hash(chunk['text']) for chunk in chunks}
+        plan['changed'].append({
+            'name': name,
+            'article': article_data,
+            'changed_chunks': [c for c in chunks if old_chunks.get(str(c['index'])) != chunk_hashes[str(c['index'])]],
+            'chunk_indexes': [c['index'] for c in chunks],
+            'entry': {
+                'sha256': file_sha,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'slug': slug,
+                'chunks': chunk_hashes
+            }
+        })
+    
+    plan['removed_files'] = sorted(set(manifest.files) - seen)
+    for name in plan['removed_files']:
+        plan['removed_slugs'].append(manifest.files[name]['slug'])
+    
+    # slug мог перейти к другому файлу - такие статьи не удаляем
+    live_slugs = {item['entry']['slug'] for item in plan['changed']}
+    live_slugs.update(manifest.files[name]['slug'] for name in seen if name in manifest.files)
+    plan['removed_slugs'] = sorted(set(plan['removed_slugs']) - live_slugs)
+    
+    return plan
+
+def apply_incremental_sync(cursor, plan: dict) -> dict:
+    """Записывает в базу только изменения из плана синхронизации"""
+    stats = {'articles': 0, 'chunks_written': 0, 'chunks_deleted': 0, 'articles_deleted': 0}
+    now = datetime.now()
+    
+    for item in plan['changed']:
+        article_data = item['article']
+        slug = article_data['slug']
+        cursor.execute("""
+            INSERT INTO kb_articles (id, title, slug, body_md, tags, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (slug) DO UPDATE SET
+                title = EXCLUDED.title,
+                body_md = EXCLUDED.body_md,
+                tags = EXCLUDED.tags,
+                updated_at = EXCLUDED.updated_at
+            RETURNING id
+        """, (
+            article_uuid(slug),
+            article_data['title'],
+            slug,
+            article_data['body_md'],
+            json.dumps(article_data['tags']),
+            now
+        ))
+        article_id = cursor.fetchone()[0]
+        stats['articles'] += 1
+        
+        if item['changed_chunks']:
+            # Измененный текст делает старый эмбеддинг неактуальным
+            execute_values(cursor, """
+                INSERT INTO kb_chunks (id, article_id, chunk_text, chunk_index, created_at)
+                VALUES %s
+                ON CONFLICT (article_id, chunk_index) DO UPDATE SET
+                    chunk_text = EXCLUDED.chunk_text,
+                    created_at = EXCLUDED.created_at,
+                    embedding = NULL,
+                    embedding_vec = NULL
+            """, [
+                (chunk_uuid(slug, c['index']), article_id, c['text'], c['index'], now)
+                for c in item['changed_chunks']
+            ])
+            stats['chunks_written'] += len(item['changed_chunks'])
+        
+        # Удаляем по базе, а не по манифесту: в ней могут остаться
+        # чанки от полной загрузки или от прежнего чанкера
+        cursor.execute("""
+            DELETE FROM kb_chunks
+            WHERE article_id = %s AND NOT (chunk_index = ANY(%s))
+        """, (article_id, item['chunk_indexes']))
+        stats['chunks_deleted'] += cursor.rowcount
+    
+    if plan['removed_slugs']:
+        cursor.execute("""
+            DELETE FROM kb_chunks
+            WHERE article_id IN (SELECT id FROM kb_articles WHERE slug = ANY(%s))
+        """, (plan['removed_slugs'],))
+        stats['chunks_deleted'] += cursor.rowcount
+        cursor.execute("DELETE FROM kb_articles WHERE slug = ANY(%s)", (plan['removed_slugs'],))
+        stats['articles_deleted'] = cursor.rowcount
+    
+    return stats
+
+def update_manifest(manifest: KBManifest, plan: dict):
+    """Переносит результаты синхронизации в манифест"""
+    manifest.chunker = plan['chunker']
+    for name, entry in plan['touched'].items():
+        manifest.update(name, entry)
+    for item in plan['changed']:
+        manifest.update(item['name'], item['entry'])
+    for name in plan['removed_files']:
+        manifest.remove(name)
+
+def sync_bm25_index(bm25_path: Path, kb_path: Path, chunker=None, plan: dict = None):
+    """
+    Обновляет локальный BM25-индекс (kb_bm25): по плану инкрементальной
+    синхронизации, если индекс уже есть, иначе строит его по всем статьям
+    """
+    from kb_bm25 import BM25Index
+    
+    started = time.perf_counter()
+    if plan is not None and bm25_path.exists():
+        index = BM25Index.load(bm25_path)
+        stats = index.apply_sync_plan(plan)
+        print(f"  🔎 BM25-индекс: чанков обновлено {stats['chunks_written']}, удалено {stats['chunks_deleted']}")
+    else:
+        index = BM25Index.from_kb(kb_path, chunker)
+        print(f"  🔎 BM25-индекс построен: {len(index)} чанков")
+    index.save(bm25_path)
+    print(f"  ⏱  BM25: {time.perf_counter() - started:.2f}s -> {bm25_path}")
+
+def incremental_sync(kb_path: Path, manifest_path: Path = MANIFEST_PATH, chunker=None,
+                     bm25_path: Optional[Path] = None) -> Optional[dict]:
+    """
+    Инкрементальная синхронизация: без изменений в файлах
+    подключение к базе не открывается
+    """
+    started = time.perf_counter()
+    manifest = KBManifest.load(manifest_path)
+    plan = plan_incremental_sync(kb_path, manifest, chunker)
+    
+    print(f"  - Без изменений: {plan['unchanged']}")
+    print(f"  - Изменено статей: {len(plan['changed'])}")
+    print(f"  - Удалено статей: {len(plan['removed_slugs'])}")
+    
+    if not plan['changed'] and not plan['removed_slugs']:
+        if plan['touched']:
+            update_manifest(manifest, plan)
+            manifest.save()
+        print(f"✅ База знаний актуальна ({time.perf_counter() - started:.2f}s)")
+        if bm25_path is not None and not bm25_path.exists():
+            sync_bm25_index(bm25_path, kb_path, chunker)
+        return None
+    
+    conn = db.connect()
+    cursor = conn.cursor()
+    try:
+        stats = apply_incremental_sync(cursor, plan)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    
+    # Манифест и версия обновляются только после успешного коммита
+    update_manifest(manifest, plan)
+    manifest.save()
+    kb_version = bump_kb_version('incremental')
+    if bm25_path is not None:
+        sync_bm25_index(bm25_path, kb_path, chunker, plan)
+    
+    stats['seconds'] = time.perf_counter() - started
+    print(f"  ✅ Статей записано: {stats['articles']}")
+    print(f"  📝 Чанков записано: {stats['chunks_written']}, удалено: {stats['chunks_deleted']}")
+    print(f"  🔖 Версия базы знаний: {kb_version}")
+    print(f"  ⏱  Время: {stats['seconds']:.2f}s")
+    return stats
+
+def generate_embeddings(embedder: str = 'openai', concurrency: int = 4, batch_size: int = 96,
+                        cache_path: Optional[Path] = EMBEDDING_CACHE_PATH):
+    """Генерирует эмбеддинги для всех чанков, у которых их еще нет"""
+    print(f"\n🧠 Генерация эмбеддингов ({embedder}, {concurrency} потоков, {batch_size} текстов в запросе)...")
+    cache = EmbeddingCache(cache_path) if cache_path else None
+    stage = EmbeddingStage(get_embedder(embedder), batch_size=batch_size, concurrency=concurrency, cache=cache)
+    conn = db.connect()
+    try:
+        stats = embed_pending_chunks(conn, stage)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        if cache is not None:
+            cache.close()
+    
+    if cache is not None:
+        print(f"  📦 Кеш эмбеддингов: {stats['cached']} попаданий, hit rate {cache.hit_rate:.1%}")
+    print(f"  ✅ Эмбеддингов записано: {stats['written']} за {stats['seconds']:.2f}s ({stats['chunks_per_sec']:.0f} чанков/сек)")
+    print(f"  - Запросов: {stats['requests']}, повторов: {stats['retries']}, упирались в лимит: {stats['rate_limited']}")
+    if stats['failed']:
+        print(f"  ⚠️  Не удалось получить эмбеддинги для {stats['failed']} чанков")
+    return stats
 
 def check_existing_data(cursor) -> dict:
     """Проверяет существующие данные в базе"""
@@ -141,10 +450,111 @@ def check_existing_data(cursor) -> dict:
 
 def main():
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Загрузка знаний в Supabase")
+    parser.add_argument(
+        "--kb-path",
+        default="apps/support-gateway/kb_articles",
+        help="Папка с markdown статьями (по умолчанию: apps/support-gateway/kb_articles)"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Загрузить все статьи и чанки через COPY и один upsert на таблицу"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Синхронизировать только изменившиеся статьи и чанки по манифесту хешей"
+    )
+    parser.add_argument(
+        "--manifest",
+        default=str(MANIFEST_PATH),
+        help=f"Путь к манифесту инкрементальной синхронизации (по умолчанию: {MANIFEST_PATH})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Параллельная загрузка: размер пула процессов для парсинга и разбиения на чанки"
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        help="Параллельная загрузка: число писателей с отдельными соединениями"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Параллельная загрузка: статей в одном коммите писателя (по умолчанию: 500)"
+    )
+    parser.add_argument(
+        "--chunker",
+        choices=sorted(CHUNKERS),
+        default="paragraph",
+        help="Способ разбиения на чанки (по умолчанию: paragraph)"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=400,
+        help="Чанкер token: бюджет токенов на чанк (по умолчанию: 400)"
+    )
+    parser.add_argument(
+        "--overlap-tokens",
+        type=int,
+        default=50,
+        help="Чанкер token: перекрытие соседних чанков в токенах (по умолчанию: 50)"
+    )
+    parser.add_argument(
+        "--embed",
+        action="store_true",
+        help="После загрузки сгенерировать эмбеддинги для чанков без embedding_vec"
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=sorted(EMBEDDERS),
+        default="openai",
+        help="Провайдер эмбеддингов (hash - детерминированная локальная замена для тестов)"
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=4,
+        help="Число одновременных запросов к провайдеру эмбеддингов (по умолчанию: 4)"
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=96,
+        help="Текстов в одном запросе к провайдеру эмбеддингов (по умолчанию: 96)"
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        default=str(EMBEDDING_CACHE_PATH),
+        help=f"Файл кеша эмбеддингов (по умолчанию: {EMBEDDING_CACHE_PATH})"
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Не использовать кеш эмбеддингов"
+    )
+    parser.add_argument(
+        "--bm25-index",
+        help="Поддерживать локальный BM25-индекс чанков в этом файле (например, data/kb_bm25.json)"
+    )
+    args = parser.parse_args()
+    embedding_cache = None if args.no_embedding_cache else Path(args.embedding_cache)
+    bm25_path = Path(args.bm25_index) if args.bm25_index else None
+    
+    if args.chunker == "token":
+        chunker = get_chunker("token", max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    else:
+        chunker = get_chunker(args.chunker)
+    
     print("🚀 Запуск оптимизированной загрузки знаний в Supabase")
     
     # Путь к папке с файлами знаний
-    kb_path = Path('apps/support-gateway/kb_articles')
+    kb_path = Path(args.kb_path)
     
     if not kb_path.exists():
         print(f"❌ Папка {kb_path} не найдена")
@@ -175,9 +585,39 @@ tags: ["тест", "документация"]
 """)
         print(f"✅ Создан тестовый файл: {test_file}")
     
+    if args.incremental:
+        print("\n🔄 Инкрементальная синхронизация...")
+        try:
+            incremental_sync(kb_path, Path(args.manifest), chunker, bm25_path)
+            if args.embed:
+                generate_embeddings(args.embedder, args.embed_concurrency, args.embed_batch_size, embedding_cache)
+        except Exception as e:
+            print(f"❌ Ошибка синхронизации: {e}")
+            sys.exit(1)
+        return
+    
+    if args.workers is not None or args.writers is not None:
+        from kb_pipeline import run_pipeline, print_pipeline_stats
+        
+        md_files = sorted(kb_path.glob('*.md'))
+        print(f"\n⚙️  Параллельная загрузка {len(md_files)} файлов...")
+        result = run_pipeline(
+            md_files,
+            workers=args.workers,
+            writers=args.writers if args.writers is not None else 2,
+            batch_size=args.batch_size,
+            chunker=chunker
+        )
+        print_pipeline_stats(result)
+        if bm25_path is not None:
+            sync_bm25_index(bm25_path, kb_path, chunker)
+        if args.embed:
+            generate_embeddings(args.embedder, args.embed_concurrency, args.embed_batch_size, embedding_cache)
+        return
+    
     # Подключение к базе данных
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к Supabase установлено")
     except Exception as e:
@@ -200,36 +640,63 @@ tags: ["тест", "документация"]
             print("❌ Markdown файлы не найдены")
             return
         
-        # Загружаем каждый файл
-        loaded_count = 0
-        chunks_created = 0
-        
-        for md_file in md_files:
-            try:
-                print(f"\n📖 Обрабатываю {md_file.name}...")
-                
-                # Парсим файл
-                article_data = parse_markdown_file(md_file)
-                
-                # Создаем статью в базе
-                article_id = create_kb_article(cursor, article_data)
-                print(f"  ✅ Статья '{article_data['title']}' загружена (ID: {article_id})")
-                
-                # Создаем чанки
-                create_chunks_from_article(cursor, article_id, article_data)
-                print(f"  📝 Чанки созданы для статьи")
-                
-                loaded_count += 1
-                
-            except Exception as e:
-                print(f"  ❌ Ошибка обработки {md_file.name}: {e}")
-                continue
+        if args.bulk:
+            # Парсим все файлы, затем одним COPY + upsert на таблицу
+            articles = []
+            for md_file in md_files:
+                try:
+                    articles.append(parse_markdown_file(md_file))
+                except Exception as e:
+                    print(f"  ❌ Ошибка обработки {md_file.name}: {e}")
+            
+            print(f"\n📦 Bulk-загрузка {len(articles)} статей через COPY...")
+            bulk_stats = bulk_load_articles(cursor, articles, chunker)
+            loaded_count = len(articles)
+            print(f"  ✅ Статей записано: {bulk_stats['articles']}")
+            print(f"  📝 Чанков записано: {bulk_stats['chunks']}, удалено: {bulk_stats['chunks_deleted']}")
+            print(f"  ⏱  Время: {bulk_stats['seconds']:.2f}s ({bulk_stats['rows_per_sec']:.0f} строк/сек)")
+        else:
+            # Загружаем каждый файл
+            loaded_count = 0
+            started = time.perf_counter()
+            
+            for md_file in md_files:
+                try:
+                    print(f"\n📖 Обрабатываю {md_file.name}...")
+                    
+                    # Парсим файл
+                    article_data = parse_markdown_file(md_file)
+                    
+                    # Создаем статью в базе
+                    article_id = create_kb_article(cursor, article_data)
+                    print(f"  ✅ Статья '{article_data['title']}' загружена (ID: {article_id})")
+                    
+                    # Создаем чанки
+                    create_chunks_from_article(cursor, article_id, article_data, chunker)
+                    print(f"  📝 Чанки созданы для статьи")
+                    
+                    loaded_count += 1
+                    
+                except Exception as e:
+                    print(f"  ❌ Ошибка обработки {md_file.name}: {e}")
+                    continue
+            
+            elapsed = time.perf_counter() - started
+            if elapsed > 0:
+                print(f"\n⏱  Время: {elapsed:.2f}s ({loaded_count / elapsed:.1f} статей/сек)")
         
         # Коммитим изменения
         conn.commit()
+        bump_kb_version('bulk' if args.bulk else 'per-row')
         print(f"\n🎉 Загрузка завершена!")
         print(f"  - Загружено статей: {loaded_count}")
         
+        if bm25_path is not None:
+            sync_bm25_index(bm25_path, kb_path, chunker)
+        
+        if args.embed:
+            generate_embeddings(args.embedder, args.embed_concurrency, args.embed_batch_size, embedding_cache)
+        
         # Показываем финальную статистику
         final_stats = check_existing_data(cursor)
         print(f"\n📊 Финальная статистика:")
@@ -239,7 +706,7 @@ tags: ["тест", "документация"]
         
         if final_stats['chunks_with_embeddings'] == 0:
             print(f"\n⚠️  Внимание: Чанки созданы, но эмбеддинги не сгенерированы")
-            print(f"   Для генерации эмбеддингов нужен OpenAI API ключ")
+            print(f"   Запустите загрузку с --embed (нужен OPENAI_API_KEY)")
         
     except Exception as e:
         print(f"❌ Ошибка: {e}")
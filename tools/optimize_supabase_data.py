@@ -3,96 +3,55 @@
 Скрипт для оптимизации и проверки данных в Supabase
 """
 
-import psycopg2
+import os
 import sys
+import argparse
 from datetime import datetime
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-def check_database_health(cursor) -> dict:
+import db
+from db_stats import DEFAULT_TABLES, catalog_stats, collect_stats, coverage_percent, format_value
+
+def check_database_health(stats: dict, catalog: dict) -> dict:
     """Проверяет здоровье базы данных"""
     health = {}
     
     # Проверяем основные таблицы
-    tables = ['kb_articles', 'kb_chunks', 'conversations', 'messages', 'operators']
-    for table in tables:
-        try:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
-            health[table] = count
-        except Exception as e:
-            health[table] = f"ERROR: {e}"
-    
-    # Проверяем индексы
-    cursor.execute("""
-        SELECT indexname, tablename 
-        FROM pg_indexes 
-        WHERE schemaname = 'public' 
-        AND tablename IN ('kb_articles', 'kb_chunks', 'conversations', 'messages')
-        ORDER BY tablename, indexname
-    """)
-    indexes = cursor.fetchall()
-    health['indexes'] = len(indexes)
+    for table, metrics in stats.items():
+        health[table] = metrics.get('total') if 'error' not in metrics else f"ERROR: {metrics['error']}"
     
-    # Проверяем размеры таблиц
-    cursor.execute("""
-        SELECT 
-            schemaname,
-            tablename,
-            pg_size_pretty(pg_total_relation_size(schemaname||'.'||tablename)) as size
-        FROM pg_tables 
-        WHERE schemaname = 'public' 
-        AND tablename IN ('kb_articles', 'kb_chunks', 'conversations', 'messages')
-        ORDER BY pg_total_relation_size(schemaname||'.'||tablename) DESC
-    """)
-    sizes = cursor.fetchall()
-    health['table_sizes'] = sizes
+    # Индексы и размеры таблиц из каталога
+    kb_tables = [t for t in ('kb_articles', 'kb_chunks', 'conversations', 'messages') if t in catalog]
+    health['indexes'] = sum(catalog[t]['indexes'] for t in kb_tables)
+    health['table_sizes'] = sorted(
+        ((t, catalog[t]['size']) for t in kb_tables),
+        key=lambda item: catalog[item[0]]['size_bytes'], reverse=True
+    )
     
     return health
 
-def analyze_kb_data(cursor) -> dict:
+def analyze_kb_data(cursor, stats: dict) -> dict:
     """Анализирует данные базы знаний"""
     analysis = {}
     
     # Статистика статей
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_articles,
-            COUNT(CASE WHEN tags IS NOT NULL THEN 1 END) as articles_with_tags,
-            COUNT(CASE WHEN body_md IS NOT NULL AND LENGTH(body_md) > 0 THEN 1 END) as articles_with_content
-        FROM kb_articles
-    """)
-    article_stats = cursor.fetchone()
+    articles = stats['kb_articles']
     analysis['articles'] = {
-        'total': article_stats[0],
-        'with_tags': article_stats[1],
-        'with_content': article_stats[2]
+        'total': articles['total'],
+        'with_tags': articles['with_tags'],
+        'with_content': articles['with_content']
     }
     
     # Статистика чанков
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_chunks,
-            COUNT(CASE WHEN embedding IS NOT NULL THEN 1 END) as chunks_with_embeddings,
-            AVG(LENGTH(chunk_text)) as avg_chunk_length,
-            MIN(LENGTH(chunk_text)) as min_chunk_length,
-            MAX(LENGTH(chunk_text)) as max_chunk_length
-        FROM kb_chunks
-    """)
-    chunk_stats = cursor.fetchone()
+    chunks = stats['kb_chunks']
     analysis['chunks'] = {
-        'total': chunk_stats[0],
-        'with_embeddings': chunk_stats[1],
-        'avg_length': round(chunk_stats[2] or 0, 2),
-        'min_length': chunk_stats[3] or 0,
-        'max_length': chunk_stats[4] or 0
+        'total': chunks['total'],
+        'with_embeddings': chunks['with_embeddings'],
+        'avg_length': chunks['avg_length'],
+        'min_length': chunks['min_length'],
+        'max_length': chunks['max_length']
     }
     
     # Топ тегов (исправленная версия)
@@ -113,91 +72,85 @@ def analyze_kb_data(cursor) -> dict:
     
     return analysis
 
-def check_rag_readiness(cursor) -> dict:
+def check_rag_readiness(stats: dict) -> dict:
     """Проверяет готовность RAG системы"""
     readiness = {}
+    chunks = stats['kb_chunks']
     
     # Проверяем наличие эмбеддингов
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_chunks,
-            COUNT(CASE WHEN embedding IS NOT NULL THEN 1 END) as chunks_with_embeddings,
-            ROUND(
-                COUNT(CASE WHEN embedding IS NOT NULL THEN 1 END) * 100.0 / COUNT(*), 
-                2
-            ) as embedding_coverage_percent
-        FROM kb_chunks
-    """)
-    embedding_stats = cursor.fetchone()
     readiness['embeddings'] = {
-        'total_chunks': embedding_stats[0],
-        'with_embeddings': embedding_stats[1],
-        'coverage_percent': embedding_stats[2]
+        'total_chunks': chunks['total'],
+        'with_embeddings': chunks['with_embeddings'],
+        'coverage_percent': coverage_percent(chunks)
     }
     
     # Проверяем качество чанков
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_chunks,
-            COUNT(CASE WHEN LENGTH(chunk_text) > 100 THEN 1 END) as good_length_chunks,
-            COUNT(CASE WHEN LENGTH(chunk_text) > 500 THEN 1 END) as long_chunks,
-            COUNT(CASE WHEN LENGTH(chunk_text) < 50 THEN 1 END) as short_chunks
-        FROM kb_chunks
-    """)
-    quality_stats = cursor.fetchone()
     readiness['chunk_quality'] = {
-        'total': quality_stats[0],
-        'good_length': quality_stats[1],
-        'long': quality_stats[2],
-        'short': quality_stats[3]
+        'total': chunks['total'],
+        'good_length': chunks['good_length'],
+        'long': chunks['long'],
+        'short': chunks['short']
     }
     
     return readiness
 
 def main():
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Анализ и оптимизация данных в Supabase")
+    parser.add_argument("--fast", action="store_true", help="Оценки из pg_class/pg_stats вместо полного сканирования")
+    parser.add_argument("--timeout-ms", type=int, help="statement_timeout одного прохода по таблице")
+    args = parser.parse_args()
+    
     print("🔍 Анализ и оптимизация данных в Supabase")
     print("=" * 50)
     
     try:
         # Подключение к базе данных
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к Supabase установлено")
         
+        # Все метрики таблиц - один проход на таблицу, таблицы параллельно
+        stats = collect_stats(DEFAULT_TABLES, fast=args.fast, statement_timeout_ms=args.timeout_ms)
+        for table in ('kb_articles', 'kb_chunks'):
+            if 'error' in stats[table]:
+                raise RuntimeError(f"{table}: {stats[table]['error']}")
+        catalog = catalog_stats(DEFAULT_TABLES)
+        
         # 1. Проверка здоровья базы данных
-        print("\n📊 Проверка здоровья базы данных...")
-        health = check_database_health(cursor)
+        print(f"\n📊 Проверка здоровья базы данных{' (оценки каталога)' if args.fast else ''}...")
+        health = check_database_health(stats, catalog)
         
         print("  Таблицы:")
-        for table, count in health.items():
-            if isinstance(count, int):
-                print(f"    - {table}: {count} записей")
+        for table in stats:
+            if isinstance(health[table], int):
+                print(f"    - {table}: {'≈' if stats[table]['estimated'] else ''}{health[table]} записей")
         
         print(f"  Индексов: {health['indexes']}")
         
         print("  Размеры таблиц:")
-        for size_info in health['table_sizes']:
-            print(f"    - {size_info[1]}: {size_info[2]}")
+        for table_name, size in health['table_sizes']:
+            print(f"    - {table_name}: {size}")
         
         # 2. Анализ данных базы знаний
         print("\n📚 Анализ базы знаний...")
-        kb_analysis = analyze_kb_data(cursor)
+        kb_analysis = analyze_kb_data(cursor, stats)
         
         print(f"  Статьи:")
         print(f"    - Всего: {kb_analysis['articles']['total']}")
-        print(f"    - С тегами: {kb_analysis['articles']['with_tags']}")
-        print(f"    - С контентом: {kb_analysis['articles']['with_content']}")
+        print(f"    - С тегами: {format_value(kb_analysis['articles']['with_tags'])}")
+        print(f"    - С контентом: {format_value(kb_analysis['articles']['with_content'])}")
         
         print(f"  Чанки:")
         print(f"    - Всего: {kb_analysis['chunks']['total']}")
-        print(f"    - С эмбеддингами: {kb_analysis['chunks']['with_embeddings']}")
-        print(f"    - Средняя длина: {kb_analysis['chunks']['avg_length']} символов")
-        print(f"    - Диапазон: {kb_analysis['chunks']['min_length']} - {kb_analysis['chunks']['max_length']} символов")
+        print(f"    - С эмбеддингами: {format_value(kb_analysis['chunks']['with_embeddings'])}")
+        print(f"    - Средняя длина: {format_value(kb_analysis['chunks']['avg_length'])} символов")
+        print(f"    - Диапазон: {format_value(kb_analysis['chunks']['min_length'])} - "
+              f"{format_value(kb_analysis['chunks']['max_length'])} символов")
         
         # 3. Проверка готовности RAG
         print("\n🤖 Проверка готовности RAG системы...")
-        rag_readiness = check_rag_readiness(cursor)
+        rag_readiness = check_rag_readiness(stats)
         
         coverage = rag_readiness['embeddings']['coverage_percent']
         print(f"  Покрытие эмбеддингами: {coverage}%")
@@ -211,9 +164,9 @@ def main():
         
         quality = rag_readiness['chunk_quality']
         print(f"  Качество чанков:")
-        print(f"    - Хорошей длины (>100 символов): {quality['good_length']}")
-        print(f"    - Длинные (>500 символов): {quality['long']}")
-        print(f"    - Короткие (<50 символов): {quality['short']}")
+        print(f"    - Хорошей длины (>100 символов): {format_value(quality['good_length'])}")
+        print(f"    - Длинные (>500 символов): {format_value(quality['long'])}")
+        print(f"    - Короткие (<50 символов): {format_value(quality['short'])}")
         
         # 4. Рекомендации
         print("\n💡 Рекомендации:")
@@ -221,13 +174,14 @@ def main():
         if coverage < 100:
             print("  - Нужно сгенерировать эмбеддинги для оставшихся чанков")
         
-        if quality['short'] > 0:
+        if (quality['short'] or 0) > 0:
             print("  - Есть короткие чанки, которые могут быть объединены")
         
-        if quality['long'] > 0:
+        if (quality['long'] or 0) > 0:
             print("  - Есть длинные чанки, которые могут быть разбиты")
         
-        if kb_analysis['articles']['with_tags'] < kb_analysis['articles']['total']:
+        with_tags = kb_analysis['articles']['with_tags']
+        if with_tags is not None and with_tags < kb_analysis['articles']['total']:
             print("  - Некоторые статьи не имеют тегов")
         
         print(f"\n🎉 Анализ завершен!")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Хеджирование запросов к RAG API: если первая попытка не ответила за
+задержку, равную заданному перцентилю недавних задержек, уходит вторая,
+и побеждает первая успешная. Доля дополнительных запросов ограничена
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+class HedgePolicy:
+    """
+    Когда и сколько хеджировать. Задержка второй попытки - percentile
+    последних window задержек (пока замеров меньше min_samples -
+    initial_delay, но не меньше min_delay; до замеров хеджи все равно ограничены
+    burst, поэтому начальная задержка небольшая). Вторых попыток не больше
+    max_extra от числа запросов плюс burst на случай пачки медленных
+    ответов подряд. Потокобезопасна
+    """
+
+    def __init__(self, percentile: float = 95.0, max_extra: float = 0.1, initial_delay: float = 0.5,
+                 min_delay: float = 0.05, window: int = 500, min_samples: int = 20, burst: int = 5):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.burst = burst
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._delay = initial_delay
+        self._since_update = 0
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'primary_wins': 0, 'denied': 0}
+
+    def delay(self) -> float:
+        """Сколько ждать первую попытку, секунд; заодно учитывает запрос"""
+        with self._lock:
+            self.stats['requests'] += 1
+            return self._delay
+
+    def allow(self) -> bool:
+        """Можно ли отправить вторую попытку, не превысив max_extra"""
+        with self._lock:
+            if self.stats['hedged'] + 1 > self.max_extra * self.stats['requests'] + self.burst:
+                self.stats['denied'] += 1
+                return False
+            self.stats['hedged'] += 1
+            return True
+
+    def observe(self, latency: float, hedge_won: bool = None):
+        """Задержка завершенного запроса; hedge_won - кто победил, если хеджировали"""
+        with self._lock:
+            self._latencies.append(latency)
+            if hedge_won is not None:
+                self.stats['hedge_wins' if hedge_won else 'primary_wins'] += 1
+            self._since_update += 1
+            # Перцентиль пересчитывается не на каждый запрос
+            if len(self._latencies) >= self.min_samples and self._since_update >= 16:
+                self._since_update = 0
+                ordered = sorted(self._latencies)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self._delay = max(self.min_delay, ordered[index])
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, delay=self._delay)
+        stats['extra_load'] = stats['hedged'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+async def hedged(attempt: Callable[[], Awaitable[Dict]], policy: HedgePolicy) -> Dict:
+    """
+    Выполняет attempt() с хеджированием по policy. attempt возвращает Dict
+    с ключом success (как AsyncRAGClient._request); проигравшая попытка
+    отменяется
+    """
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(attempt())
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=policy.delay())
+    except asyncio.CancelledError:
+        # asyncio.wait не отменяет ожидаемые задачи - без этого запрос остался бы висеть
+        primary.cancel()
+        raise
+    if done or not policy.allow():
+        result = await primary
+        policy.observe(time.perf_counter() - started)
+        return result
+
+    backup = asyncio.ensure_future(attempt())
+    pending = {primary, backup}
+    result, winner = None, None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                candidate = task.result()
+                if result is None or (candidate.get('success') and not result.get('success')):
+                    result, winner = candidate, task
+            if result.get('success'):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    policy.observe(time.perf_counter() - started, hedge_won=winner is backup)
+    return result
+
+async def _run_workload(backend_url: str, questions: int, concurrency: int, policy: HedgePolicy = None) -> Dict:
+    from async_rag_client import AsyncRAGClient
+    from rag_load_test import summarize
+    latencies = []
+    async with AsyncRAGClient(backend_url, max_connections=concurrency * 2, hedging=policy) as client:
+        async def one(question: str):
+            started = time.perf_counter()
+            await client.process_query(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded(i: int):
+            async with slots:
+                await one(f"вопрос {i}")
+
+        await asyncio.gather(*(bounded(i) for i in range(questions)))
+    return summarize(latencies)
+
+def benchmark(questions: int = 400, concurrency: int = 8, median_ms: float = 100, slow_rate: float = 0.05,
+              slow_ms: float = 2000, percentile: float = 95.0, max_extra: float = 0.1) -> Dict:
+    """Одна и та же нагрузка на заглушку с медленным хвостом без хеджирования и с ним"""
+    from rag_stub_server import LatencyModel, start_stub_server
+    results = {}
+    for name, policy in (('plain', None), ('hedged', HedgePolicy(percentile, max_extra))):
+        server = start_stub_server(LatencyModel(median_ms=median_ms, sigma=0.2, slow_rate=slow_rate,
+                                                slow_ms=slow_ms, seed=7))
+        try:
+            results[name] = asyncio.run(_run_workload(server.url, questions, concurrency, policy))
+            results[name]['server_requests'] = server.stats['requests']
+            if policy is not None:
+                results[name]['hedging'] = policy.get_stats()
+        finally:
+            server.shutdown()
+            server.server_close()
+    return results
+
+def main():
+    """Бенчмарк хеджирования на локальной заглушке с медленным хвостом"""
+    parser = argparse.ArgumentParser(description="Бенчмарк хеджирования запросов к RAG API")
+    parser.add_argument("--questions", type=int, default=400, help="Запросов в прогоне (по умолчанию: 400)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов (по умолчанию: 8)")
+    parser.add_argument("--median-ms", type=float, default=100, help="Медиана задержки заглушки, мс")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Доля медленных ответов (по умолчанию: 0.05)")
+    parser.add_argument("--slow-ms", type=float, default=2000, help="Добавка медленного ответа, мс")
+    parser.add_argument("--percentile", type=float, default=95.0, help="Перцентиль задержки хеджа (по умолчанию: 95)")
+    parser.add_argument("--max-extra", type=float, default=0.1, help="Максимум доп. нагрузки (по умолчанию: 0.1)")
+    args = parser.parse_args()
+
+    print(f"⏱  {args.questions} запросов, параллельно {args.concurrency}, медиана {args.median_ms:g}ms, "
+          f"{args.slow_rate:.0%} медленных (+{args.slow_ms:g}ms)")
+    results = benchmark(args.questions, args.concurrency, args.median_ms, args.slow_rate, args.slow_ms,
+                        args.percentile, args.max_extra)
+    for name, summary in results.items():
+        print(f"  - {name:<7} p50 {summary['p50']:.0f}ms, p90 {summary['p90']:.0f}ms, p99 {summary['p99']:.0f}ms, "
+              f"max {summary['max']:.0f}ms, запросов на сервер: {summary['server_requests']}")
+    stats = results['hedged']['hedging']
+    print(f"  Хеджей: {stats['hedged']} ({stats['extra_load']:.1%} доп. нагрузки), побед второй попытки: "
+          f"{stats['hedge_wins']}, отказов по лимиту: {stats['denied']}, задержка хеджа {stats['delay'] * 1000:.0f}ms")
+    print(f"  p99: {results['plain']['p99']:.0f}ms -> {results['hedged']['p99']:.0f}ms")
+
+if __name__ == "__main__":
+    main()
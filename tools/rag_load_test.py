@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное тестирование RAG API: ступени по параллельности и целевому QPS,
+перцентили задержки клиента и серверных searchTime/processingTime/totalTime,
+гистограммы, доля ошибок и кривая пропускная способность - задержка
+"""
+
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import aiohttp
+
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:3002")
+
+# Отчеты по умолчанию (относительно корня репозитория)
+LOAD_TEST_DIR = Path('data/load_test')
+
+# Границы корзин гистограммы задержки, мс
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+SERVER_TIMINGS = ('searchTime', 'processingTime', 'totalTime')
+
+DEFAULT_QUESTIONS = [
+    "Как пополнить баланс через QR-код?",
+    "Как открыть сделку на P2P?",
+    "Почему мое объявление не видно в стакане?",
+    "Отправил больше, чем в ордере, что делать?",
+    "Как выгрузить историю операций?",
+    "Упал рейтинг после отмененных сделок",
+]
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else None,
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1] if values else None,
+    }
+
+def histogram(values_ms: List[float]) -> Dict[str, int]:
+    """Число запросов по корзинам '<=N мс' и '>N мс' для последней"""
+    counts = {f"<={bound}": 0 for bound in HISTOGRAM_BUCKETS_MS}
+    counts[f">{HISTOGRAM_BUCKETS_MS[-1]}"] = 0
+    for value in values_ms:
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if value <= bound:
+                counts[f"<={bound}"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_BUCKETS_MS[-1]}"] += 1
+    return counts
+
+def server_timings(body: dict) -> Dict[str, float]:
+    """searchTime/processingTime/totalTime из ответа бэкенда, мс"""
+    data = body.get('data') if isinstance(body.get('data'), dict) else {}
+    timings = {name: data[name] for name in SERVER_TIMINGS if isinstance(data.get(name), (int, float))}
+    metadata = body.get('metadata') if isinstance(body.get('metadata'), dict) else {}
+    if 'processingTime' not in timings and isinstance(metadata.get('processingTime'), (int, float)):
+        timings['processingTime'] = metadata['processingTime']
+    return timings
+
+class StageRecorder:
+    """Результаты запросов одной ступени"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.server: Dict[str, List[float]] = {name: [] for name in SERVER_TIMINGS}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+        self.schedule_lag_ms: List[float] = []
+        self.requests = 0
+
+    def record(self, latency_ms: float, status: Optional[int], error: Optional[str], timings: Dict[str, float]):
+        self.requests += 1
+        self.latencies_ms.append(latency_ms)
+        key = str(status) if status is not None else 'none'
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        for name, value in timings.items():
+            self.server[name].append(float(value))
+
+    def report(self, concurrency: int, target_qps: Optional[float], seconds: float) -> dict:
+        errors = sum(self.errors.values())
+        return {
+            'concurrency': concurrency,
+            'target_qps': target_qps,
+            'seconds': seconds,
+            'requests': self.requests,
+            'errors': errors,
+            'error_rate': errors / self.requests if self.requests else 0.0,
+            'achieved_qps': self.requests / seconds if seconds > 0 else 0.0,
+            'latency_ms': summarize(self.latencies_ms),
+            'server_ms': {name: summarize(values) for name, values in self.server.items() if values},
+            'histogram_ms': histogram(self.latencies_ms),
+            'statuses': self.statuses,
+            'error_kinds': self.errors,
+            'schedule_lag_ms': summarize(self.schedule_lag_ms) if self.schedule_lag_ms else None,
+        }
+
+async def send_query(session: aiohttp.ClientSession, url: str, question: str, timeout: float,
+                     recorder: StageRecorder, payload: Dict = None):
+    payload = payload or {"question": question, "language": "ru", "options": {}}
+    started = time.perf_counter()
+    status, error, timings = None, None, {}
+    try:
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            status = response.status
+            # Тело ошибки (HTML прокси, пустое) не разбираем - иначе ошибка считается ValueError
+            if status >= 400:
+                error = f"HTTP {status}"
+            else:
+                body = await response.json(content_type=None)
+                if not isinstance(body, dict):
+                    error = 'invalid_body'
+                else:
+                    if not body.get('success', False):
+                        error = 'success=false'
+                    timings = server_timings(body)
+    except asyncio.TimeoutError:
+        error = 'timeout'
+    except (aiohttp.ClientError, ValueError) as e:
+        error = type(e).__name__
+    recorder.record((time.perf_counter() - started) * 1000, status, error, timings)
+
+async def run_stage(session: aiohttp.ClientSession, url: str, questions: List[str], concurrency: int,
+                    target_qps: Optional[float], duration: float, timeout: float) -> dict:
+    """
+    Одна ступень нагрузки. Без target_qps - замкнутый цикл: concurrency
+    воркеров шлют запросы друг за другом. С target_qps - открытый цикл:
+    запросы запускаются по расписанию, но не больше concurrency одновременно,
+    отставание от расписания пишется в schedule_lag_ms
+    """
+    recorder = StageRecorder()
+    rng = random.Random(concurrency * 1000 + int(target_qps or 0))
+    started = time.perf_counter()
+    deadline = started + duration
+
+    if target_qps is None:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await send_query(session, url, rng.choice(questions), timeout, recorder)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    else:
+        slots = asyncio.Semaphore(concurrency)
+        tasks = set()
+        interval = 1.0 / target_qps
+        scheduled = started
+
+        async def fire(question: str):
+            try:
+                await send_query(session, url, question, timeout, recorder)
+            finally:
+                slots.release()
+
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            recorder.schedule_lag_ms.append(max(0.0, time.perf_counter() - scheduled) * 1000)
+            task = asyncio.ensure_future(fire(rng.choice(questions)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            scheduled += interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    return recorder.report(concurrency, target_qps, time.perf_counter() - started)
+
+def find_saturation(stages: List[dict]) -> Optional[dict]:
+    """
+    Первая ступень, где доля ошибок превышает 1%, достигнуто меньше 90%
+    целевого QPS или пропускная способность почти не растет (< 10%),
+    а p99 растет больше чем на 50%
+    """
+    for previous, stage in zip([None] + stages, stages):
+        if stage['error_rate'] > 0.01:
+            return {'stage': stage['concurrency'], 'target_qps': stage['target_qps'], 'reason': 'error_rate'}
+        if stage['target_qps'] and stage['achieved_qps'] < stage['target_qps'] * 0.9:
+            return {'stage': stage['concurrency'], 'target_qps': stage['target_qps'], 'reason': 'throughput',
+                    'max_qps': max(s['achieved_qps'] for s in stages)}
+        if previous is None:
+            continue
+        prev_p99 = previous['latency_ms']['p99'] or 0
+        cur_p99 = stage['latency_ms']['p99'] or 0
+        if stage['achieved_qps'] < previous['achieved_qps'] * 1.1 and cur_p99 > prev_p99 * 1.5:
+            return {'stage': stage['concurrency'], 'target_qps': stage['target_qps'], 'reason': 'latency',
+                    'max_qps': max(s['achieved_qps'] for s in stages)}
+    return None
+
+async def run_load_test(backend_url: str, questions: List[str], concurrency: Sequence[int],
+                        qps: Sequence[Optional[float]], duration: float, timeout: float = 120,
+                        warmup: float = 0, max_error_rate: float = 0.5) -> dict:
+    url = f"{backend_url}/api/rag/query"
+    connector = aiohttp.TCPConnector(limit=max(concurrency))
+    headers = {'Content-Type': 'application/json', 'User-Agent': 'RAG-LoadTest/1.0'}
+    stages = []
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        if warmup:
+            await run_stage(session, url, questions, min(concurrency), None, warmup, timeout)
+        overloaded = False
+        for target_qps in qps:
+            if overloaded:
+                break
+            for level in concurrency:
+                label = f"{level} параллельно" + (f", цель {target_qps:g} QPS" if target_qps else "")
+                print(f"  ▶ Ступень: {label}, {duration:g}s...")
+                stage = await run_stage(session, url, questions, level, target_qps, duration, timeout)
+                stages.append(stage)
+                latency = stage['latency_ms']
+                print(f"    {stage['requests']} запросов, {stage['achieved_qps']:.1f} QPS, "
+                      f"p50 {latency['p50'] or 0:.0f}ms, p99 {latency['p99'] or 0:.0f}ms, "
+                      f"ошибок {stage['error_rate']:.1%}")
+                if stage['error_rate'] > max_error_rate:
+                    print(f"    ⛔ Доля ошибок выше {max_error_rate:.0%}, нагрузка не наращивается")
+                    overloaded = True
+                    break
+
+    return {
+        'backend_url': backend_url,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_per_stage': duration,
+        'stages': stages,
+        'curve': [
+            {'concurrency': s['concurrency'], 'target_qps': s['target_qps'], 'achieved_qps': s['achieved_qps'],
+             'p50_ms': s['latency_ms']['p50'], 'p99_ms': s['latency_ms']['p99'], 'error_rate': s['error_rate']}
+            for s in stages
+        ],
+        'saturation': find_saturation(stages),
+    }
+
+def _fmt(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.0f}"
+
+def text_report(result: dict) -> str:
+    lines = [f"Нагрузочный тест {result['backend_url']} ({result['started_at']})", ""]
+    lines.append(f"{'conc':>5} {'qps*':>6} {'qps':>7} {'req':>6} {'err%':>6} "
+                 f"{'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}  server p50 search/processing/total")
+    for stage in result['stages']:
+        latency = stage['latency_ms']
+        server = stage['server_ms']
+        server_p50 = '/'.join(_fmt(server.get(name, {}).get('p50')) for name in SERVER_TIMINGS)
+        lines.append(
+            f"{stage['concurrency']:>5} {_fmt(stage['target_qps']):>6} {stage['achieved_qps']:>7.1f} "
+            f"{stage['requests']:>6} {stage['error_rate'] * 100:>5.1f}% {_fmt(latency['p50']):>7} "
+            f"{_fmt(latency['p90']):>7} {_fmt(latency['p99']):>7} {_fmt(latency['max']):>7}  {server_p50}"
+        )
+
+    if result['stages']:
+        worst = result['stages'][-1]
+        lines += ["", f"Гистограмма задержки последней ступени ({worst['concurrency']} параллельно), мс:"]
+        peak = max(worst['histogram_ms'].values()) or 1
+        for bucket, count in worst['histogram_ms'].items():
+            if count:
+                lines.append(f"  {bucket:>8} {count:>7} {'█' * max(1, round(40 * count / peak))}")
+
+    if 'saturation' not in result:
+        return '\n'.join(lines)
+    saturation = result['saturation']
+    lines.append("")
+    if saturation:
+        target = f", цель {saturation['target_qps']:g} QPS" if saturation['target_qps'] else ''
+        reason = {'error_rate': 'ошибки', 'throughput': 'целевой QPS не достигнут'}.get(
+            saturation['reason'], 'рост задержки без роста QPS')
+        lines.append(f"Насыщение: ступень {saturation['stage']} параллельно{target} ({reason})")
+    else:
+        lines.append("Насыщение не достигнуто")
+    return '\n'.join(lines)
+
+def main():
+    """Нагрузочный тест RAG API"""
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование RAG API")
+    parser.add_argument("--backend-url", default=BACKEND_URL, help=f"URL бэкенда (по умолчанию: {BACKEND_URL})")
+    parser.add_argument("--questions", help="Файл с вопросами, по одному в строке")
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="Ступени параллельности (по умолчанию: 1 2 4 8 16 32)")
+    parser.add_argument("--qps", type=float, nargs='+',
+                        help="Целевые QPS (открытый цикл); без них - замкнутый цикл")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность ступени, секунд (по умолчанию: 30)")
+    parser.add_argument("--warmup", type=float, default=0, help="Прогрев перед замерами, секунд")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout запроса, секунд (по умолчанию: 120)")
+    parser.add_argument("--max-error-rate", type=float, default=0.5,
+                        help="Прекратить наращивание при такой доле ошибок (по умолчанию: 0.5)")
+    parser.add_argument("--output", help=f"Префикс файлов отчета (по умолчанию: {LOAD_TEST_DIR}/<время>)")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    print(f"🚀 Нагрузочный тест {args.backend_url}")
+    result = asyncio.run(run_load_test(
+        args.backend_url, questions, args.concurrency, args.qps or [None],
+        args.duration, args.timeout, args.warmup, args.max_error_rate
+    ))
+
+    report = text_report(result)
+    print("\n" + report)
+
+    prefix = Path(args.output) if args.output else LOAD_TEST_DIR / datetime.now().strftime('%Y%m%d-%H%M%S')
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    prefix.with_suffix('.json').write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+    prefix.with_suffix('.txt').write_text(report + '\n', encoding='utf-8')
+    print(f"\n💾 Отчет: {prefix.with_suffix('.json')}, {prefix.with_suffix('.txt')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Инструментирование HTTP запросов RAG клиента по фазам (ожидание пула,
+DNS, соединение, время до первого байта, тело ответа) через aiohttp
+TraceConfig. Замеры уходят в приемники: Prometheus textfile, спаны
+в стиле OpenTelemetry (JSONL) или любой callable
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+# Файлы метрик по умолчанию (относительно корня репозитория)
+PROMETHEUS_TEXTFILE_PATH = Path('data/metrics/rag_client.prom')
+SPANS_PATH = Path('data/metrics/rag_client_spans.jsonl')
+
+# connect включает TLS: aiohttp не разделяет TCP и TLS handshake
+PHASES = ('queue', 'dns', 'connect', 'ttfb', 'body')
+
+SERVER_TIMINGS = ('searchTime', 'processingTime', 'totalTime')
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class RequestTiming:
+    """Замеры одного HTTP запроса; фазы в секундах, серверные тайминги в мс"""
+
+    def __init__(self, method: str, path: str, attempt: int = 1):
+        self.method = method
+        self.path = path
+        self.attempt = attempt
+        self.started = time.perf_counter()
+        self.started_unix = time.time()
+        self.marks: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.reused = False
+        # Тело ответа после распаковки Content-Encoding
+        self.bytes_received = 0
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.server: Dict[str, float] = {}
+        self.total: Optional[float] = None
+
+    def mark(self, name: str):
+        self.marks.setdefault(name, time.perf_counter())
+
+    def _span(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return max(0.0, self.marks[end] - self.marks[start])
+        return None
+
+    def finish(self, status: int = None, body: Dict = None, error: str = None):
+        self.mark('finished')
+        self.status = status
+        self.error = error
+        self.total = self.marks['finished'] - self.started
+        dns = self._span('dns_start', 'dns_end')
+        connect = self._span('connect_start', 'connect_end')
+        phases = {
+            'queue': self._span('queued_start', 'queued_end'),
+            'dns': dns,
+            # Разрешение имени идет внутри создания соединения
+            'connect': max(0.0, connect - (dns or 0.0)) if connect is not None else None,
+            'ttfb': self._span('headers_sent' if 'headers_sent' in self.marks else 'request_start', 'response_start'),
+            'body': self._span('response_start', 'finished'),
+        }
+        self.phases = {name: value for name, value in phases.items() if value is not None}
+        data = (body or {}).get('data') if isinstance(body, dict) else None
+        if isinstance(data, dict):
+            self.server = {name: data[name] for name in SERVER_TIMINGS if isinstance(data.get(name), (int, float))}
+
+    @property
+    def overhead(self) -> Optional[float]:
+        """Сеть и очереди: задержка клиента минус серверный totalTime, секунд"""
+        if self.total is None or 'totalTime' not in self.server:
+            return None
+        return self.total - self.server['totalTime'] / 1000
+
+    def as_dict(self) -> Dict:
+        return {
+            'method': self.method,
+            'path': self.path,
+            'attempt': self.attempt,
+            'status': self.status,
+            'error': self.error,
+            'reused_connection': self.reused,
+            'bytes_received': self.bytes_received,
+            'total_ms': round(self.total * 1000, 3) if self.total is not None else None,
+            'phases_ms': {name: round(value * 1000, 3) for name, value in self.phases.items()},
+            'server_ms': self.server,
+            'overhead_ms': round(self.overhead * 1000, 3) if self.overhead is not None else None,
+        }
+
+def _hook(mark: str):
+    async def on_signal(session, trace_config_ctx, params):
+        timing = trace_config_ctx.trace_request_ctx
+        if isinstance(timing, RequestTiming):
+            timing.mark(mark)
+    return on_signal
+
+async def _on_reuseconn(session, trace_config_ctx, params):
+    timing = trace_config_ctx.trace_request_ctx
+    if isinstance(timing, RequestTiming):
+        timing.reused = True
+
+async def _on_chunk(session, trace_config_ctx, params):
+    timing = trace_config_ctx.trace_request_ctx
+    if isinstance(timing, RequestTiming):
+        timing.bytes_received += len(params.chunk)
+
+class ClientInstrumentation:
+    """
+    Точка подключения замеров к AsyncRAGClient. Приемник - callable,
+    получающий RequestTiming после каждого запроса. Приемники пишут файлы,
+    поэтому вызываются в отдельном потоке: цикл событий только кладет замер
+    в очередь (при переполнении замер отбрасывается и учитывается в dropped).
+    Ошибки приемников печатаются и не ломают запрос
+    """
+
+    def __init__(self, sinks: List[Callable[[RequestTiming], None]] = None, max_pending: int = 10000):
+        self.sinks = list(sinks or [])
+        self.dropped = 0
+        self._trace_config: Optional[aiohttp.TraceConfig] = None
+        self._queue: 'queue.Queue[Optional[RequestTiming]]' = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._writer = threading.Thread(target=self._sink_loop, name="rag-metrics-writer", daemon=True)
+        self._writer.start()
+
+    def add_sink(self, sink: Callable[[RequestTiming], None]) -> Callable[[RequestTiming], None]:
+        """Добавляет приемник; можно использовать как декоратор"""
+        self.sinks.append(sink)
+        return sink
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        if self._trace_config is None:
+            config = aiohttp.TraceConfig()
+            config.on_request_start.append(_hook('request_start'))
+            config.on_connection_queued_start.append(_hook('queued_start'))
+            config.on_connection_queued_end.append(_hook('queued_end'))
+            config.on_connection_create_start.append(_hook('connect_start'))
+            config.on_connection_create_end.append(_hook('connect_end'))
+            config.on_dns_resolvehost_start.append(_hook('dns_start'))
+            config.on_dns_resolvehost_end.append(_hook('dns_end'))
+            config.on_request_headers_sent.append(_hook('headers_sent'))
+            config.on_request_end.append(_hook('response_start'))
+            config.on_connection_reuseconn.append(_on_reuseconn)
+            config.on_response_chunk_received.append(_on_chunk)
+            config.freeze()
+            self._trace_config = config
+        return self._trace_config
+
+    def start(self, method: str, path: str, attempt: int = 1) -> RequestTiming:
+        return RequestTiming(method, path, attempt)
+
+    def finish(self, timing: RequestTiming, status: int = None, body: Dict = None, error: str = None):
+        timing.finish(status, body, error)
+        if self._closed or not self.sinks:
+            return
+        try:
+            self._queue.put_nowait(timing)
+        except queue.Full:
+            self.dropped += 1
+
+    def _sink_loop(self):
+        while True:
+            timing = self._queue.get()
+            try:
+                if timing is None:
+                    return
+                for sink in list(self.sinks):
+                    try:
+                        sink(timing)
+                    except Exception as e:
+                        print(f"⚠️ Ошибка приемника метрик {sink!r}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _flush_sinks(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'flush'):
+                sink.flush()
+
+    def flush(self):
+        """Ждет, пока приемники обработают накопленные замеры, и сбрасывает их файлы"""
+        if not self._closed:
+            self._queue.join()
+        self._flush_sinks()
+
+    def close(self):
+        """Обрабатывает накопленные замеры и останавливает поток приемников"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
+            self._flush_sinks()
+
+    def __enter__(self) -> 'ClientInstrumentation':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+class PrometheusTextfileSink:
+    """
+    Накопительные метрики в формате Prometheus textfile (для node_exporter
+    textfile collector). Файл перезаписывается атомарно не чаще раза
+    в flush_interval секунд и при flush()
+    """
+
+    def __init__(self, path: Path = PROMETHEUS_TEXTFILE_PATH, flush_interval: float = 10.0):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self.requests: Dict[tuple, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.histograms: Dict[tuple, _Histogram] = {}
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        self.histograms.setdefault((name, labels), _Histogram()).observe(value)
+
+    def __call__(self, timing: RequestTiming):
+        with self._lock:
+            outcome = str(timing.status) if timing.status is not None else (timing.error or 'error')
+            key = (timing.path, outcome)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if timing.attempt > 1:
+                self.retries[timing.path] = self.retries.get(timing.path, 0) + 1
+            self._observe('rag_client_request_seconds', (('path', timing.path),), timing.total)
+            for phase, value in timing.phases.items():
+                self._observe('rag_client_phase_seconds', (('path', timing.path), ('phase', phase)), value)
+            for name, value in timing.server.items():
+                self._observe('rag_client_server_seconds', (('path', timing.path), ('timing', name)), value / 1000)
+            if timing.overhead is not None:
+                self._observe('rag_client_overhead_seconds', (('path', timing.path),), max(0.0, timing.overhead))
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def render(self) -> str:
+        lines = [
+            '# HELP rag_client_requests_total HTTP запросы RAG клиента по пути и статусу',
+            '# TYPE rag_client_requests_total counter',
+        ]
+        with self._lock:
+            for (path, outcome), count in sorted(self.requests.items()):
+                lines.append(f"rag_client_requests_total{_labels(path=path, status=outcome)} {count}")
+            lines += ['# HELP rag_client_retries_total Повторные (хеджированные) попытки',
+                      '# TYPE rag_client_retries_total counter']
+            for path, count in sorted(self.retries.items()):
+                lines.append(f"rag_client_retries_total{_labels(path=path)} {count}")
+            described = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                label_dict = dict(labels)
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    lines.append(f"{name}_bucket{_labels(**label_dict, le=bound)} {count}")
+                lines.append(f"{name}_bucket{_labels(**label_dict, le='+Inf')} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(**label_dict)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_labels(**label_dict)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Атомарно перезаписывает textfile"""
+        with self._flush_lock:
+            with self._lock:
+                self._flushed_at = time.monotonic()
+            text = self.render()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+
+class SpanSink:
+    """
+    Спаны в стиле OpenTelemetry: спан запроса (kind CLIENT) и дочерние
+    спаны фаз, по JSON на строку в path либо в exporter(spans)
+    """
+
+    def __init__(self, path: Path = SPANS_PATH, exporter: Callable[[List[Dict]], None] = None,
+                 service_name: str = 'rag-client'):
+        self.path = Path(path) if exporter is None else None
+        self.exporter = exporter
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def spans(self, timing: RequestTiming) -> List[Dict]:
+        trace_id, span_id = os.urandom(16).hex(), os.urandom(8).hex()
+        start_ns = int(timing.started_unix * 1e9)
+        attributes = {
+            'service.name': self.service_name,
+            'http.request.method': timing.method,
+            'url.path': timing.path,
+            'rag.attempt': timing.attempt,
+            'rag.connection.reused': timing.reused,
+            'rag.response.decoded_size': timing.bytes_received,
+        }
+        if timing.status is not None:
+            attributes['http.response.status_code'] = timing.status
+        if timing.error:
+            attributes['error.type'] = timing.error
+        for name, value in timing.server.items():
+            attributes[f'rag.server.{name}_ms'] = value
+        if timing.overhead is not None:
+            attributes['rag.overhead_ms'] = round(timing.overhead * 1000, 3)
+
+        spans = [{
+            'traceId': trace_id,
+            'spanId': span_id,
+            'name': f"{timing.method} {timing.path}",
+            'kind': 'CLIENT',
+            'startTimeUnixNano': start_ns,
+            'endTimeUnixNano': start_ns + int(timing.total * 1e9),
+            'attributes': attributes,
+            'status': {'code': 'ERROR' if timing.error or (timing.status or 0) >= 400 else 'OK'},
+        }]
+        marks = {'queue': 'queued_start', 'dns': 'dns_start',
+                 'connect': 'dns_end' if 'dns_end' in timing.marks else 'connect_start',
+                 'ttfb': 'headers_sent' if 'headers_sent' in timing.marks else 'request_start',
+                 'body': 'response_start'}
+        for phase, duration in timing.phases.items():
+            phase_start = start_ns + int((timing.marks[marks[phase]] - timing.started) * 1e9)
+            spans.append({
+                'traceId': trace_id,
+                'spanId': os.urandom(8).hex(),
+                'parentSpanId': span_id,
+                'name': phase,
+                'kind': 'INTERNAL',
+                'startTimeUnixNano': phase_start,
+                'endTimeUnixNano': phase_start + int(duration * 1e9),
+                'attributes': {'service.name': self.service_name},
+            })
+        return spans
+
+    def __call__(self, timing: RequestTiming):
+        spans = self.spans(timing)
+        if self.exporter is not None:
+            self.exporter(spans)
+            return
+        lines = '\n'.join(json.dumps(span, ensure_ascii=False) for span in spans) + '\n'
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение журнала трафика (traffic_log) против любого бэкенда:
+с исходными интервалами между запросами, ускоренно (--speed 2, 10)
+или максимально быстро (--speed max) с ограничением параллельности
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rag_load_test import BACKEND_URL, StageRecorder, send_query, summarize, text_report
+from traffic_log import TRAFFIC_LOG_PATH, read_traffic
+
+PAYLOAD_FIELDS = ('question', 'context', 'userId', 'chatId', 'language', 'options')
+
+def replay_payload(entry: dict) -> dict:
+    payload = {field: entry.get(field) for field in PAYLOAD_FIELDS}
+    payload['language'] = payload['language'] or 'ru'
+    payload['options'] = payload['options'] or {}
+    return payload
+
+async def replay(entries: List[dict], backend_url: str, speed: Optional[float], concurrency: int = 64,
+                 timeout: float = 120) -> dict:
+    """
+    Args:
+        entries: Записи журнала в порядке ts
+        backend_url: Адрес бэкенда
+        speed: Во сколько раз сжать интервалы; None - без пауз
+        concurrency: Максимум запросов в полете
+        timeout: Timeout запроса, секунд
+    """
+    recorder = StageRecorder()
+    url = f"{backend_url}/api/rag/query"
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    first_ts = entries[0]['ts'] if entries else 0.0
+
+    async def fire(entry: dict):
+        try:
+            await send_query(session, url, entry['question'], timeout, recorder, replay_payload(entry))
+        finally:
+            slots.release()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    headers = {'Content-Type': 'application/json', 'User-Agent': 'RAG-Replay/1.0'}
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        started = time.perf_counter()
+        for entry in entries:
+            if speed:
+                scheduled = started + (entry['ts'] - first_ts) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await slots.acquire()
+            if speed:
+                recorder.schedule_lag_ms.append(max(0.0, time.perf_counter() - scheduled) * 1000)
+            task = asyncio.ensure_future(fire(entry))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return recorder.report(concurrency, None, elapsed)
+
+def main():
+    """Воспроизведение журнала трафика"""
+    parser = argparse.ArgumentParser(description="Воспроизведение журнала запросов RAG")
+    parser.add_argument("log", nargs='?', default=str(TRAFFIC_LOG_PATH),
+                        help=f"Журнал трафика (по умолчанию: {TRAFFIC_LOG_PATH})")
+    parser.add_argument("--backend-url", default=BACKEND_URL, help=f"URL бэкенда (по умолчанию: {BACKEND_URL})")
+    parser.add_argument("--speed", default="1",
+                        help="Ускорение: 1 - исходный темп, 2, 10, ... или max (по умолчанию: 1)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Максимум запросов в полете (по умолчанию: 64)")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout запроса, секунд (по умолчанию: 120)")
+    parser.add_argument("--include-cached", action="store_true",
+                        help="Воспроизводить и запросы, отвеченные кешем клиента")
+    parser.add_argument("--limit", type=int, help="Воспроизвести только первые N записей")
+    parser.add_argument("--output", help="Сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    entries = [e for e in read_traffic(Path(args.log)) if args.include_cached or not e.get('cached')]
+    entries.sort(key=lambda e: e['ts'])
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print(f"❌ В журнале {args.log} нет запросов")
+        return
+
+    span = entries[-1]['ts'] - entries[0]['ts']
+    print(f"🔁 Воспроизведение {len(entries)} запросов ({span:.1f}s исходного трафика) "
+          f"на {args.backend_url}, скорость {args.speed}")
+    stage = asyncio.run(replay(entries, args.backend_url, speed, args.concurrency, args.timeout))
+    stage['speed'] = args.speed
+    stage['recorded_latency_ms'] = summarize([e['latency_ms'] for e in entries])
+
+    print("\n" + text_report({'backend_url': args.backend_url, 'started_at': args.log, 'stages': [stage]}))
+    recorded = stage['recorded_latency_ms']
+    print(f"\nЗаписано: p50 {recorded['p50']:.0f}ms, p99 {recorded['p99']:.0f}ms; "
+          f"исходный темп {len(entries) / span if span else 0:.1f} QPS")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(stage, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 Отчет: {args.output}")
+
+if __name__ == "__main__":
+    main()
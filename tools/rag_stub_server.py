@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка RAG API (/api/rag/*) для офлайн бенчмарков: ответы
+в формате packages/backend/src/routes/rag.ts, задержка по настраиваемой
+модели (логнормальная, медленный хвост, ограниченная емкость, выборка
+из журнала трафика), поддерживает потоковые ответы SSE и chunked NDJSON
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rag_wire import MSGPACK_TYPE, available, compress, decompress, dumps, loads
+
+class LatencyModel:
+    """
+    Задержка обработки запроса, мс. Базовая часть - логнормальная с медианой
+    median_ms и разбросом sigma (или выборка из samples_ms); с вероятностью
+    slow_rate добавляется slow_ms (медленный вызов LLM). search_share -
+    доля времени, отданная поиску (searchTime)
+    """
+
+    def __init__(self, median_ms: float = 300, sigma: float = 0.3, slow_rate: float = 0.0,
+                 slow_ms: float = 3000, search_share: float = 0.2, error_rate: float = 0.0,
+                 samples_ms: List[float] = None, seed: int = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.search_share = search_share
+        self.error_rate = error_rate
+        self.samples_ms = samples_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_traffic(cls, path: Path, **kwargs) -> 'LatencyModel':
+        """Задержки берутся из серверного totalTime (или клиентской задержки) журнала трафика"""
+        from traffic_log import read_traffic
+        samples = [
+            entry.get('server', {}).get('totalTime') or entry['latency_ms']
+            for entry in read_traffic(path)
+            if entry.get('success') and not entry.get('cached')
+        ]
+        if not samples:
+            raise ValueError(f"В журнале {path} нет успешных запросов")
+        return cls(samples_ms=samples, **kwargs)
+
+    def sample(self) -> Optional[dict]:
+        """Тайминги одного запроса или None, если запрос должен завершиться ошибкой"""
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return None
+            if self.samples_ms:
+                total = self._rng.choice(self.samples_ms)
+            else:
+                total = self.median_ms * self._rng.lognormvariate(0, self.sigma) if self.sigma else self.median_ms
+            if self.slow_rate and self._rng.random() < self.slow_rate:
+                total += self.slow_ms
+        search = total * self.search_share
+        return {'searchTime': round(search), 'processingTime': round(total - search), 'totalTime': round(total)}
+
+def stub_answer(question: str, timings: dict) -> dict:
+    """Детерминированный ответ в формате RAGResponse"""
+    digest = hashlib.sha256(question.encode('utf-8')).hexdigest()
+    return {
+        'answer': f"Ответ заглушки на вопрос «{question}». Подробности - в статье {digest[:8]}.",
+        'sources': [{
+            'id': digest[:16],
+            'title': f"Статья {digest[:8]}",
+            'content': question,
+            'score': round(0.5 + int(digest[16:18], 16) / 512, 3),
+            'source': 'hybrid',
+        }],
+        'confidence': round(0.6 + int(digest[18:20], 16) / 1024, 3),
+        **timings,
+        'metadata': {'searchStrategy': 'hybrid', 'refineIterations': 0, 'modelUsed': 'stub'},
+    }
+
+class StubRAGServer(ThreadingHTTPServer):
+    """
+    HTTP сервер заглушки; workers > 0 ограничивает число одновременно
+    обрабатываемых запросов, streaming=False отключает потоковые ответы,
+    json_only=True ведет себя как текущий express бэкенд: только JSON
+    (тело запроса можно сжать gzip), ответы без сжатия; batch=False
+    убирает /api/rag/query/batch
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, model: LatencyModel, workers: int = 0, streaming: bool = True,
+                 json_only: bool = False, batch: bool = True):
+        super().__init__(address, StubRAGHandler)
+        self.batch = batch
+        self.model = model
+        self.streaming = streaming
+        self.json_only = json_only
+        self.slots = threading.BoundedSemaphore(workers) if workers > 0 else None
+        self.search_config = {}
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+class StubRAGHandler(BaseHTTPRequestHandler):
+    server: StubRAGServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент ушел, не дочитав ответ (отмененный хедж, прерванный поток)
+            pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        """Ответ в msgpack/JSON и со сжатием - по Accept и Accept-Encoding запроса"""
+        accept = self.headers.get('Accept') or ''
+        accept_encoding = self.headers.get('Accept-Encoding') or ''
+        wire = not self.server.json_only
+        if wire and MSGPACK_TYPE in accept and available(format='msgpack'):
+            content_type, body = MSGPACK_TYPE, dumps(payload, 'msgpack')
+        else:
+            content_type, body = 'application/json; charset=utf-8', json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        encoding = None
+        if wire and len(body) >= 1024:
+            if 'zstd' in accept_encoding and available(compression='zstd'):
+                encoding = 'zstd'
+            elif 'gzip' in accept_encoding:
+                encoding = 'gzip'
+        if encoding is not None:
+            body = compress(body, encoding)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Optional[dict]:
+        """
+        Тело запроса; None - неподдерживаемый Content-Encoding (415). В режиме
+        json_only, как express.json, разбирается только JSON (gzip допустим)
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        raw = self.rfile.read(length)
+        encoding = (self.headers.get('Content-Encoding') or '').strip().lower()
+        if self.server.json_only and encoding not in ('', 'identity', 'gzip'):
+            return None
+        try:
+            raw = decompress(raw, encoding)
+        except (ValueError, OSError):
+            return None
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip()
+        if content_type == MSGPACK_TYPE and (self.server.json_only or not available(format='msgpack')):
+            return {}
+        try:
+            body = loads(raw, content_type)
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    @contextmanager
+    def _admitted(self):
+        """Учет запроса в статистике и ожидание свободного места при ограниченной емкости"""
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+            server.stats['in_flight'] += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.stats['in_flight'])
+        try:
+            if server.slots is not None:
+                server.slots.acquire()
+            try:
+                yield
+            finally:
+                if server.slots is not None:
+                    server.slots.release()
+        finally:
+            with server.stats_lock:
+                server.stats['in_flight'] -= 1
+
+    def _sample(self) -> Optional[dict]:
+        timings = self.server.model.sample()
+        if timings is None:
+            with self.server.stats_lock:
+                self.server.stats['errors'] += 1
+        return timings
+
+    def _process(self, question: str) -> Optional[dict]:
+        """Имитирует обработку с учетом емкости сервера; None - внутренняя ошибка"""
+        with self._admitted():
+            timings = self._sample()
+            if timings is not None:
+                time.sleep(timings['totalTime'] / 1000)
+        return None if timings is None else stub_answer(question, timings)
+
+    def _stream_mode(self) -> Optional[str]:
+        accept = self.headers.get('Accept') or ''
+        if not self.server.streaming:
+            return None
+        if 'text/event-stream' in accept:
+            return 'sse'
+        if 'application/x-ndjson' in accept:
+            return 'ndjson'
+        return None
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, question: str, mode: str):
+        """
+        Потоковый ответ: первая часть после searchTime, остальные слова
+        равномерно за processingTime, затем источники и итоговый ответ
+        """
+        with self._admitted():
+            timings = self._sample()
+            if timings is None:
+                return self._send_json({'success': False, 'error': 'Внутренняя ошибка сервера',
+                                        'code': 'INTERNAL_ERROR'}, 500)
+            response = stub_answer(question, timings)
+            time.sleep(timings['searchTime'] / 1000)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream' if mode == 'sse' else 'application/x-ndjson')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def emit(kind: str, payload: dict):
+                data = json.dumps(payload, ensure_ascii=False)
+                if mode == 'sse':
+                    self._write_chunk(f"event: {kind}\ndata: {data}\n\n".encode('utf-8'))
+                else:
+                    self._write_chunk((json.dumps({'type': kind, **payload}, ensure_ascii=False) + '\n').encode('utf-8'))
+
+            words = response['answer'].split(' ')
+            pause = timings['processingTime'] / 1000 / max(1, len(words) - 1)
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(pause)
+                emit('delta', {'text': word if i == 0 else ' ' + word})
+            emit('sources', {'sources': response['sources'], 'confidence': response['confidence']})
+            emit('done', {'data': response})
+            self._write_chunk(b'')
+
+    def _batch(self, queries: list):
+        """
+        Пакет вопросов: поиск (эмбеддинги и выборка) общий на пакет, генерация
+        ответов идет параллельно - пакет занимает max(searchTime) + max(processingTime)
+        """
+        if not isinstance(queries, list) or not queries:
+            return self._send_json({'success': False, 'error': 'queries обязателен', 'code': 'MISSING_QUERIES'}, 400)
+        started = time.perf_counter()
+        with self._admitted():
+            samples = [self._sample() for _ in queries]
+            ok = [timings for timings in samples if timings is not None]
+            if ok:
+                time.sleep((max(t['searchTime'] for t in ok) + max(t['processingTime'] for t in ok)) / 1000)
+        results = []
+        for query, timings in zip(queries, samples):
+            question = (query.get('question') or '').strip() if isinstance(query, dict) else ''
+            if not question:
+                results.append({'success': False, 'error': 'Вопрос обязателен', 'code': 'MISSING_QUESTION'})
+            elif timings is None:
+                results.append({'success': False, 'error': 'Внутренняя ошибка сервера', 'code': 'INTERNAL_ERROR'})
+            else:
+                results.append({'success': True, 'data': stub_answer(question, timings)})
+        self._send_json({
+            'success': True,
+            'data': {'results': results},
+            'metadata': {'processingTime': round((time.perf_counter() - started) * 1000), 'count': len(results),
+                         'timestamp': datetime.now(timezone.utc).isoformat()},
+        })
+
+    def do_POST(self):
+        body = self._read_json()
+        if body is None:
+            return self._send_json({'success': False, 'error': 'unsupported content encoding'}, 415)
+        if self.path == '/api/rag/query':
+            question = (body.get('question') or '').strip()
+            if not question:
+                return self._send_json({'success': False, 'error': 'Вопрос обязателен',
+                                        'code': 'MISSING_QUESTION'}, 400)
+            mode = self._stream_mode()
+            if mode is not None:
+                return self._stream(question, mode)
+            started = time.perf_counter()
+            response = self._process(question)
+            if response is None:
+                return self._send_json({'success': False, 'error': 'Внутренняя ошибка сервера',
+                                        'code': 'INTERNAL_ERROR'}, 500)
+            return self._send_json({
+                'success': True,
+                'data': response,
+                'metadata': {'processingTime': round((time.perf_counter() - started) * 1000),
+                             'timestamp': datetime.now(timezone.utc).isoformat()},
+            })
+        if self.path == '/api/rag/query/batch' and self.server.batch:
+            return self._batch(body.get('queries') or [])
+        if self.path == '/api/rag/test':
+            response = self._process(body.get('testQuery') or 'test')
+            return self._send_json({'success': response is not None, 'data': response})
+        self._send_json({'success': False, 'error': 'Not found'}, 404)
+
+    def do_PUT(self):
+        if self.path == '/api/rag/config':
+            self.server.search_config.update((self._read_json() or {}).get('searchConfig') or {})
+            return self._send_json({'success': True, 'data': {'searchConfig': self.server.search_config}})
+        self._send_json({'success': False, 'error': 'Not found'}, 404)
+
+    def do_GET(self):
+        if self.path == '/api/rag/health':
+            return self._send_json({'success': True, 'data': {'status': 'healthy', 'services': {'stub': True}}})
+        if self.path == '/api/rag/stats':
+            with self.server.stats_lock:
+                stats = dict(self.server.stats)
+            return self._send_json({'success': True, 'data': stats})
+        if self.path == '/api/rag/model-info':
+            return self._send_json({'success': True, 'data': {'model': 'stub', 'provider': 'rag_stub_server'}})
+        self._send_json({'success': False, 'error': 'Not found'}, 404)
+
+def start_stub_server(model: LatencyModel = None, host: str = '127.0.0.1', port: int = 0,
+                      workers: int = 0, streaming: bool = True, json_only: bool = False,
+                      batch: bool = True) -> StubRAGServer:
+    """Запускает заглушку в фоновом потоке; port=0 - свободный порт. Остановка: server.shutdown()"""
+    server = StubRAGServer((host, port), model or LatencyModel(), workers, streaming, json_only, batch)
+    threading.Thread(target=server.serve_forever, name="rag-stub-server", daemon=True).start()
+    return server
+
+def main():
+    """Запуск заглушки RAG API"""
+    parser = argparse.ArgumentParser(description="Локальная заглушка RAG API")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес (по умолчанию: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=3002, help="Порт (по умолчанию: 3002)")
+    parser.add_argument("--median-ms", type=float, default=300, help="Медиана задержки, мс (по умолчанию: 300)")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Разброс логнормальной задержки (по умолчанию: 0.3)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Доля медленных запросов")
+    parser.add_argument("--slow-ms", type=float, default=3000, help="Добавка к задержке медленного запроса, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов с ответом 500")
+    parser.add_argument("--workers", type=int, default=0, help="Емкость сервера, 0 - без ограничения")
+    parser.add_argument("--no-streaming", action="store_true", help="Отвечать обычным JSON даже на запрос потока")
+    parser.add_argument("--json-only", action="store_true",
+                        help="Как express бэкенд: только JSON, без msgpack и сжатия ответов")
+    parser.add_argument("--no-batch", action="store_true", help="Без /api/rag/query/batch (ответ 404)")
+    parser.add_argument("--from-traffic", help="Брать задержки из журнала трафика (traffic_log)")
+    parser.add_argument("--seed", type=int, help="Seed генератора задержек")
+    args = parser.parse_args()
+
+    options = dict(slow_rate=args.slow_rate, slow_ms=args.slow_ms, error_rate=args.error_rate, seed=args.seed)
+    if args.from_traffic:
+        model = LatencyModel.from_traffic(Path(args.from_traffic), **options)
+    else:
+        model = LatencyModel(median_ms=args.median_ms, sigma=args.sigma, **options)
+
+    server = StubRAGServer((args.host, args.port), model, args.workers, streaming=not args.no_streaming,
+                           json_only=args.json_only, batch=not args.no_batch)
+    print(f"🧪 Заглушка RAG API: {server.url}/api/rag/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
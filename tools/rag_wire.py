@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Формат тел запросов RAG API: JSON, компактный JSON через orjson или
+msgpack, сжатие gzip/zstd для больших тел. Если бэкенд отвечает 415 или
+400, из которого видно, что он не разобрал тело, клиент переходит на
+обычный JSON без сжатия
+"""
+
+import csv
+import gzip
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    # HAS_ZSTD есть только в новых aiohttp (3.12+)
+    from aiohttp.compression_utils import HAS_ZSTD as AIOHTTP_HAS_ZSTD
+except ImportError:
+    AIOHTTP_HAS_ZSTD = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+    _zstd_compress = zstandard.ZstdCompressor(level=3).compress
+    _zstd_decompress = zstandard.ZstdDecompressor().decompress
+except ImportError:
+    _zstd_compress = _zstd_decompress = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+
+FORMATS = ('json', 'orjson', 'msgpack')
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+# Статусы, при которых стоит проверить, не отвергнут ли формат тела
+WIRE_REJECTED = (400, 415)
+
+# Признаки неразобранного тела в ответе 400 (packages/backend/src/index.ts,
+# routes/rag.ts, ошибки body-parser): express.json пропускает msgpack, и
+# маршрут видит пустое тело без вопроса; битый JSON - INVALID_JSON
+WIRE_ERROR_CODES = frozenset({'INVALID_JSON', 'MISSING_QUESTION', 'entity.parse.failed',
+                              'encoding.unsupported', 'charset.unsupported'})
+
+def available(format: str = None, compression: str = None) -> bool:
+    if format == 'msgpack' and msgpack is None:
+        return False
+    if compression == 'zstd' and _zstd_compress is None:
+        return False
+    return True
+
+def compress(body: bytes, compression: Optional[str]) -> bytes:
+    if compression == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    if compression == 'zstd':
+        return _zstd_compress(body)
+    return body
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd' and _zstd_decompress is not None:
+        return _zstd_decompress(body)
+    raise ValueError(f"Неподдерживаемое сжатие: {encoding}")
+
+def dumps(payload: Any, format: str) -> bytes:
+    if format == 'msgpack':
+        return msgpack.packb(payload, use_bin_type=True)
+    if format == 'orjson' and orjson is not None:
+        return orjson.dumps(payload)
+    if format == 'orjson':
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # Как json=payload в aiohttp
+    return json.dumps(payload).encode('utf-8')
+
+def loads(body: bytes, content_type: str = JSON_TYPE) -> Any:
+    if content_type == MSGPACK_TYPE and msgpack is not None:
+        return msgpack.unpackb(body, raw=False)
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+class WireCodec:
+    """
+    Кодирование тел запросов и разбор ответов для AsyncRAGClient.
+    Запросы меньше min_compress_size байт не сжимаются. Недоступные
+    форматы (нет msgpack/zstandard) заменяются на JSON/gzip
+    """
+
+    def __init__(self, format: str = 'json', compression: str = None, min_compress_size: int = 1024):
+        if format not in FORMATS or compression not in COMPRESSIONS:
+            raise ValueError(f"Формат {format!r} / сжатие {compression!r} не поддерживается")
+        if not available(format=format):
+            print("⚠️ msgpack не установлен, используется orjson/JSON")
+            format = 'orjson'
+        if not available(compression=compression):
+            print("⚠️ zstandard не установлен, используется gzip")
+            compression = 'gzip'
+        self.format = format
+        self.compression = compression
+        self.min_compress_size = min_compress_size
+        self.stats = {'requests': 0, 'raw_bytes': 0, 'sent_bytes': 0, 'fallbacks': 0}
+
+    @property
+    def plain(self) -> bool:
+        """Тела запросов - обычный JSON без сжатия, откатываться некуда"""
+        return self.format != 'msgpack' and self.compression is None
+
+    def accept_headers(self) -> Dict[str, str]:
+        accept = f"{MSGPACK_TYPE}, {JSON_TYPE};q=0.9" if self.format == 'msgpack' else JSON_TYPE
+        # zstd в ответах aiohttp распаковывает только с backports.zstd / Python 3.14
+        encodings = 'zstd, gzip, deflate' if AIOHTTP_HAS_ZSTD else 'gzip, deflate'
+        return {'Accept': accept, 'Accept-Encoding': encodings}
+
+    def encode(self, payload: Any) -> Tuple[bytes, Dict[str, str]]:
+        """Тело и заголовки Content-Type/Content-Encoding запроса"""
+        body = dumps(payload, self.format)
+        headers = {'Content-Type': MSGPACK_TYPE if self.format == 'msgpack' else JSON_TYPE}
+        raw_size = len(body)
+        if self.compression is not None and raw_size >= self.min_compress_size:
+            body = compress(body, self.compression)
+            headers['Content-Encoding'] = self.compression
+        self.stats['requests'] += 1
+        self.stats['raw_bytes'] += raw_size
+        self.stats['sent_bytes'] += len(body)
+        return body, headers
+
+    def decode(self, body: bytes, content_type: str) -> Any:
+        """Ответ уже распакован aiohttp; выбор разбора по Content-Type"""
+        return loads(body, content_type)
+
+    def rejected(self, status: int, body: bytes, payload: Any = None) -> bool:
+        """
+        Отверг ли бэкенд само тело запроса: 415 всегда, 400 - только с кодом
+        ошибки из WIRE_ERROR_CODES. MISSING_QUESTION считается, только если
+        вопрос в запросе был. Остальные 400 - ошибки самого запроса
+        """
+        if self.plain or status not in WIRE_REJECTED:
+            return False
+        if status == 415:
+            return True
+        try:
+            parsed = json.loads(body or b'{}')
+        except ValueError:
+            return False
+        if not isinstance(parsed, dict):
+            return False
+        error = parsed.get('error')
+        codes = {parsed.get('code'), parsed.get('type')}
+        if isinstance(error, dict):
+            codes.update((error.get('code'), error.get('type')))
+        codes &= WIRE_ERROR_CODES
+        if codes == {'MISSING_QUESTION'}:
+            return isinstance(payload, dict) and bool(str(payload.get('question') or '').strip())
+        return bool(codes)
+
+    def downgrade(self) -> bool:
+        """Переход на JSON без сжатия; False, если уже на нем"""
+        if self.plain:
+            return False
+        print(f"⚠️ Бэкенд не принял {self.format}/{self.compression or 'без сжатия'}, "
+              f"переключаемся на JSON без сжатия")
+        self.format, self.compression = 'json', None
+        self.stats['fallbacks'] += 1
+        return True
+
+def _sample_texts(qa_path: Path):
+    """Ответы из CSV пар вопрос-ответ тенанта - реалистичный текст для размеров тел"""
+    with open(qa_path, encoding='utf-8', newline='') as f:
+        return [row['Ответ'] for row in csv.DictReader(f) if row.get('Ответ')]
+
+def sample_payloads(qa_path: Path) -> Dict[str, Tuple[dict, dict]]:
+    """(запрос, ответ бэкенда) для типичного вопроса и вопроса с большим context"""
+    texts = _sample_texts(qa_path)
+    response = {
+        'success': True,
+        'data': {
+            'answer': texts[0][:1200],
+            'sources': [
+                {'id': f"chunk-{i}", 'title': text[:60], 'content': text[:1500], 'score': 0.8 - i * 0.05,
+                 'source': 'hybrid', 'metadata': {'article_id': i, 'chunk_index': 0}}
+                for i, text in enumerate(texts[1:6])
+            ],
+            'confidence': 0.82,
+            'searchTime': 120, 'processingTime': 1800, 'totalTime': 1920,
+            'metadata': {'searchStrategy': 'hybrid', 'refineIterations': 1, 'modelUsed': 'gpt-4o-mini'},
+        },
+        'metadata': {'processingTime': 1925, 'timestamp': '2025-01-01T00:00:00.000Z'},
+    }
+    question = "Когда средства на аккаунте могут быть заморожены?"
+    typical = {'question': question, 'context': None, 'userId': 123456789, 'chatId': 123456789,
+               'language': 'ru', 'options': {}}
+    context = '\n\n'.join(texts)
+    while len(context) < 20000:
+        context += '\n\n' + context
+    large = dict(typical, context=context[:20000])
+    return {'typical': (typical, response), 'large_context': (large, response)}
+
+def benchmark(qa_path: Path, iterations: int = 200) -> Dict[str, Dict]:
+    """
+    Байты на проводе и CPU клиента на запрос (кодирование тела запроса
+    и разбор ответа) для каждой комбинации формата и сжатия
+    """
+    results = {}
+    for case, (request, response) in sample_payloads(qa_path).items():
+        for format in FORMATS:
+            for compression in COMPRESSIONS:
+                if not available(format, compression):
+                    continue
+                name = f"{case}/{format}/{compression or 'none'}"
+                request_body = compress(dumps(request, format), compression)
+                # res.json в express отдает компактный JSON в UTF-8
+                response_raw = dumps(response, 'orjson' if format == 'json' else format)
+                response_body = compress(response_raw, compression)
+                content_type = MSGPACK_TYPE if format == 'msgpack' else JSON_TYPE
+
+                started = time.process_time()
+                for _ in range(iterations):
+                    compress(dumps(request, format), compression)
+                encode_cpu = (time.process_time() - started) / iterations
+                started = time.process_time()
+                for _ in range(iterations):
+                    loads(decompress(response_body, compression), content_type)
+                decode_cpu = (time.process_time() - started) / iterations
+
+                results[name] = {
+                    'request_bytes': len(request_body),
+                    'response_bytes': len(response_body),
+                    'response_raw_bytes': len(response_raw),
+                    'encode_us': encode_cpu * 1e6,
+                    'decode_us': decode_cpu * 1e6,
+                }
+    return results
+
+def main():
+    """Бенчмарк форматов и сжатия тел RAG API"""
+    parser = argparse.ArgumentParser(description="Бенчмарк форматов тел запросов RAG API")
+    parser.add_argument("--qa", default="data/tenants/default/qa_pairs.json",
+                        help="CSV пар вопрос-ответ для образцов текста (по умолчанию: data/tenants/default/qa_pairs.json)")
+    parser.add_argument("--iterations", type=int, default=200, help="Повторов на замер (по умолчанию: 200)")
+    args = parser.parse_args()
+
+    missing = [name for name, module in (('orjson', orjson), ('msgpack', msgpack), ('zstandard', _zstd_compress))
+               if module is None]
+    if missing:
+        print(f"ℹ️  Не установлены: {', '.join(missing)} - соответствующие варианты пропущены")
+    print(f"{'вариант':<32} {'запрос, Б':>10} {'ответ, Б':>10} {'кодир., мкс':>12} {'разбор, мкс':>12}")
+    for name, row in benchmark(Path(args.qa), args.iterations).items():
+        print(f"{name:<32} {row['request_bytes']:>10} {row['response_bytes']:>10} "
+              f"{row['encode_us']:>12.1f} {row['decode_us']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Семантический кеш ответов RAG: вопрос превращается в эмбеддинг, и если
+среди уже отвеченных вопросов тенанта есть достаточно похожий (косинус
+не ниже threshold), возвращается его ответ без запроса к бэкенду.
+Хранилище - SQLite в data/semantic с векторами float16, поиск - перебор
+матрицы векторов тенанта в памяти
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from answer_cache import KBVersion, answer_key
+from kb_manifest import KB_VERSION_PATH, read_kb_version
+
+# Хранилище по умолчанию (относительно корня репозитория)
+SEMANTIC_CACHE_PATH = Path('data/semantic/answers.db')
+
+DEFAULT_TENANT = 'default'
+
+def answer_scope(language: str = 'ru', context: str = None, options: Dict = None) -> str:
+    """
+    Все, что кроме вопроса влияет на ответ (язык, контекст, опции):
+    похожие вопросы совпадают только в пределах одной области
+    """
+    return answer_key('', language, context, options)
+
+class _TenantIndex:
+    """Векторы записей одного тенанта в памяти; строки добавляются в конец с запасом емкости"""
+
+    def __init__(self, dim: int, rows=()):
+        # Векторы другой размерности (записи старых версий) пропускаются
+        rows = [row for row in rows if len(row[3]) == dim * 2]
+        self.ids = [row[0] for row in rows]
+        self.scopes = [row[1] for row in rows]
+        self.created = [row[2] for row in rows]
+        self.vectors = np.zeros((max(64, len(rows)), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            self.vectors[i] = np.frombuffer(row[3], dtype=np.float16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, scope: str, created_at: float, vector: np.ndarray):
+        if len(self.ids) == len(self.vectors):
+            grown = np.zeros((len(self.vectors) * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.ids)] = self.vectors
+            self.vectors = grown
+        self.vectors[len(self.ids)] = vector
+        self.ids.append(entry_id)
+        self.scopes.append(scope)
+        self.created.append(created_at)
+
+    def nearest(self, vector: np.ndarray, scope: str, oldest: float) -> Tuple[Optional[int], float]:
+        """Ближайшая актуальная запись той же области: (id, косинус) или (None, 0)"""
+        if not self.ids:
+            return None, 0.0
+        scores = self.vectors[:len(self.ids)] @ vector
+        for i in np.argsort(scores)[::-1][:32]:
+            if self.scopes[i] == scope and self.created[i] >= oldest:
+                return self.ids[i], float(scores[i])
+        return None, 0.0
+
+class SemanticCache:
+    """
+    Семантический кеш ответов с изоляцией по тенантам. Запись актуальна,
+    пока она моложе max_age секунд и версия базы знаний не менялась; сверх
+    max_entries на тенанта вытесняются давно не использованные.
+    Потокобезопасен; lookup блокирует на время эмбеддинга вопроса
+    """
+
+    def __init__(self, embedder, path: Path = SEMANTIC_CACHE_PATH, threshold: float = 0.92,
+                 max_age: float = 7 * 24 * 3600, max_entries: int = 5000,
+                 kb_version: Callable[[], Optional[str]] = None):
+        """
+        Args:
+            embedder: Провайдер эмбеддингов вопросов (kb_embeddings)
+            path: Файл хранилища
+            threshold: Минимальный косинус похожести для ответа из кеша
+            max_age: Время жизни записи, секунд
+            max_entries: Максимум записей на тенанта
+            kb_version: Текущая версия базы знаний (по умолчанию из общего файла версии)
+        """
+        self.embedder = embedder
+        # Размерность в ключе: одна модель может отдавать векторы разной длины
+        self.model = f"{getattr(embedder, 'model', embedder.name)}:{embedder.dim}"
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.kb_version = kb_version or KBVersion()
+        self._indexes: Dict[str, _TenantIndex] = {}
+        self._seen_version = None
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted': 0, 'invalidated': 0, 'errors': 0,
+                      'saved_seconds': 0.0, 'embed_seconds': 0.0, 'hit_similarity': 0.0}
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                model TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                kb_version TEXT,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                response TEXT NOT NULL,
+                latency REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_tenant_idx ON answers(tenant, last_used)")
+        self._conn.commit()
+
+    def _check_version(self) -> Optional[str]:
+        """При смене версии базы знаний удаляет записи других версий"""
+        version = self.kb_version()
+        with self._lock:
+            if version != self._seen_version:
+                self._seen_version = version
+                self._indexes.clear()
+                self.stats['invalidated'] += self._conn.execute(
+                    "DELETE FROM answers WHERE kb_version IS NOT ?", (version,)
+                ).rowcount
+                self._conn.commit()
+        return version
+
+    def _index(self, tenant: str, version: Optional[str]) -> _TenantIndex:
+        """Векторы тенанта, загружаются при первом обращении"""
+        index = self._indexes.get(tenant)
+        if index is None:
+            rows = self._conn.execute(
+                "SELECT id, scope, created_at, vector FROM answers "
+                "WHERE tenant = ? AND model = ? AND kb_version IS ? AND created_at >= ?",
+                (tenant, self.model, version, time.time() - self.max_age)
+            ).fetchall()
+            index = self._indexes[tenant] = _TenantIndex(self.embedder.dim, rows)
+        return index
+
+    def lookup(self, question: str, tenant: str = None, language: str = 'ru', context: str = None,
+               options: Dict = None) -> Tuple[Optional[dict], Optional[dict]]:
+        """
+        Ищет ответ на похожий вопрос; tenant None - тенант по умолчанию
+
+        Returns:
+            (ответ или None, проба для put) - проба хранит эмбеддинг вопроса,
+            чтобы не считать его повторно при сохранении ответа бэкенда
+        """
+        version = self._check_version()
+        started = time.perf_counter()
+        try:
+            vector = np.asarray(self.embedder.embed([question])[0], dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Семантический кеш: ошибка эмбеддинга вопроса: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return None, None
+        vector /= np.linalg.norm(vector) or 1.0
+        tenant = tenant or DEFAULT_TENANT
+        probe = {'tenant': tenant, 'scope': answer_scope(language, context, options), 'question': question,
+                 'vector': vector, 'kb_version': version, 'similarity': 0.0}
+
+        with self._lock:
+            self.stats['embed_seconds'] += time.perf_counter() - started
+            entry_id, similarity = self._index(tenant, version).nearest(
+                vector, probe['scope'], time.time() - self.max_age
+            )
+            probe['similarity'] = similarity
+            row = None
+            if entry_id is not None and similarity >= self.threshold:
+                row = self._conn.execute("SELECT latency, response FROM answers WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None, probe
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+            self.stats['hits'] += 1
+            self.stats['saved_seconds'] += row[0]
+            self.stats['hit_similarity'] += similarity
+        return json.loads(row[1]), probe
+
+    def put(self, probe: Optional[dict], response: dict, latency: float = 0.0):
+        """Сохраняет ответ бэкенда на вопрос пробы; latency - сколько занял запрос"""
+        if probe is None:
+            return
+        now = time.time()
+        with self._lock:
+            # Версия могла смениться, пока шел запрос: такой ответ не сохраняем
+            if probe['kb_version'] != self._seen_version:
+                return
+            entry_id = self._conn.execute(
+                "INSERT INTO answers (tenant, model, scope, kb_version, question, vector, response, latency, "
+                "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (probe['tenant'], self.model, probe['scope'], probe['kb_version'], probe['question'],
+                 probe['vector'].astype(np.float16).tobytes(), json.dumps(response, ensure_ascii=False),
+                 latency, now, now)
+            ).lastrowid
+            index = self._index(probe['tenant'], probe['kb_version'])
+            index.add(entry_id, probe['scope'], now, probe['vector'])
+            if len(index) > self.max_entries:
+                self._evict(probe['tenant'])
+            self._conn.commit()
+            self.stats['stores'] += 1
+
+    def _evict(self, tenant: str):
+        """Удаляет устаревшие и давно не использованные записи тенанта до 90% max_entries"""
+        expired = self._conn.execute(
+            "DELETE FROM answers WHERE tenant = ? AND created_at < ?", (tenant, time.time() - self.max_age)
+        ).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM answers WHERE tenant = ?", (tenant,)).fetchone()[0]
+        excess = max(0, count - int(self.max_entries * 0.9))
+        if excess:
+            self._conn.execute("""
+                DELETE FROM answers WHERE id IN (
+                    SELECT id FROM answers WHERE tenant = ? ORDER BY last_used LIMIT ?
+                )
+            """, (tenant, excess))
+        self.stats['evicted'] += expired + excess
+        self._indexes.pop(tenant, None)
+
+    def purge(self) -> int:
+        """Удаляет устаревшие записи и записи другой версии базы знаний"""
+        version = self._check_version()
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM answers WHERE created_at < ? OR kb_version IS NOT ?", (time.time() - self.max_age, version)
+            ).rowcount
+            self._conn.commit()
+            self._indexes.clear()
+        return removed
+
+    def clear(self, tenant: str = None):
+        with self._lock:
+            if tenant is None:
+                self._conn.execute("DELETE FROM answers")
+            else:
+                self._conn.execute("DELETE FROM answers WHERE tenant = ?", (tenant,))
+            self._conn.commit()
+            self._indexes.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def get_stats(self) -> dict:
+        """
+        Попадания и сэкономленное время: saved_seconds - время запросов к
+        бэкенду, которые заменил кеш, net_saved_seconds - за вычетом
+        эмбеддинга вопросов
+        """
+        with self._lock:
+            stats = dict(self.stats, kb_version=self._seen_version,
+                         entries={tenant: len(index) for tenant, index in self._indexes.items()})
+        stats['hit_rate'] = self.hit_rate
+        stats['hit_similarity'] = stats['hit_similarity'] / stats['hits'] if stats['hits'] else 0.0
+        stats['net_saved_seconds'] = stats['saved_seconds'] - stats['embed_seconds']
+        return stats
+
+def main():
+    """Статистика и очистка хранилища семантического кеша"""
+    parser = argparse.ArgumentParser(description="Семантический кеш ответов RAG")
+    parser.add_argument("--path", default=str(SEMANTIC_CACHE_PATH),
+                        help=f"Файл хранилища (по умолчанию: {SEMANTIC_CACHE_PATH})")
+    parser.add_argument("--kb-version", default=str(KB_VERSION_PATH), help="Файл общей версии базы знаний")
+    parser.add_argument("--max-age", type=float, default=7 * 24 * 3600, help="Время жизни записи, секунд")
+    parser.add_argument("--purge", action="store_true", help="Удалить устаревшие записи и записи старых версий")
+    parser.add_argument("--clear", action="store_true", help="Удалить записи (все или --tenant)")
+    parser.add_argument("--tenant", help="Тенант для --clear")
+    args = parser.parse_args()
+
+    if not Path(args.path).exists():
+        print(f"📦 Семантический кеш {args.path} пуст")
+        return
+    version = read_kb_version(Path(args.kb_version))
+    conn = sqlite3.connect(args.path)
+    if args.clear:
+        where, params = ("WHERE tenant = ?", (args.tenant,)) if args.tenant else ("", ())
+        print(f"🧹 Удалено записей: {conn.execute(f'DELETE FROM answers {where}', params).rowcount}")
+    elif args.purge:
+        removed = conn.execute("DELETE FROM answers WHERE created_at < ? OR kb_version IS NOT ?",
+                               (time.time() - args.max_age, version)).rowcount
+        print(f"🧹 Удалено записей: {removed}")
+    conn.commit()
+
+    print(f"📦 Семантический кеш: {args.path} ({Path(args.path).stat().st_size / 1024:.0f} KB)")
+    print(f"  - Версия базы знаний: {version or 'нет файла версии'}")
+    for tenant, count, latency in conn.execute(
+            "SELECT tenant, COUNT(*), SUM(latency) FROM answers GROUP BY tenant ORDER BY tenant"):
+        print(f"  - {tenant}: {count} записей, среднее время ответа бэкенда {latency / count:.2f}s")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,117 +3,91 @@
 Упрощенная проверка данных в Supabase
 """
 
-import psycopg2
+import os
 import sys
+import argparse
 
-# Конфигурация базы данных Supabase
-DB_CONFIG = {
-    'host': 'aws-0-eu-north-1.pooler.supabase.com',
-    'port': 5432,
-    'database': 'postgres',
-    'user': 'postgres.ymfduihrjjuzwuckbjjh',
-    'password': 'mn4c0Je402fgh3mc5'
-}
+# Добавляем текущую директорию в путь для импорта
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from db_stats import DEFAULT_TABLES, catalog_stats, collect_stats, coverage_percent, format_value
 
 def main():
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Упрощенная проверка данных в Supabase")
+    parser.add_argument("--fast", action="store_true", help="Оценки из pg_class/pg_stats вместо полного сканирования")
+    parser.add_argument("--timeout-ms", type=int, help="statement_timeout одного прохода по таблице")
+    args = parser.parse_args()
+    
     print("🔍 Упрощенная проверка данных в Supabase")
     print("=" * 50)
     
     try:
         # Подключение к базе данных
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db.connect()
         cursor = conn.cursor()
         print("✅ Подключение к Supabase установлено")
         
+        # Все метрики таблиц - один проход на таблицу, таблицы параллельно
+        stats = collect_stats(DEFAULT_TABLES, fast=args.fast, statement_timeout_ms=args.timeout_ms)
+        catalog = catalog_stats(DEFAULT_TABLES)
+        
         # Проверяем основные таблицы
-        print("\n📊 Статистика таблиц:")
+        print(f"\n📊 Статистика таблиц{' (оценки каталога)' if args.fast else ''}:")
+        
+        for table, metrics in stats.items():
+            if 'error' in metrics:
+                print(f"  - {table}: ОШИБКА - {metrics['error']}")
+            else:
+                print(f"  - {table}: {'≈' if metrics['estimated'] else ''}{metrics['total']} записей")
         
-        tables = ['kb_articles', 'kb_chunks', 'conversations', 'messages', 'operators']
-        for table in tables:
-            try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
-                print(f"  - {table}: {count} записей")
-            except Exception as e:
-                print(f"  - {table}: ОШИБКА - {e}")
+        chunks = stats['kb_chunks']
+        if 'error' in chunks:
+            raise RuntimeError(f"kb_chunks: {chunks['error']}")
         
         # Проверяем эмбеддинги
         print("\n🤖 Проверка RAG системы:")
         
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_chunks,
-                COUNT(CASE WHEN embedding IS NOT NULL THEN 1 END) as chunks_with_embeddings
-            FROM kb_chunks
-        """)
-        embedding_stats = cursor.fetchone()
-        
-        total_chunks = embedding_stats[0]
-        chunks_with_embeddings = embedding_stats[1]
-        coverage_percent = (chunks_with_embeddings * 100.0 / total_chunks) if total_chunks > 0 else 0
+        total_chunks = chunks['total']
+        chunks_with_embeddings = chunks['with_embeddings']
+        coverage = coverage_percent(chunks)
         
         print(f"  - Всего чанков: {total_chunks}")
-        print(f"  - С эмбеддингами: {chunks_with_embeddings}")
-        print(f"  - Покрытие: {coverage_percent:.1f}%")
+        print(f"  - С эмбеддингами: {format_value(chunks_with_embeddings)}")
+        print(f"  - Покрытие: {coverage:.1f}%")
         
-        if coverage_percent == 100:
+        if coverage == 100:
             print("  ✅ RAG система готова к работе!")
-        elif coverage_percent > 80:
+        elif coverage > 80:
             print("  ⚠️  RAG система почти готова")
         else:
             print("  ❌ RAG система требует доработки")
         
         # Проверяем качество чанков
-        cursor.execute("""
-            SELECT 
-                AVG(LENGTH(chunk_text)) as avg_length,
-                MIN(LENGTH(chunk_text)) as min_length,
-                MAX(LENGTH(chunk_text)) as max_length
-            FROM kb_chunks
-        """)
-        quality_stats = cursor.fetchone()
-        
         print(f"\n📝 Качество чанков:")
-        print(f"  - Средняя длина: {quality_stats[0]:.0f} символов")
-        print(f"  - Диапазон: {quality_stats[1]} - {quality_stats[2]} символов")
-        
-        # Проверяем размеры таблиц
-        cursor.execute("""
-            SELECT 
-                tablename,
-                pg_size_pretty(pg_total_relation_size('public.'||tablename)) as size
-            FROM pg_tables 
-            WHERE schemaname = 'public' 
-            AND tablename IN ('kb_articles', 'kb_chunks', 'conversations', 'messages')
-            ORDER BY pg_total_relation_size('public.'||tablename) DESC
-        """)
-        sizes = cursor.fetchall()
+        print(f"  - Средняя длина: {format_value(chunks['avg_length'])} символов")
+        print(f"  - Диапазон: {format_value(chunks['min_length'])} - {format_value(chunks['max_length'])} символов")
         
+        # Размеры таблиц и индексы из каталога
+        kb_tables = [t for t in ('kb_articles', 'kb_chunks', 'conversations', 'messages') if t in catalog]
         print(f"\n💾 Размеры таблиц:")
-        for table_name, size in sizes:
-            print(f"  - {table_name}: {size}")
-        
-        # Проверяем индексы
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM pg_indexes 
-            WHERE schemaname = 'public' 
-            AND tablename IN ('kb_articles', 'kb_chunks', 'conversations', 'messages')
-        """)
-        index_count = cursor.fetchone()[0]
+        for table_name in sorted(kb_tables, key=lambda t: catalog[t]['size_bytes'], reverse=True):
+            print(f"  - {table_name}: {catalog[table_name]['size']}")
+        
+        index_count = sum(catalog[t]['indexes'] for t in kb_tables)
         print(f"\n🔍 Индексов: {index_count}")
         
         # Рекомендации
         print(f"\n💡 Рекомендации:")
         
-        if coverage_percent < 100:
+        if coverage < 100:
             print("  - Нужно сгенерировать эмбеддинги для оставшихся чанков")
         
-        if quality_stats[1] < 100:
+        if chunks['min_length'] is not None and chunks['min_length'] < 100:
             print("  - Есть короткие чанки, которые могут быть объединены")
         
-        if quality_stats[2] > 1000:
+        if chunks['max_length'] is not None and chunks['max_length'] > 1000:
             print("  - Есть длинные чанки, которые могут быть разбиты")
         
         if total_chunks > 0:
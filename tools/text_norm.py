@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Нормализация текста вопросов: общая для ключей кеша ответов, индекса FAQ
+и id импортированных пар вопрос-ответ, чтобы один и тот же вопрос везде
+давал один и тот же ключ
+"""
+
+import re
+import unicodedata
+
+def normalize_question(question: str) -> str:
+    """NFC, нижний регистр, ё -> е, схлопнутые пробелы, без финальной пунктуации"""
+    text = unicodedata.normalize('NFC', question or '').lower().replace('ё', 'е')
+    return re.sub(r'\s+', ' ', text).strip().rstrip('?!.…').strip()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Журнал запросов RAG клиента в JSONL: вопрос, параметры и тайминги каждого
+process_query. Запись идет в фоновом потоке пачками, вызывающему коду
+достаются только сборка записи и постановка ее в очередь
+"""
+
+import copy
+import json
+import time
+import queue
+import random
+import threading
+from pathlib import Path
+from typing import Dict, Iterator
+
+# Журнал по умолчанию (относительно корня репозитория)
+TRAFFIC_LOG_PATH = Path('data/traffic/rag_queries.jsonl')
+
+SERVER_TIMINGS = ('searchTime', 'processingTime', 'totalTime')
+
+class TrafficRecorder:
+    """
+    Пишет по строке JSON на запрос. sample_rate < 1 записывает только
+    часть запросов. Потокобезопасен, close() дописывает очередь
+    """
+
+    def __init__(self, path: Path = TRAFFIC_LOG_PATH, sample_rate: float = 1.0,
+                 flush_interval: float = 1.0, batch_size: int = 256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="rag-traffic-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, payload: Dict, result: Dict, latency: float, cached: bool = False, **extra):
+        """
+        Args:
+            payload: Тело запроса к /api/rag/query
+            result: Ответ бэкенда или dict ошибки клиента
+            latency: Задержка на стороне клиента, секунд
+            cached: Ответ взят из кеша клиента
+            extra: Дополнительные поля записи (например, ttft_ms)
+        """
+        if self._closed or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            self.dropped += 1
+            return
+        self.recorded += 1
+        # Запись собирается сразу: вызывающий код может изменить payload и result
+        # до того, как поток записи до них доберется
+        self._queue.put(self._entry(time.time(), payload, result, latency, cached, extra))
+
+    @staticmethod
+    def _entry(ts: float, payload: Dict, result: Dict, latency: float, cached: bool, extra: Dict) -> dict:
+        data = result.get('data') or {}
+        entry = {
+            'ts': round(ts, 6),
+            'question': payload.get('question'),
+            'language': payload.get('language'),
+            'context': payload.get('context'),
+            'options': copy.deepcopy(payload.get('options') or {}),
+            'userId': payload.get('userId'),
+            'chatId': payload.get('chatId'),
+            'latency_ms': round(latency * 1000, 3),
+            'success': bool(result.get('success')),
+            'cached': cached,
+            'server': {name: data[name] for name in SERVER_TIMINGS if isinstance(data.get(name), (int, float))},
+        }
+        if result.get('error'):
+            entry['error'] = copy.deepcopy(result['error'])
+        entry.update(copy.deepcopy(extra))
+        return entry
+
+    def _write_loop(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                stop = item is None
+                lines = [] if stop else [json.dumps(item, ensure_ascii=False)]
+                while not stop and len(lines) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    else:
+                        lines.append(json.dumps(item, ensure_ascii=False))
+                if lines:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                if stop:
+                    return
+
+    def close(self):
+        """Дописывает накопленные записи и останавливает поток записи"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
+
+    def __enter__(self) -> 'TrafficRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_traffic(path: Path = TRAFFIC_LOG_PATH) -> Iterator[dict]:
+    """Записи журнала по порядку; битые строки (оборванная запись) пропускаются"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('question'):
+                yield entry